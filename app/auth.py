@@ -1,12 +1,44 @@
 from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from .database import get_db, User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from .database import User
+from .utils import metrics
+from .utils.executors import ExecutorSaturatedError, run_password
 import logging
+import os
 import re
+import secrets
 
 logger = logging.getLogger(__name__)
 
+# Session token settings
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# Development only: sign tokens with a random per-process key when JWT_SECRET_KEY is unset
+JWT_ALLOW_RANDOM_SECRET = os.getenv("JWT_ALLOW_RANDOM_SECRET", "false").lower() in ("1", "true", "yes")
+PASSWORD_RETRY_AFTER_SECONDS = 1
+# Take the client IP from Fly-Client-IP only behind Fly's proxy, where clients can't forge it
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "true" if os.getenv("FLY_APP_NAME") else "false").lower() in ("1", "true", "yes")
+
+if not JWT_SECRET_KEY:
+    # Every worker and machine would sign with its own key and reject the others' tokens
+    if not JWT_ALLOW_RANDOM_SECRET:
+        raise ValueError(
+            "JWT_SECRET_KEY environment variable is not set; generate one with "
+            "python -c \"import secrets; print(secrets.token_urlsafe(32))\""
+        )
+    logger.warning("JWT_SECRET_KEY is not set; using a random key for this process (JWT_ALLOW_RANDOM_SECRET)")
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
 # Enhanced password settings
 pwd_context = CryptContext(
     schemes=["bcrypt"],
@@ -34,10 +66,34 @@ def validate_password(password: str) -> bool:
         return False
     return True
 
-def create_user(db: Session, username: str, password: str):
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalar_one_or_none()
+
+async def hash_password(password: str) -> str:
+    """bcrypt is slow by design; it runs on the bounded password pool, which answers 429 when full"""
+    try:
+        return await run_password(pwd_context.hash, password)
+    except ExecutorSaturatedError:
+        raise password_pool_busy()
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    try:
+        return await run_password(pwd_context.verify, password, hashed_password)
+    except ExecutorSaturatedError:
+        raise password_pool_busy()
+
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many sign-in requests right now. Please try again shortly.",
+        headers={"Retry-After": str(PASSWORD_RETRY_AFTER_SECONDS)}
+    )
+
+async def create_user(db: AsyncSession, username: str, password: str):
     try:
         # Check if user already exists
-        if db.query(User).filter(User.username == username).first():
+        if await get_user_by_username(db, username):
             logger.warning(f"Attempted to create duplicate username: {username}")
             raise HTTPException(status_code=400, detail="Username already registered")
         
@@ -50,11 +106,11 @@ def create_user(db: Session, username: str, password: str):
             )
         
         # Hash password and create user
-        hashed_pw = pwd_context.hash(password)
+        hashed_pw = await hash_password(password)
         user = User(username=username, hashed_password=hashed_pw)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         logger.info(f"Successfully created new user: {username}")
         return user
         
@@ -62,23 +118,120 @@ def create_user(db: Session, username: str, password: str):
         raise
     except Exception as e:
         logger.error(f"Error creating user {username}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Internal server error")
 
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
     try:
-        user = db.query(User).filter(User.username == username).first()
+        user = await get_user_by_username(db, username)
         if not user:
             logger.warning(f"Login attempt with non-existent username: {username}")
             return False
         
-        if not pwd_context.verify(password, user.hashed_password):
+        if not await verify_password(password, user.hashed_password):
             logger.warning(f"Failed login attempt for user: {username}")
             return False
         
         logger.info(f"Successful login for user: {username}")
         return user
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during authentication for {username}: {str(e)}")
         return False
+
+@dataclass
+class TokenUser:
+    """The signed-in user, as read from a session token without a database lookup"""
+    id: int
+    username: str
+
+def create_access_token(user: User) -> str:
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user.id),
+        "username": user.username,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    }
+    metrics.increment("auth.tokens_issued")
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def token_response(user: User) -> dict:
+    return {
+        "access_token": create_access_token(user),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def invalid_token(detail: str) -> HTTPException:
+    metrics.increment("auth.tokens_rejected")
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def decode_access_token(token: str) -> TokenUser:
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        return TokenUser(id=int(claims["sub"]), username=claims.get("username", ""))
+    except (JWTError, KeyError, ValueError):
+        raise invalid_token("Invalid or expired session token")
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Optional[TokenUser]:
+    """The user from the Authorization: Bearer token, or None without one; a bad token is a 401"""
+    if credentials is None:
+        return None
+    return decode_access_token(credentials.credentials)
+
+async def get_current_user(current_user: Optional[TokenUser] = Depends(get_optional_user)) -> TokenUser:
+    if current_user is None:
+        raise invalid_token("Not authenticated")
+    return current_user
+
+def require_same_user(user_id: int, current_user: TokenUser) -> None:
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not allowed to access another user's releases")
+
+def require_owner(owner_id: Optional[int], current_user: Optional[TokenUser], resource: str) -> None:
+    """Something created while signed in is only for that user; anonymous ones are reachable by their id alone"""
+    if owner_id is None:
+        return
+    if current_user is None:
+        raise invalid_token(f"Sign in to access this {resource}")
+    if owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail=f"Not allowed to access another user's {resource}s")
+
+async def get_request_user_id(
+    user_id: Optional[int] = None,
+    current_user: Optional[TokenUser] = Depends(get_optional_user)
+) -> Optional[int]:
+    """
+    The user whose history a generated release is saved to, if any.
+
+    Taken from the session token; a user_id parameter is still accepted
+    for existing clients but must match the token.
+    """
+    if current_user is None:
+        if user_id is not None:
+            raise invalid_token("Sign in to save releases to your history")
+        return None
+    if user_id is not None:
+        require_same_user(user_id, current_user)
+    return current_user.id
+
+def rate_limit_subject(scope: dict) -> str:
+    """Key rate limits by the signed-in user, or by client IP for anonymous requests"""
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            return f"user:{decode_access_token(token).id}"
+        except HTTPException:
+            pass
+    # Fly's proxy sets Fly-Client-IP; otherwise use the peer address
+    client_ip = headers.get(b"fly-client-ip", b"").decode("latin-1") if TRUST_PROXY_HEADERS else ""
+    if not client_ip and scope.get("client"):
+        client_ip = scope["client"][0]
+    return f"ip:{client_ip or 'unknown'}"
@@ -0,0 +1,441 @@
+import asyncio
+import io
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+
+from .database import Job, SessionLocal, engine
+from .release_writer import release_writer
+from .utils import metrics
+from .utils.executors import run_io
+from .utils.file_processor import FileValidationError, extract_document_text, process_video_for_transcript
+from .utils.generation_context import GenerationContext
+from .utils.openai_agent import get_agent
+
+logger = logging.getLogger(__name__)
+
+# Background job settings
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# A running job whose worker hasn't reported for this long is picked up again
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_GENERATION_TIMEOUT = int(os.getenv("JOB_GENERATION_TIMEOUT", "900"))
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", "job_files")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+STAGE_PENDING = "pending"
+STAGE_RUNNING = "running"
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+
+
+class JobStageError(Exception):
+    """
+    A stage failure reported by the stage itself.
+
+    Final by default (e.g. unreadable input); retryable when it came from a
+    transient cause such as an OpenAI 5xx, a timeout or a dropped connection.
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def should_retry(error: Exception, attempts: int) -> bool:
+    """Whether a job whose stage raised error after `attempts` runs should be queued again"""
+    retryable = error.retryable if isinstance(error, JobStageError) else True
+    return retryable and attempts < JOB_MAX_ATTEMPTS
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def job_files_dir(job_id: str) -> Path:
+    """Directory holding a job's spooled inputs until the job finishes"""
+    return Path(JOB_FILES_DIR) / job_id
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Stages -----------------------------------------------------------------
+# Each stage reads the job params and the outputs of earlier stages from
+# `state` and adds its own outputs to it; state is saved after every stage.
+
+StageHandler = Callable[[Dict[str, Any], Dict[str, Any], GenerationContext], Awaitable[None]]
+
+
+async def _transcribe_stage(params: Dict[str, Any], state: Dict[str, Any], ctx: GenerationContext) -> None:
+    success, transcript = await process_video_for_transcript(
+        params["path"],
+        ctx=ctx,
+        backend=params.get("transcription_backend"),
+        media_sha256=params.get("sha256")
+    )
+    if not success:
+        raise JobStageError(transcript, retryable=ctx.failure_retryable)
+    state["transcript"] = transcript
+
+
+async def _extract_stage(params: Dict[str, Any], state: Dict[str, Any], ctx: GenerationContext) -> None:
+    combined_content = ""
+    for document in params["files"]:
+        try:
+            content = await extract_document_text(document["path"], document["filename"])
+        except FileValidationError as e:
+            raise JobStageError(str(e))
+        combined_content += content + "\n\n"
+    state["content"] = combined_content
+
+
+async def _generate_stage(params: Dict[str, Any], state: Dict[str, Any], ctx: GenerationContext) -> None:
+    source = state["transcript"] if "transcript" in state else state["content"]
+    success, release_notes = await get_agent().generate_release_notes_async(
+        [io.BytesIO(source.encode("utf-8"))],
+        ["transcript.txt" if "transcript" in state else "combined_content.txt"],
+        timeout_seconds=JOB_GENERATION_TIMEOUT,
+        ctx=ctx
+    )
+    if not success:
+        raise JobStageError(release_notes, retryable=ctx.failure_retryable)
+    state["release_notes"] = release_notes
+    state["chunk_timings"] = ctx.chunk_timings
+    state["language"] = ctx.detected_language
+
+
+async def _store_stage(params: Dict[str, Any], state: Dict[str, Any], ctx: GenerationContext) -> None:
+    user_id = params.get("user_id")
+    if user_id:
+        source = state.get("transcript", state.get("content", ""))
+        await release_writer.submit(user_id, source, state["release_notes"], ctx.usage, state.get("language"))
+
+
+async def _cleanup_stage(params: Dict[str, Any], state: Dict[str, Any], ctx: GenerationContext) -> None:
+    await run_io(shutil.rmtree, job_files_dir(params["job_id"]), ignore_errors=True)
+
+
+PIPELINES: Dict[str, List[Tuple[str, StageHandler]]] = {
+    "video": [
+        ("transcribe", _transcribe_stage),
+        ("generate", _generate_stage),
+        ("store", _store_stage),
+        ("cleanup", _cleanup_stage),
+    ],
+    "documents": [
+        ("extract", _extract_stage),
+        ("generate", _generate_stage),
+        ("store", _store_stage),
+        ("cleanup", _cleanup_stage),
+    ],
+}
+
+
+def _build_result(kind: str, state: Dict[str, Any], ctx: GenerationContext) -> Dict[str, Any]:
+    """Shape the result like the matching synchronous endpoint's response"""
+    result = {
+        "token_usage": ctx.token_usage,
+        "usage": ctx.usage.to_dict(),
+        "chunk_timings": state.get("chunk_timings", []),
+        "timings": ctx.timings,
+    }
+    if kind == "video":
+        result.update(
+            transcript=state["transcript"],
+            transcript_cache_hit=ctx.media.get("transcript_cache_hit", False),
+            release_notes=state["release_notes"],
+            media=ctx.media
+        )
+    else:
+        result.update(content=state["release_notes"])
+    return result
+
+
+# --- Persistence (runs on the I/O pool) ---------------------------------------
+
+def _create_job(job_id: str, kind: str, params: Dict[str, Any], user_id: Optional[int]) -> None:
+    stages = {name: {"status": STAGE_PENDING} for name, _ in PIPELINES[kind]}
+    db = SessionLocal()
+    try:
+        db.add(Job(id=job_id, kind=kind, status=QUEUED, stages=stages, params=params, state={}, attempts=0, user_id=user_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claim_job(job_id: str, stale_before: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Atomically mark a queued or abandoned job as running; None if another worker has it.
+
+    A job that has used up JOB_MAX_ATTEMPTS is marked failed instead of being
+    run again, so one that kills its worker process (e.g. out of memory) isn't
+    reclaimed forever. Check the returned status before running it.
+    """
+    claimable = or_(Job.status == QUEUED, and_(Job.status == RUNNING, Job.heartbeat_at < stale_before))
+    db = SessionLocal()
+    try:
+        claimed = db.query(Job).filter(Job.id == job_id, claimable, Job.attempts < JOB_MAX_ATTEMPTS).update(
+            {Job.status: RUNNING, Job.heartbeat_at: _now(), Job.attempts: Job.attempts + 1},
+            synchronize_session=False
+        )
+        if not claimed:
+            job = db.query(Job).filter(Job.id == job_id, claimable).with_for_update().first()
+            if job is None:
+                db.rollback()
+                return None
+            error = f"Gave up after {job.attempts} attempts; the job stopped its worker without finishing"
+            stages = dict(job.stages or {})
+            if job.stage:
+                stages[job.stage] = {**stages.get(job.stage, {}), "status": STAGE_FAILED, "error": error}
+            job.status, job.stages, job.error, job.heartbeat_at = FAILED, stages, error, _now()
+        db.commit()
+        job = db.get(Job, job_id)
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "stages": dict(job.stages or {}),
+            "params": dict(job.params or {}),
+            "state": dict(job.state or {}),
+            "attempts": job.attempts,
+        }
+    finally:
+        db.close()
+
+
+def _update_job(job_id: str, **fields) -> None:
+    db = SessionLocal()
+    try:
+        fields["heartbeat_at"] = _now()
+        db.query(Job).filter(Job.id == job_id).update(
+            {getattr(Job, name): value for name, value in fields.items()},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _resumable_job_ids(stale_before: datetime) -> List[str]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Job.id).filter(
+            or_(Job.status == QUEUED, and_(Job.status == RUNNING, Job.heartbeat_at < stale_before))
+        ).order_by(Job.created_at).all()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+
+def ensure_jobs_table() -> None:
+    Job.__table__.create(bind=engine, checkfirst=True)
+
+
+# --- Queue and workers --------------------------------------------------------
+
+class JobQueue:
+    """
+    In-process worker pool for background jobs.
+
+    The database is the source of truth: job ids are queued in memory, but a
+    worker claims a job with a conditional UPDATE and saves its state after
+    every stage, heartbeating while it runs. Jobs left queued, or running with
+    a stale heartbeat (e.g. after a restart), are picked up again and resume
+    at their first unfinished stage.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._queued_ids: Set[str] = set()
+        self._active_ids: Set[str] = set()
+        metrics.register_gauge("jobs.queue_depth", lambda: self._queue.qsize() if self._queue is not None else 0)
+        metrics.register_gauge("jobs.active", lambda: len(self._active_ids))
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        try:
+            await run_io(ensure_jobs_table)
+        except Exception as e:
+            logger.error(f"Job queue not started, jobs table unavailable: {str(e)}")
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reclaim_loop()))
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Hand interrupted jobs straight back instead of waiting for them to go stale;
+        # a clean shutdown doesn't use up one of the job's attempts
+        for job_id in list(self._active_ids):
+            try:
+                await run_io(_update_job, job_id, status=QUEUED, attempts=Job.attempts - 1)
+            except Exception as e:
+                logger.error(f"Could not requeue job {job_id}: {str(e)}")
+        self._active_ids.clear()
+        self._queued_ids.clear()
+
+    async def submit(self, job_id: str, kind: str, params: Dict[str, Any], user_id: Optional[int] = None) -> str:
+        if not self.running:
+            raise RuntimeError("Job queue is not running")
+        params = {**params, "job_id": job_id, "user_id": user_id}
+        await run_io(_create_job, job_id, kind, params, user_id)
+        metrics.increment("jobs.submitted")
+        self._enqueue(job_id)
+        logger.info(f"Submitted {kind} job {job_id}")
+        return job_id
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id in self._queued_ids or job_id in self._active_ids:
+            return
+        self._queued_ids.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    @staticmethod
+    def _stale_before() -> datetime:
+        return _now() - timedelta(seconds=JOB_STALE_SECONDS)
+
+    async def _reclaim_loop(self) -> None:
+        while True:
+            try:
+                for job_id in await run_io(_resumable_job_ids, self._stale_before()):
+                    self._enqueue(job_id)
+            except Exception as e:
+                logger.error(f"Error looking for resumable jobs: {str(e)}")
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued_ids.discard(job_id)
+            try:
+                job = await run_io(_claim_job, job_id, self._stale_before())
+                if job is not None and job["status"] == FAILED:
+                    logger.error(f"Job {job_id}: giving up after {job['attempts']} attempts")
+                    await _cleanup_stage(job["params"], job["state"], GenerationContext())
+                    metrics.increment("jobs.failed")
+                elif job is not None:
+                    self._active_ids.add(job_id)
+                    heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                    try:
+                        await self._process(job)
+                    finally:
+                        heartbeat.cancel()
+                        self._active_ids.discard(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error running job {job_id}: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await run_io(_update_job, job_id)
+            except Exception as e:
+                logger.error(f"Error updating heartbeat for job {job_id}: {str(e)}")
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        job_id, kind = job["id"], job["kind"]
+        stages, params, state = job["stages"], job["params"], job["state"]
+
+        # Carry usage and timings over from stages completed before a restart
+        ctx = GenerationContext()
+        ctx.usage.entries = list(state.get("usage_entries", []))
+        ctx.timings = dict(state.get("timings", {}))
+        ctx.media = dict(state.get("media", {}))
+
+        for name, handler in PIPELINES[kind]:
+            if stages.get(name, {}).get("status") == STAGE_DONE:
+                continue
+            stages[name] = {"status": STAGE_RUNNING, "started_at": _now().isoformat()}
+            await run_io(_update_job, job_id, stage=name, stages=stages)
+            logger.info(f"Job {job_id}: starting stage {name} (attempt {job['attempts']})")
+
+            start = time.perf_counter()
+            try:
+                await handler(params, state, ctx)
+            except Exception as e:
+                stages[name] = {**stages[name], "status": STAGE_FAILED, "error": str(e)}
+                retry = should_retry(e, job["attempts"])
+                logger.error(f"Job {job_id}: stage {name} failed ({'will retry' if retry else 'giving up'}): {str(e)}")
+                if retry:
+                    # Left queued; the reclaim loop picks it up again
+                    await run_io(_update_job, job_id, status=QUEUED, stages=stages)
+                    metrics.increment("jobs.retried")
+                else:
+                    await run_io(_update_job, job_id, status=FAILED, stages=stages, error=str(e))
+                    await _cleanup_stage(params, state, ctx)
+                    metrics.increment("jobs.failed")
+                return
+
+            stages[name] = {
+                **stages[name],
+                "status": STAGE_DONE,
+                "finished_at": _now().isoformat(),
+                "seconds": round(time.perf_counter() - start, 3)
+            }
+            state.update(usage_entries=ctx.usage.entries, timings=ctx.timings, media=ctx.media)
+            await run_io(_update_job, job_id, stages=stages, state=state)
+
+        await run_io(
+            _update_job, job_id,
+            status=SUCCEEDED, stage=None, result=_build_result(kind, state, ctx), error=None
+        )
+        metrics.increment("jobs.succeeded")
+        logger.info(f"Job {job_id} completed")
+
+
+def job_status(job: Job) -> Dict[str, Any]:
+    """Public view of a job's progress"""
+    stages = job.stages or {}
+    done = sum(1 for s in stages.values() if s.get("status") == STAGE_DONE)
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "stages": stages,
+        "progress": round(done / len(stages), 3) if stages else 0,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+job_queue = JobQueue()
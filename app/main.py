@@ -3,11 +3,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import logging
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from .utils.openai_agent import process_document_with_openai
-from .routes import upload, generate, users
+from .utils.openai_agent import process_document_with_openai, get_agent
+from .routes import upload, generate, users, jobs, resumable
+from .utils import metrics
+from .utils.llm_cache import get_llm_cache
+from .utils.openai_clients import pool_stats, close_openai_clients
+from .utils.executors import loop_lag_monitor, io_executor, cpu_executor, password_executor, run_io
+from .jobs import job_queue
+from .release_writer import release_writer
+from .search import ensure_search_index
+from .database import SchemaMismatchError, async_engine, db_pool_stats, ensure_schema
+from .utils.transcription import shutdown_transcription_backends, get_transcript_cache
+from .utils.uploads import MaxBodySizeMiddleware, MULTIPART_OVERHEAD_BYTES
+from .utils.rate_limit import RateLimitMiddleware, RateLimitRule, rate_limiter, request_cost, token_cost, media_cost
+from .auth import rate_limit_subject
+from .utils.resumable import RESUMABLE_MAX_CHUNK_BYTES
+from .utils.file_processor import MAX_FILE_SIZE_MB
 import time
 from datetime import datetime
 
@@ -19,19 +30,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
 app = FastAPI(
     title="Release Notes Generator",
     description="Generate detailed release notes from various file types",
     version="1.0.0"
 )
 
-# Add rate limiter to the app
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # Configure security middleware
 app.add_middleware(
     TrustedHostMiddleware,
@@ -47,6 +51,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized upload bodies while they are received instead of after parsing
+BODY_LIMITS = {
+    "/api/upload-video": MAX_FILE_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES,
+    "/api/generate-release-notes": generate.MAX_REQUEST_SIZE + MULTIPART_OVERHEAD_BYTES,
+    "/api/jobs/video": MAX_FILE_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES,
+    "/api/jobs/release-notes": generate.MAX_REQUEST_SIZE + MULTIPART_OVERHEAD_BYTES,
+    "/api/uploads": RESUMABLE_MAX_CHUNK_BYTES + MULTIPART_OVERHEAD_BYTES,
+}
+app.add_middleware(MaxBodySizeMiddleware, limits=BODY_LIMITS)
+
+# Shared, cost-weighted rate limits per user (or client IP) and route group, checked
+# before the body is read; chunked uploads are charged the route's body limit, and
+# resumable uploads are charged when created (see routes/resumable.py)
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=rate_limiter,
+    subject=rate_limit_subject,
+    rules=[
+        RateLimitRule("/api/upload-video", "media", media_cost, max_body=BODY_LIMITS["/api/upload-video"]),
+        RateLimitRule("/api/jobs/video", "media", media_cost, max_body=BODY_LIMITS["/api/jobs/video"]),
+        RateLimitRule("/api/generate-release-notes", "generate", token_cost, max_body=BODY_LIMITS["/api/generate-release-notes"]),
+        RateLimitRule("/api/jobs/release-notes", "generate", token_cost, max_body=BODY_LIMITS["/api/jobs/release-notes"]),
+        RateLimitRule("/api/login", "auth", request_cost),
+        RateLimitRule("/api/register", "auth", request_cost),
+        RateLimitRule("/api/releases", "history", request_cost, methods=("GET",)),
+        RateLimitRule("/", "default", request_cost, methods=("GET",), exact=True),
+    ]
+)
+
 # Request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -56,6 +89,65 @@ async def add_process_time_header(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
+# Warm up the shared agent so no request pays for template parsing or client setup
+@app.on_event("startup")
+async def warm_up_agent():
+    agent = get_agent()
+    # Fails startup if COMBINE_MAX_PROMPT_TOKENS can't fit the template and some notes
+    notes_budget = agent.combine_notes_budget()
+    logger.info(
+        f"Agent ready with {len(agent.template_content)} characters of template content "
+        f"and {notes_budget} tokens for notes per combine prompt"
+    )
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+# Bring an existing database up to the models: new tables, columns and indexes (e.g. the
+# one serving release history pagination). A schema that can't be fixed stops startup;
+# an unreachable database doesn't, and the release writer checks again before writing.
+@app.on_event("startup")
+async def ensure_database_schema():
+    try:
+        await run_io(ensure_schema)
+    except SchemaMismatchError:
+        raise
+    except Exception as e:
+        logger.error(f"Could not check the database schema: {str(e)}")
+
+# Rate limits fail open, so say loudly at startup if the shared backend is down
+@app.on_event("startup")
+async def check_rate_limit_backend():
+    await rate_limiter.check_backend()
+
+# Resume jobs left unfinished by a previous run and start the workers
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+# Store generated releases in the background, starting with any left in the spool
+@app.on_event("startup")
+async def start_release_writer():
+    try:
+        await run_io(ensure_search_index)
+    except Exception as e:
+        logger.error(f"Search index unavailable at startup: {str(e)}")
+    await release_writer.start()
+
+@app.on_event("shutdown")
+async def close_clients():
+    await job_queue.stop()
+    await release_writer.stop()
+    await loop_lag_monitor.stop()
+    await close_openai_clients()
+    io_executor.shutdown()
+    cpu_executor.shutdown()
+    password_executor.shutdown()
+    shutdown_transcription_backends()
+    await async_engine.dispose()
+    await rate_limiter.close()
+
 # Global error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -69,9 +161,7 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# Include routers with rate limits
 @app.get("/", include_in_schema=False)
-@limiter.limit("10/minute")
 async def root(request: Request):
     return {"message": "Release Notes Generator API"}
 
@@ -79,6 +169,8 @@ async def root(request: Request):
 app.include_router(upload.router, prefix="/api", tags=["upload"])
 app.include_router(generate.router, prefix="/api", tags=["generate"])
 app.include_router(users.router, prefix="/api", tags=["users"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+app.include_router(resumable.router, prefix="/api", tags=["uploads"])
 
 # Health check endpoint
 @app.get("/health")
@@ -88,3 +180,16 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat(),
         "version": "1.0.0"
     }
+
+# Metrics endpoint
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "metrics": metrics.snapshot(),
+        "llm_cache": get_llm_cache().stats(),
+        "transcript_cache": get_transcript_cache().stats(),
+        "openai_pools": pool_stats(),
+        "db_pools": db_pool_stats(),
+        "event_loop": loop_lag_monitor.stats()
+    }
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import Optional
 import re
 
 class UserCreate(BaseModel):
@@ -8,3 +9,9 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
     password: str = Field(..., min_length=8, max_length=100)
+
+class UploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0)
+    kind: str = Field("video", pattern="^(video|document)$")
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
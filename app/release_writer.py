@@ -0,0 +1,373 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError, ProgrammingError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from .database import AsyncSessionLocal, Release, async_engine, ensure_schema, put_blob_async
+from .search import ensure_search_index, index_release
+from .utils import metrics
+from .utils.executors import run_io
+from .utils.usage import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+# Write-behind settings for generated releases
+RELEASE_SPOOL_DIR = os.getenv("RELEASE_SPOOL_DIR", "release_spool")
+RELEASE_QUEUE_SIZE = int(os.getenv("RELEASE_QUEUE_SIZE", "1000"))  # releases held in memory; the rest wait on disk
+RELEASE_WRITE_BATCH_SIZE = int(os.getenv("RELEASE_WRITE_BATCH_SIZE", "50"))
+RELEASE_WRITE_LINGER_SECONDS = float(os.getenv("RELEASE_WRITE_LINGER_SECONDS", "0.5"))
+RELEASE_WRITE_MAX_BACKOFF_SECONDS = float(os.getenv("RELEASE_WRITE_MAX_BACKOFF_SECONDS", "60"))
+RELEASE_WRITE_MAX_ATTEMPTS = int(os.getenv("RELEASE_WRITE_MAX_ATTEMPTS", "5"))  # for releases that fail to write
+RELEASE_WRITER_SHUTDOWN_SECONDS = float(os.getenv("RELEASE_WRITER_SHUTDOWN_SECONDS", "10"))
+
+# Errors meaning the database can't take writes right now: it can't be reached, or (for
+# ProgrammingError) its schema is behind the models. These are retried for as long as it
+# takes; any other error counts against the release being written.
+UNAVAILABLE_ERRORS = (
+    OperationalError,
+    ProgrammingError,
+    InterfaceError,
+    DisconnectionError,
+    PoolTimeoutError,
+    ConnectionError,
+    asyncio.TimeoutError
+)
+
+
+@dataclass
+class PendingRelease:
+    record: Dict[str, Any]
+    path: Optional[Path]  # spool file; None if it couldn't be written to disk
+    attempts: int = 0
+
+
+def release_from_record(record: Dict[str, Any]) -> Release:
+    totals = record.get("usage") or {}
+    return Release(
+        user_id=record["user_id"],
+        generated_at=datetime.fromisoformat(record["generated_at"]),
+        prompt_tokens=totals.get("prompt_tokens", 0),
+        completion_tokens=totals.get("completion_tokens", 0),
+        cost_usd=totals.get("cost_usd", 0.0),
+        usage=record.get("usage"),
+        language=record.get("language"),
+        spool_id=record.get("id")
+    )
+
+
+def insert_release(release: Release):
+    """
+    INSERT for a release that does nothing if its spool_id is already stored.
+
+    A spool file can be written twice: by a process that crashed between
+    committing and removing the file, or by two processes sharing the spool.
+    Returns the new id, or no row when the release was already stored.
+    """
+    values = {
+        attr.columns[0].key: getattr(release, attr.key)
+        for attr in inspect(Release).column_attrs
+        if attr.key != "id"
+    }
+    insert = sqlite_insert if async_engine.dialect.name == "sqlite" else postgresql_insert
+    return (
+        insert(Release.__table__)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[Release.__table__.c.spool_id])
+        .returning(Release.__table__.c.id)
+    )
+
+
+class ReleaseWriter:
+    """
+    Write-behind persistence for generated releases.
+
+    submit() writes the release to a local spool file and returns; a
+    background task inserts queued releases in batches, one transaction per
+    batch, and deletes their spool files once committed. While the database is
+    unavailable batches are retried with exponential backoff, and the spool
+    keeps releases across restarts. When a batch fails for any other reason
+    its releases are retried one at a time, and a release that still fails
+    after RELEASE_WRITE_MAX_ATTEMPTS is moved to the spool's failed/ directory. Each release carries its spool id, so writing one
+    again after a crash or from a second process stores it only once.
+    """
+
+    def __init__(self, directory: str = RELEASE_SPOOL_DIR, queue_size: int = RELEASE_QUEUE_SIZE):
+        self.directory = Path(directory)
+        self.queue_size = queue_size
+        self._queue: Deque[PendingRelease] = deque()
+        self._claimed: Set[str] = set()  # spool files queued or being written
+        self._spilled = True  # spool files may be waiting on disk; starts True to load leftovers
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._schema_ready = False
+        metrics.register_gauge("releases.write_queue.depth", lambda: len(self._queue))
+        metrics.register_gauge("releases.write_queue.spilled", lambda: int(self._spilled))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Release writer started (spool: {self.directory})")
+
+    async def stop(self) -> None:
+        """Flush what is queued, waiting up to RELEASE_WRITER_SHUTDOWN_SECONDS"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, RELEASE_WRITER_SHUTDOWN_SECONDS)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        unspooled = sum(1 for item in self._queue if item.path is None)
+        if unspooled:
+            logger.error(f"Release writer stopped with {unspooled} releases that were never spooled to disk")
+        self._task = None
+
+    async def submit(
+        self,
+        user_id: int,
+        transcripts: str,
+        release_notes: str,
+        usage: Optional[UsageLedger] = None,
+        language: Optional[str] = None
+    ) -> None:
+        """Queue a generated release for storage; never raises and never waits on the database"""
+        record = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "transcripts": transcripts,
+            "release_notes": release_notes,
+            "usage": usage.to_dict() if usage is not None else None,
+            "language": language,
+            "generated_at": datetime.utcnow().isoformat()
+        }
+        # Names sort by submission time, so leftovers are written in order
+        path: Optional[Path] = self.directory / f"{time.time_ns()}-{record['id']}.json"
+        # Claimed before the file exists, so a concurrent spool scan can't queue it twice
+        self._claimed.add(str(path))
+        try:
+            await run_io(self._write_spool, path, record)
+        except OSError as e:
+            logger.error(f"Could not spool release for user {user_id}, keeping it in memory only: {str(e)}")
+            self._claimed.discard(str(path))
+            path = None
+        metrics.increment("releases.write_queue.submitted")
+        self._enqueue(PendingRelease(record=record, path=path))
+
+    def _enqueue(self, item: PendingRelease) -> None:
+        if len(self._queue) >= self.queue_size:
+            if item.path is None:
+                metrics.increment("releases.write_queue.dropped")
+                logger.error(f"Release write queue is full; dropped release for user {item.record['user_id']}")
+            else:
+                # Stays on disk and is loaded once the queue drains
+                self._claimed.discard(str(item.path))
+                self._spilled = True
+            return
+        self._queue.append(item)
+        if self._wake is not None:
+            self._wake.set()
+
+    # Spool files, run on the I/O pool
+
+    def _write_spool(self, path: Path, record: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(record))
+        os.replace(tmp, path)
+
+    def _load_spool(self, claimed: Set[str], room: int) -> Tuple[List[PendingRelease], bool]:
+        """Read up to room unclaimed spool files; also reports whether more are waiting"""
+        if not self.directory.exists():
+            return [], False
+        paths = [path for path in sorted(self.directory.glob("*.json")) if str(path) not in claimed]
+        items = []
+        for path in paths[:room]:
+            try:
+                items.append(PendingRelease(record=json.loads(path.read_text()), path=path))
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable release spool file {path}: {str(e)}")
+                self._move_to_failed(path)
+        return items, len(paths) > room
+
+    def _move_to_failed(self, path: Path) -> None:
+        failed = self.directory / "failed"
+        failed.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), str(failed / path.name))
+
+    def _remove_spool(self, paths: List[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    # Writer
+
+    async def _refill(self) -> None:
+        room = self.queue_size - len(self._queue)
+        if room <= 0:
+            return
+        items, more = await run_io(self._load_spool, set(self._claimed), room)
+        self._spilled = more
+        for item in items:
+            # Skip files submitted while the scan was running; they're already queued
+            if str(item.path) not in self._claimed:
+                self._claimed.add(str(item.path))
+                self._queue.append(item)
+        if items:
+            logger.info(f"Loaded {len(items)} spooled releases for writing")
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            if self._spilled and len(self._queue) < self.queue_size:
+                try:
+                    await self._refill()
+                except OSError as e:
+                    logger.error(f"Could not read the release spool: {str(e)}")
+            if not self._queue:
+                if self._stopping:
+                    return
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            # Give concurrent submissions a moment to join the batch
+            if len(self._queue) < RELEASE_WRITE_BATCH_SIZE and not self._stopping:
+                await asyncio.sleep(RELEASE_WRITE_LINGER_SECONDS)
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), RELEASE_WRITE_BATCH_SIZE))]
+            retry = await self._flush(batch)
+            if not retry:
+                backoff = 1.0
+                continue
+
+            self._queue.extendleft(reversed(retry))
+            if self._stopping:
+                # Spooled releases are written after the next start
+                return
+            logger.warning(f"{len(self._queue)} releases waiting for the database; retrying in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RELEASE_WRITE_MAX_BACKOFF_SECONDS)
+
+    async def _flush(self, batch: List[PendingRelease]) -> List[PendingRelease]:
+        """Write a batch; returns the releases that still need writing"""
+        try:
+            await self._ensure_schema()
+        except Exception as e:
+            # Not the fault of any release, so nothing counts against them
+            metrics.increment("releases.write_queue.batch_failures")
+            logger.error(f"Database schema not ready, {len(batch)} releases not written: {str(e)}")
+            return batch
+        try:
+            await self._write(batch)
+        except UNAVAILABLE_ERRORS as e:
+            if isinstance(e, ProgrammingError):
+                # Check the schema again before the next attempt
+                self._schema_ready = False
+            metrics.increment("releases.write_queue.batch_failures")
+            logger.warning(f"Database unavailable, {len(batch)} releases not written: {str(e)}")
+            return batch
+        except Exception as e:
+            # One bad release shouldn't hold back the rest: write them one at a time
+            logger.warning(f"Failed to write a batch of {len(batch)} releases: {str(e)}")
+            return await self._flush_individually(batch)
+        await self._done(batch)
+        return []
+
+    async def _flush_individually(self, batch: List[PendingRelease]) -> List[PendingRelease]:
+        retry = []
+        for i, item in enumerate(batch):
+            try:
+                await self._write([item])
+            except UNAVAILABLE_ERRORS as e:
+                # The database went away; the rest wait for it without using up attempts
+                if isinstance(e, ProgrammingError):
+                    self._schema_ready = False
+                return retry + batch[i:]
+            except Exception as e:
+                item.attempts += 1
+                if item.attempts >= RELEASE_WRITE_MAX_ATTEMPTS:
+                    await self._give_up(item, e)
+                else:
+                    logger.warning(
+                        f"Failed to write release for user {item.record.get('user_id')} "
+                        f"(attempt {item.attempts}/{RELEASE_WRITE_MAX_ATTEMPTS}): {str(e)}"
+                    )
+                    retry.append(item)
+                continue
+            await self._done([item])
+        return retry
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            # Checked here rather than only at startup, in case the database was down then
+            await run_io(ensure_schema)
+            await run_io(ensure_search_index)
+            self._schema_ready = True
+
+    async def _write(self, batch: List[PendingRelease]) -> None:
+        async with AsyncSessionLocal() as db:
+            for item in batch:
+                record = item.record
+                release = release_from_record(record)
+                release.set_text(
+                    record["transcripts"],
+                    record["release_notes"],
+                    await put_blob_async(db, record["transcripts"]),
+                    await put_blob_async(db, record["release_notes"])
+                )
+                release.id = (await db.execute(insert_release(release))).scalar_one_or_none()
+                if release.id is None:
+                    # Stored before its spool file was removed; the search entry came with it
+                    metrics.increment("releases.write_queue.duplicates")
+                    logger.info(f"Release {record.get('id')} was already stored; skipping it")
+                    continue
+                # The search index is written in the same transaction
+                await index_release(db, release, record["transcripts"], record["release_notes"])
+            await db.commit()
+
+    async def _done(self, batch: List[PendingRelease]) -> None:
+        paths = [item.path for item in batch if item.path is not None]
+        try:
+            await run_io(self._remove_spool, paths)
+        except OSError as e:
+            logger.error(f"Could not remove release spool files: {str(e)}")
+        for path in paths:
+            self._claimed.discard(str(path))
+        metrics.increment("releases.write_queue.written", len(batch))
+        logger.info(f"Stored {len(batch)} releases")
+
+    async def _give_up(self, item: PendingRelease, error: Exception) -> None:
+        metrics.increment("releases.write_queue.failed")
+        logger.error(
+            f"Giving up on release for user {item.record.get('user_id')} after {item.attempts} attempts: {str(error)}"
+        )
+        if item.path is not None:
+            try:
+                await run_io(self._move_to_failed, item.path)
+            except OSError as e:
+                logger.error(f"Could not move {item.path} to the failed spool: {str(e)}")
+            self._claimed.discard(str(item.path))
+
+
+release_writer = ReleaseWriter()
@@ -1,87 +1,91 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, BackgroundTasks
-from app.utils.openai_agent import OpenAIAgent
-from app.database import get_db, Release
-from sqlalchemy.orm import Session
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Request
+from app.auth import get_request_user_id
+from app.utils.openai_agent import get_agent
+from app.utils.generation_context import GenerationContext
+from app.utils.sse import format_sse, SSE_HEADERS
+from app.utils.file_processor import FileValidationError, extract_document_text
+from app.utils.uploads import SpooledUpload, UploadFormError, UploadTooLargeError, multipart_body, remove_spooled, spool_multipart
+from app.release_writer import release_writer
 import os
 import io
 import logging
-import asyncio
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize the agent
-agent = OpenAIAgent()
-
 # Maximum file size in bytes (100MB)
 MAX_FILE_SIZE = 100 * 1024 * 1024  
+# Limit for a whole multi-file request, checked while the body is received
+MAX_REQUEST_SIZE = int(os.getenv("MAX_DOCUMENT_REQUEST_MB", "200")) * 1024 * 1024
+TEMP_UPLOAD_DIR = "temp_uploads"
+
+def check_document_filename(filename: str) -> None:
+    """Verify a document's type before any of its body is read"""
+    logger.info(f"Starting to process file: {filename}")
+    file_extension = filename.split('.')[-1].lower()
+    logger.info(f"File extension: {file_extension}")
+
+    if file_extension not in ['txt', 'pdf', 'docx', 'doc']:
+        logger.warning(f"Unsupported file type: {file_extension}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type for file {filename}"
+        )
+
+async def spool_documents(request: Request, directory: str = TEMP_UPLOAD_DIR) -> List[SpooledUpload]:
+    """Stream the request's documents to disk, checking each one's type and size as it arrives"""
+    try:
+        spooled = await spool_multipart(request, "files", MAX_FILE_SIZE, directory, check_filename=check_document_filename)
+    except UploadTooLargeError as e:
+        logger.warning(f"File size too large: {e.filename}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"File size too large for file {e.filename}. Maximum allowed size is 100MB"
+        )
+    except UploadFormError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-@router.post("/generate-release-notes")
+    for upload in spooled:
+        logger.info(f"File size of {upload.filename}: {upload.size / 1024 / 1024:.2f}MB")
+    return spooled
+
+async def extract_combined_content(files: List[SpooledUpload]) -> str:
+    """Return the combined text of spooled documents, removing the files afterwards"""
+    combined_content = ""
+
+    try:
+        for spooled in files:
+            try:
+                content = await extract_document_text(spooled.path, spooled.filename)
+            except FileValidationError as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            combined_content += content + "\n\n"
+    finally:
+        for spooled in files:
+            await remove_spooled(spooled.path)
+
+    return combined_content
+
+@router.post("/generate-release-notes", openapi_extra=multipart_body("files", multiple=True))
 async def generate_release_notes(
-    files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
-    user_id: int = None
+    request: Request,
+    user_id: Optional[int] = Depends(get_request_user_id)
 ):
     """Generate release notes from uploaded files"""
     try:
-        combined_content = ""
-
-        for file in files:
-            logger.info(f"Starting to process file: {file.filename}")
-
-            # Check file size
-            file.file.seek(0, 2)  # Seek to end of file
-            file_size = file.file.tell()
-            file.file.seek(0)  # Reset file position
-
-            logger.info(f"File size: {file_size / 1024 / 1024:.2f}MB")
-
-            if file_size > MAX_FILE_SIZE:
-                logger.warning(f"File size too large: {file_size / 1024 / 1024:.2f}MB")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File size too large for file {file.filename}. Maximum allowed size is 100MB"
-                )
-
-            # Verify file type
-            file_extension = file.filename.split('.')[-1].lower()
-            logger.info(f"File extension: {file_extension}")
-
-            if file_extension not in ['txt', 'pdf', 'docx', 'doc']:
-                logger.warning(f"Unsupported file type: {file_extension}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported file type for file {file.filename}"
-                )
-
-            # Create a copy of the file in memory
-            logger.info("Creating memory copy of file")
-            file_copy = io.BytesIO()
-            contents = await file.read()
-            file_copy.write(contents)
-            file_copy.seek(0)
-
-            # Extract content and combine
-            openai_agent = OpenAIAgent()
-            success, content = openai_agent.extract_text_from_memory(file_copy, file.filename)
-            if not success:
-                logger.error(f"Failed to extract content from file: {file.filename}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to extract content from file: {file.filename}"
-                )
-
-            combined_content += content + "\n\n"
+        openai_agent = get_agent()
+        ctx = GenerationContext()
+        combined_content = await extract_combined_content(await spool_documents(request))
 
         # Generate release notes from combined content
         logger.info("Generating release notes from combined content")
 
         success, result = await openai_agent.generate_release_notes_async(
             [io.BytesIO(combined_content.encode('utf-8'))],
-            ["combined_content.txt"]
+            ["combined_content.txt"],
+            ctx=ctx
         )
 
         if not success:
@@ -94,27 +98,16 @@ async def generate_release_notes(
         logger.info("Successfully generated release notes")
 
         if success and user_id:
-            # Store in database
-            try:
-                logger.info(f"Storing results in database for user_id: {user_id}")
-                now = datetime.utcnow()
-                release = Release(
-                    user_id=user_id,
-                    transcripts=combined_content,
-                    generated_release_notes=result,
-                    generated_at=now
-                )
-                db.add(release)
-                db.commit()
-                logger.info("Successfully stored in database")
-            except Exception as e:
-                logger.error(f"Failed to store in database: {str(e)}", exc_info=True)
-                # Continue even if database storage fails
+            # Stored in the background so the response doesn't wait on the database
+            await release_writer.submit(user_id, combined_content, result, ctx.usage, ctx.detected_language)
 
         return {
             "success": True,
             "content": result,
-            "token_usage": openai_agent.last_token_usage  # Include token usage in response
+            "token_usage": ctx.token_usage,  # Include token usage in response
+            "usage": ctx.usage.to_dict(),
+            "chunk_timings": ctx.chunk_timings,
+            "timings": ctx.timings
         }
 
     except HTTPException as http_error:
@@ -124,3 +117,34 @@ async def generate_release_notes(
         error_msg = f"Unexpected error generating release notes: {str(e)}"
         logger.error(error_msg, exc_info=True)
         raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/generate-release-notes/stream", openapi_extra=multipart_body("files", multiple=True))
+async def generate_release_notes_stream(
+    request: Request,
+    user_id: Optional[int] = Depends(get_request_user_id)
+):
+    """Generate release notes from uploaded files, streaming progress and tokens as Server-Sent Events"""
+    # Validation errors are raised before the stream starts so they keep their status codes
+    files = await spool_documents(request)
+    combined_content = await extract_combined_content(files)
+    openai_agent = get_agent()
+    ctx = GenerationContext()
+
+    async def event_stream():
+        yield format_sse("extracted", {"files": len(files), "characters": len(combined_content)})
+        try:
+            async for event, data in openai_agent.stream_release_notes_async(
+                [io.BytesIO(combined_content.encode('utf-8'))],
+                ["combined_content.txt"],
+                ctx=ctx
+            ):
+                if event == "done" and user_id:
+                    await release_writer.submit(
+                        user_id, combined_content, data["content"], ctx.usage, ctx.detected_language
+                    )
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Unexpected error streaming release notes: {str(e)}", exc_info=True)
+            yield format_sse("error", {"detail": f"Unexpected error generating release notes: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from typing import Dict, Optional
+import logging
+import shutil
+
+from app.auth import TokenUser, get_optional_user, get_request_user_id, require_owner
+from app.jobs import Job, job_queue, new_job_id, job_files_dir, get_job, job_status, SUCCEEDED, FAILED
+from app.routes.generate import spool_documents
+from app.routes.upload import spool_validated_video, validate_transcription_backend
+from app.utils.executors import run_io
+from app.utils.uploads import multipart_body
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def accepted(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+            "result_url": f"/api/jobs/{job_id}/result"
+        }
+    )
+
+async def get_owned_job(job_id: str, current_user: Optional[TokenUser]) -> Job:
+    """Load a job, checking the caller against its owner; anonymous jobs are readable by job id alone"""
+    job = await run_io(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    require_owner(job.user_id, current_user, "job")
+    return job
+
+def require_job_queue() -> None:
+    if not job_queue.running:
+        raise HTTPException(status_code=503, detail="Background jobs are unavailable")
+
+@router.post("/jobs/video", status_code=202, openapi_extra=multipart_body("file"))
+async def submit_video_job(
+    request: Request,
+    transcription_backend: Optional[str] = None,
+    user_id: Optional[int] = Depends(get_request_user_id)
+):
+    """Queue a video for transcription and release notes generation; returns a job id immediately"""
+    require_job_queue()
+    validate_transcription_backend(transcription_backend)
+    job_id = new_job_id()
+    try:
+        spooled = await spool_validated_video(request, directory=str(job_files_dir(job_id)))
+        await job_queue.submit(job_id, "video", {
+            "path": spooled.path,
+            "filename": spooled.filename,
+            "sha256": spooled.sha256,
+            "transcription_backend": transcription_backend
+        }, user_id=user_id)
+    except BaseException:
+        await run_io(shutil.rmtree, job_files_dir(job_id), ignore_errors=True)
+        raise
+    return accepted(job_id)
+
+@router.post("/jobs/release-notes", status_code=202, openapi_extra=multipart_body("files", multiple=True))
+async def submit_documents_job(
+    request: Request,
+    user_id: Optional[int] = Depends(get_request_user_id)
+):
+    """Queue documents for release notes generation; returns a job id immediately"""
+    require_job_queue()
+    job_id = new_job_id()
+    try:
+        spooled = await spool_documents(request, directory=str(job_files_dir(job_id)))
+        documents = [{"path": upload.path, "filename": upload.filename} for upload in spooled]
+        await job_queue.submit(job_id, "documents", {"files": documents}, user_id=user_id)
+    except BaseException:
+        await run_io(shutil.rmtree, job_files_dir(job_id), ignore_errors=True)
+        raise
+    return accepted(job_id)
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user: Optional[TokenUser] = Depends(get_optional_user)) -> Dict:
+    """Report a job's status and per-stage progress"""
+    job = await get_owned_job(job_id, current_user)
+    return job_status(job)
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user: Optional[TokenUser] = Depends(get_optional_user)):
+    """Return a finished job's result; 202 while it is still queued or running"""
+    job = await get_owned_job(job_id, current_user)
+    if job.status == SUCCEEDED:
+        return {"job_id": job.id, "status": job.status, **(job.result or {})}
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    return JSONResponse(status_code=202, content=job_status(job))
@@ -0,0 +1,186 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+import shutil
+
+from app.auth import TokenUser, get_optional_user, get_request_user_id, rate_limit_subject, require_owner
+from app.jobs import job_queue, new_job_id, job_files_dir
+from app.models import UploadCreate
+from app.routes.generate import MAX_FILE_SIZE
+from app.routes.jobs import accepted, require_job_queue
+from app.routes.upload import validate_transcription_backend
+from app.utils.executors import run_io
+from app.utils.file_processor import MAX_FILE_SIZE_MB, validate_video_format
+from app.utils.rate_limit import rate_limiter, media_cost, token_cost
+from app.utils.resumable import (
+    RESUMABLE_CHUNK_SIZE,
+    RESUMABLE_MAX_CHUNK_BYTES,
+    UploadElsewhereError,
+    UploadError,
+    UploadInfo,
+    parse_checksum_header,
+    resumable_uploads,
+    upload_machine_id
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+DOCUMENT_EXTENSIONS = ['txt', 'pdf', 'docx', 'doc']
+
+def upload_error(e: UploadError) -> HTTPException:
+    if isinstance(e, UploadElsewhereError):
+        # Fly's proxy replays the request on the machine holding the upload
+        return HTTPException(status_code=e.status_code, detail=e.detail, headers={"fly-replay": f"instance={e.machine_id}"})
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+async def get_owned_upload(upload_id: str, current_user: Optional[TokenUser]) -> UploadInfo:
+    try:
+        info = await resumable_uploads.get(upload_id)
+    except UploadError as e:
+        raise upload_error(e)
+    require_owner(info.user_id, current_user, "upload")
+    return info
+
+def validate_new_upload(upload: UploadCreate) -> None:
+    """Apply the same type and size rules as the one-shot upload endpoints"""
+    if upload.kind == "video":
+        is_valid_format, format_error = validate_video_format(upload.filename)
+        if not is_valid_format:
+            raise HTTPException(status_code=400, detail=format_error)
+        max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+    else:
+        if Path(upload.filename).suffix.lower().strip('.') not in DOCUMENT_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type for file {upload.filename}")
+        max_bytes = MAX_FILE_SIZE
+    if upload.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size exceeds {max_bytes // (1024 * 1024)}MB limit. Please upload a smaller file."
+        )
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    upload: UploadCreate,
+    request: Request,
+    user_id: Optional[int] = Depends(get_request_user_id)
+) -> Dict:
+    """Start a resumable upload; send the bytes with PATCH and then finalize it"""
+    validate_new_upload(upload)
+    # The declared size is known up front, so the whole upload is charged here
+    if upload.kind == "video":
+        await rate_limiter.check(rate_limit_subject(request.scope), "media", media_cost(upload.size))
+    else:
+        await rate_limiter.check(rate_limit_subject(request.scope), "generate", token_cost(upload.size))
+    info = await resumable_uploads.create(upload.filename, upload.kind, upload.size, upload.sha256, user_id=user_id)
+    return {
+        "upload_id": info.upload_id,
+        "machine_id": upload_machine_id(info.upload_id) or None,
+        "offset": 0,
+        "size": info.size,
+        "chunk_size": RESUMABLE_CHUNK_SIZE,
+        "max_chunk_size": RESUMABLE_MAX_CHUNK_BYTES,
+        "upload_url": f"/api/uploads/{info.upload_id}"
+    }
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, current_user: Optional[TokenUser] = Depends(get_optional_user)) -> Dict:
+    """Report how many bytes have been received, so an interrupted client knows where to resume"""
+    info = await get_owned_upload(upload_id, current_user)
+    offset = await resumable_uploads.offset(upload_id)
+    return {
+        "upload_id": info.upload_id,
+        "filename": info.filename,
+        "kind": info.kind,
+        "size": info.size,
+        "offset": offset,
+        "complete": offset == info.size
+    }
+
+@router.head("/uploads/{upload_id}")
+async def head_upload(upload_id: str, current_user: Optional[TokenUser] = Depends(get_optional_user)) -> Response:
+    info = await get_owned_upload(upload_id, current_user)
+    offset = await resumable_uploads.offset(upload_id)
+    return Response(headers={"Upload-Offset": str(offset), "Upload-Length": str(info.size), "Cache-Control": "no-store"})
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    upload_checksum: Optional[str] = Header(None),
+    current_user: Optional[TokenUser] = Depends(get_optional_user)
+) -> JSONResponse:
+    """
+    Write the request body at Upload-Offset.
+
+    An optional 'Upload-Checksum: sha256 <base64>' header is verified before the
+    chunk is committed; a mismatch answers 460 and the chunk must be resent.
+    """
+    info = await get_owned_upload(upload_id, current_user)
+    try:
+        checksum = parse_checksum_header(upload_checksum)
+        offset = await resumable_uploads.write_chunk(upload_id, upload_offset, request.stream(), checksum)
+    except UploadError as e:
+        raise upload_error(e)
+    return JSONResponse(
+        content={"upload_id": upload_id, "offset": offset, "complete": offset == info.size},
+        headers={"Upload-Offset": str(offset)}
+    )
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str, current_user: Optional[TokenUser] = Depends(get_optional_user)) -> Response:
+    await get_owned_upload(upload_id, current_user)
+    try:
+        await resumable_uploads.delete(upload_id)
+    except UploadError as e:
+        raise upload_error(e)
+    return Response(status_code=204)
+
+@router.post("/uploads/{upload_id}/finalize", status_code=202)
+async def finalize_upload(
+    upload_id: str,
+    transcription_backend: Optional[str] = None,
+    user_id: Optional[int] = Depends(get_request_user_id),
+    current_user: Optional[TokenUser] = Depends(get_optional_user)
+) -> JSONResponse:
+    """Verify a complete upload and queue it for processing as a background job"""
+    require_job_queue()
+    validate_transcription_backend(transcription_backend)
+    info = await get_owned_upload(upload_id, current_user)
+
+    job_id = new_job_id()
+    destination = job_files_dir(job_id) / f"{upload_id}{Path(info.filename).suffix.lower()}"
+    try:
+        sha256 = await resumable_uploads.finalize(upload_id, destination)
+    except BaseException as e:
+        await run_io(shutil.rmtree, job_files_dir(job_id), ignore_errors=True)
+        if isinstance(e, UploadError):
+            raise upload_error(e)
+        raise
+
+    try:
+        if info.kind == "video":
+            await job_queue.submit(job_id, "video", {
+                "path": str(destination),
+                "filename": info.filename,
+                "sha256": sha256,
+                "transcription_backend": transcription_backend
+            }, user_id=user_id)
+        else:
+            await job_queue.submit(job_id, "documents", {
+                "files": [{"path": str(destination), "filename": info.filename}]
+            }, user_id=user_id)
+    except BaseException:
+        # Put the upload back so the client can retry the finalize rather than the upload
+        try:
+            await resumable_uploads.restore(info, destination)
+        except Exception as e:
+            logger.error(f"Could not restore resumable upload {upload_id}: {str(e)}")
+        await run_io(shutil.rmtree, job_files_dir(job_id), ignore_errors=True)
+        raise
+
+    logger.info(f"Finalized resumable upload {upload_id} as job {job_id}")
+    return accepted(job_id)
@@ -1,74 +1,95 @@
-from fastapi import APIRouter, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Optional
 import io
 import logging
 from ..utils.file_processor import (
-    validate_file_with_streaming,
+    MAX_FILE_SIZE_MB,
+    TEMP_VIDEO_DIR,
     validate_video_format,
-    save_temp_video,
     process_video_for_transcript,
     cleanup_temp_video
 )
-from ..utils.openai_agent import OpenAIAgent
+from ..utils.transcription import BACKEND_NAMES
+from ..utils.uploads import SpooledUpload, UploadFormError, UploadTooLargeError, multipart_body, remove_spooled, spool_multipart
+from ..utils.openai_agent import get_agent
+from ..utils.generation_context import GenerationContext
+from ..utils.sse import format_sse, SSE_HEADERS
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.post("/upload-video")
-async def upload_video(file: UploadFile) -> Dict:
-    """
-    Handle video upload, transcription, and release notes generation
-    """
-    logger.info(f"Received video upload request for file: {file.filename}")
-    logger.info(f"File content type: {file.content_type}")
+def check_video_filename(filename: str) -> None:
+    """Check the upload's name and format before any of its body is read"""
+    logger.info(f"Received video upload request for file: {filename}")
 
     # Check if filename exists
-    if not file.filename:
+    if not filename:
         logger.error("No filename provided")
         raise HTTPException(status_code=400, detail="No filename provided")
 
     # Validate video format
-    is_valid_format, format_error = validate_video_format(str(file.filename))
+    is_valid_format, format_error = validate_video_format(filename)
     if not is_valid_format:
         logger.error(f"Invalid video format: {format_error}")
         raise HTTPException(status_code=400, detail=format_error)
 
-    # Read file into memory for validation
-    logger.info("Reading file into memory")
-    file_content = await file.read()
-    file_size = len(file_content)
-    logger.info(f"File size in memory: {file_size} bytes")
-    
-    file_stream = io.BytesIO(file_content)
-    
-    # Validate file size
-    is_valid_size, size_error = await validate_file_with_streaming(file_stream)
-    if not is_valid_size:
-        logger.error(f"Invalid file size: {size_error}")
-        raise HTTPException(status_code=400, detail=size_error)
-
+async def spool_validated_video(request: Request, directory: str = TEMP_VIDEO_DIR) -> SpooledUpload:
+    """Stream the request's video to disk, checking its format first and its size as it arrives"""
     try:
-        # Save video temporarily
-        logger.info("Saving video to temporary location")
-        success, file_path = await save_temp_video(file_stream, str(file.filename))
-        if not success:
-            logger.error(f"Failed to save video: {file_path}")
-            raise HTTPException(status_code=500, detail=file_path)
+        uploads = await spool_multipart(
+            request, "file", MAX_FILE_SIZE_MB * 1024 * 1024, directory, check_filename=check_video_filename
+        )
+    except UploadTooLargeError as e:
+        logger.error(f"Invalid file size: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(uploads) > 1:
+        for upload in uploads:
+            await remove_spooled(upload.path)
+        raise HTTPException(status_code=422, detail="Send one video per request")
+    spooled = uploads[0]
+
+    logger.info(f"Video spooled to {spooled.path} ({spooled.size} bytes, sha256 {spooled.sha256[:12]})")
+    return spooled
+
+def validate_transcription_backend(transcription_backend: Optional[str]) -> None:
+    if transcription_backend is not None and transcription_backend not in BACKEND_NAMES + ("auto",):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown transcription backend. Choose from: {', '.join(BACKEND_NAMES + ('auto',))}"
+        )
+
+@router.post("/upload-video", openapi_extra=multipart_body("file"))
+async def upload_video(request: Request, transcription_backend: Optional[str] = None) -> Dict:
+    """
+    Handle video upload, transcription, and release notes generation
+
+    transcription_backend overrides the configured backend (openai, local or auto).
+    """
+    validate_transcription_backend(transcription_backend)
+    spooled = await spool_validated_video(request)
+    file_path = spooled.path
 
+    try:
         # Get transcript from video
         logger.info("Processing video for transcript")
-        success, transcript = await process_video_for_transcript(file_path)
+        ctx = GenerationContext()
+        success, transcript = await process_video_for_transcript(
+            file_path, ctx=ctx, backend=transcription_backend, media_sha256=spooled.sha256
+        )
         if not success:
             logger.error(f"Failed to generate transcript: {transcript}")
             raise HTTPException(status_code=500, detail=transcript)
             
         # Generate release notes from transcript using OpenAIAgent with template
         logger.info("Generating release notes from transcript")
-        openai_agent = OpenAIAgent()
+        openai_agent = get_agent()
         success, release_notes = await openai_agent.generate_release_notes_async(
             [io.BytesIO(transcript.encode())],
-            ["transcript.txt"]
+            ["transcript.txt"],
+            ctx=ctx
         )
         
         if not success:
@@ -83,13 +104,67 @@ async def upload_video(file: UploadFile) -> Dict:
         return {
             "message": "Video processed successfully",
             "transcript": transcript,
+            "transcript_cache_hit": ctx.media.get("transcript_cache_hit", False),
             "release_notes": release_notes,
-            "token_usage": openai_agent.last_token_usage
+            "token_usage": ctx.token_usage,
+            "usage": ctx.usage.to_dict(),
+            "chunk_timings": ctx.chunk_timings,
+            "timings": ctx.timings,
+            "media": ctx.media
         }
 
     except Exception as e:
         logger.error(f"Unexpected error processing video: {str(e)}")
         # Ensure cleanup in case of any error
-        if 'file_path' in locals():
-            await cleanup_temp_video(file_path)
+        await cleanup_temp_video(file_path)
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload-video/stream", openapi_extra=multipart_body("file"))
+async def upload_video_stream(request: Request, transcription_backend: Optional[str] = None) -> StreamingResponse:
+    """
+    Handle video upload like /upload-video, streaming progress and release note tokens as Server-Sent Events
+    """
+    validate_transcription_backend(transcription_backend)
+    # Validation errors are raised before the stream starts so they keep their status codes
+    spooled = await spool_validated_video(request)
+    file_path = spooled.path
+
+    async def event_stream():
+        try:
+            yield format_sse("uploaded", {"filename": spooled.filename, "bytes": spooled.size, "sha256": spooled.sha256})
+
+            logger.info("Processing video for transcript")
+            yield format_sse("transcribing", {})
+            ctx = GenerationContext()
+            success, transcript = await process_video_for_transcript(
+                file_path, ctx=ctx, backend=transcription_backend, media_sha256=spooled.sha256
+            )
+            if not success:
+                logger.error(f"Failed to generate transcript: {transcript}")
+                yield format_sse("error", {"detail": transcript})
+                return
+            # The timestamped segments are sent once, with the final "done" event
+            media_summary = {k: v for k, v in ctx.media.items() if k != "transcript_segments"}
+            yield format_sse("transcribed", {"characters": len(transcript), **media_summary})
+
+            logger.info("Generating release notes from transcript")
+            async for event, data in get_agent().stream_release_notes_async(
+                [io.BytesIO(transcript.encode())],
+                ["transcript.txt"],
+                ctx=ctx
+            ):
+                if event == "done":
+                    data["transcript"] = transcript
+                    data["transcript_cache_hit"] = ctx.media.get("transcript_cache_hit", False)
+                    data["media"] = ctx.media
+                yield format_sse(event, data)
+
+            logger.info("Video processing completed successfully")
+        except Exception as e:
+            logger.error(f"Unexpected error processing video: {str(e)}")
+            yield format_sse("error", {"detail": str(e)})
+        finally:
+            logger.info("Cleaning up temporary files")
+            await cleanup_temp_video(file_path)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
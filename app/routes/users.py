@@ -1,44 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db, Release
-from app.auth import create_user, authenticate_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.database import get_db, Release, RELEASE_PREVIEW_CHARS
+from app.auth import create_user, authenticate_user, get_current_user, require_same_user, token_response, TokenUser
 from app.models import UserCreate, UserLogin
-from typing import List
+from app.search import search_releases
+from app.utils.executors import run_cpu
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
 from fastapi.responses import JSONResponse
+import base64
+import json
+import logging
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+RELEASES_PAGE_SIZE = 20
+RELEASES_MAX_PAGE_SIZE = 100
+
 class ReleaseResponse(BaseModel):
     id: int
-    transcripts: str
-    generated_release_notes: str
+    transcripts: Optional[str] = None
+    generated_release_notes: Optional[str] = None
     generated_at: datetime
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
+
+class ReleaseSummary(BaseModel):
+    """List view of a release: the large text columns are replaced by a preview and sizes"""
+    id: int
+    generated_at: datetime
+    title: str
+    preview: str
+    transcripts_chars: int
+    release_notes_chars: int
+    cost_usd: Optional[float] = None
+
+class ReleasePage(BaseModel):
+    releases: List[ReleaseSummary]
+    next_cursor: Optional[str] = None
+
+class SearchResult(BaseModel):
+    id: int
+    generated_at: datetime
+    title: str
+    language: Optional[str] = None
+    snippet: Optional[str] = None  # matching words are wrapped in **
+    rank: float
+
+class SearchPage(BaseModel):
+    results: List[SearchResult]
+    page: int
+    has_more: bool
+
+def encode_cursor(generated_at: datetime, release_id: int) -> str:
+    raw = json.dumps([generated_at.isoformat(), release_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        generated_at, release_id = json.loads(raw)
+        return datetime.fromisoformat(generated_at), int(release_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def release_title(preview: str) -> str:
+    """First non-empty line of the notes, without markdown heading marks"""
+    for line in preview.splitlines():
+        line = line.strip().lstrip("#").strip()
+        if line:
+            return line
+    return ""
 
 # Register a new user
 @router.post("/register/")
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        result = create_user(db, user.username, user.password)
+        result = await create_user(db, user.username, user.password)
         return JSONResponse(
             content={
                 "success": True,
                 "username": result.username,
-                "user_id": result.id
+                "user_id": result.id,
+                **token_response(result)
             },
             status_code=200
         )
     except HTTPException as he:
         return JSONResponse(
             content={"success": False, "message": he.detail},
-            status_code=he.status_code
+            status_code=he.status_code,
+            headers=he.headers
         )
 
 # Login user
 @router.post("/login/")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    authenticated_user = authenticate_user(db, user.username, user.password)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    authenticated_user = await authenticate_user(db, user.username, user.password)
     if not authenticated_user:
         return JSONResponse(
             content={"success": False, "message": "Invalid credentials"},
@@ -49,19 +112,153 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
             "success": True,
             "message": "Login successful",
             "username": authenticated_user.username,
-            "user_id": authenticated_user.id
+            "user_id": authenticated_user.id,
+            **token_response(authenticated_user)
         },
         status_code=200
     )
 
-# Get user's releases
-@router.get("/releases/{user_id}", response_model=List[ReleaseResponse])
-def get_user_releases(user_id: int, db: Session = Depends(get_db)):
+# Get a page of a user's releases, newest first
+@router.get("/releases/{user_id}", response_model=ReleasePage)
+async def get_user_releases(
+    user_id: int,
+    limit: int = Query(RELEASES_PAGE_SIZE, ge=1, le=RELEASES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    """
+    List releases as lightweight summaries using keyset pagination.
+
+    Pass the returned next_cursor to get the following page. Only the stored
+    preview and sizes are read; fetch a single release for its full content.
+    """
+    require_same_user(user_id, current_user)
+    position = decode_cursor(cursor) if cursor else None
     try:
-        releases = db.query(Release).filter(Release.user_id == user_id).all()
-        return releases  # FastAPI will automatically convert this to JSON with the response_model
+        query = (
+            select(
+                Release.id,
+                Release.generated_at,
+                # Releases stored before blobs fall back to their inline text
+                func.coalesce(
+                    Release.preview, func.substr(Release.legacy_release_notes, 1, RELEASE_PREVIEW_CHARS)
+                ).label("preview"),
+                func.coalesce(
+                    Release.transcripts_chars, func.length(Release.legacy_transcripts), 0
+                ).label("transcripts_chars"),
+                func.coalesce(
+                    Release.release_notes_chars, func.length(Release.legacy_release_notes), 0
+                ).label("release_notes_chars"),
+                Release.cost_usd
+            )
+            .where(Release.user_id == user_id)
+        )
+        if position is not None:
+            # Rows strictly after the cursor in (generated_at, id) descending order
+            query = query.where(tuple_(Release.generated_at, Release.id) < position)
+        # Fetch one extra row to learn whether another page exists
+        query = query.order_by(Release.generated_at.desc(), Release.id.desc()).limit(limit + 1)
+        rows = (await db.execute(query)).all()
     except Exception as e:
+        logger.error(f"Error retrieving releases for user {user_id}: {str(e)}")
         return JSONResponse(
             content={"success": False, "message": "Failed to retrieve releases"},
             status_code=500
         )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    releases = [
+        ReleaseSummary(
+            id=row.id,
+            generated_at=row.generated_at,
+            title=release_title(row.preview or ""),
+            preview=row.preview or "",
+            transcripts_chars=row.transcripts_chars,
+            release_notes_chars=row.release_notes_chars,
+            cost_usd=row.cost_usd
+        )
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].generated_at, rows[-1].id) if has_more else None
+    return ReleasePage(releases=releases, next_cursor=next_cursor)
+
+# Search a user's releases; registered before /releases/{user_id}/{release_id} so "search" isn't taken for an id
+@router.get("/releases/{user_id}/search", response_model=SearchPage)
+async def search_user_releases(
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    language: Optional[str] = Query(None, pattern="^[a-z]{2}$"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(RELEASES_PAGE_SIZE, ge=1, le=RELEASES_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    """
+    Full-text search over release notes and transcripts, best matches first.
+
+    Words are stemmed for each release's detected language; pass language to
+    search only releases in that language.
+    """
+    require_same_user(user_id, current_user)
+    try:
+        # One extra result tells whether there is another page
+        hits = await search_releases(db, user_id, q, language, (page - 1) * limit, limit + 1)
+    except Exception as e:
+        logger.error(f"Error searching releases for user {user_id}: {str(e)}")
+        return JSONResponse(
+            content={"success": False, "message": "Failed to search releases"},
+            status_code=500
+        )
+    results = [
+        SearchResult(
+            id=hit["id"],
+            generated_at=hit["generated_at"],
+            title=release_title(hit["preview"] or ""),
+            language=hit["language"],
+            snippet=hit["snippet"],
+            rank=hit["rank"]
+        )
+        for hit in hits[:limit]
+    ]
+    return SearchPage(results=results, page=page, has_more=len(hits) > limit)
+
+# Get a single release in full
+@router.get("/releases/{user_id}/{release_id}", response_model=ReleaseResponse)
+async def get_user_release(
+    user_id: int,
+    release_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenUser = Depends(get_current_user)
+):
+    require_same_user(user_id, current_user)
+    try:
+        # Only an opened release loads its blobs
+        query = (
+            select(Release)
+            .options(selectinload(Release.transcripts_blob), selectinload(Release.release_notes_blob))
+            .where(Release.id == release_id, Release.user_id == user_id)
+        )
+        release = (await db.execute(query)).scalar_one_or_none()
+        if release is None:
+            raise HTTPException(status_code=404, detail="Release not found")
+        # Decompression is CPU work; keep it off the event loop
+        transcripts, release_notes = await run_cpu(lambda: (release.transcripts, release.generated_release_notes))
+        return ReleaseResponse(
+            id=release.id,
+            transcripts=transcripts,
+            generated_release_notes=release_notes,
+            generated_at=release.generated_at,
+            prompt_tokens=release.prompt_tokens,
+            completion_tokens=release.completion_tokens,
+            cost_usd=release.cost_usd
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving release {release_id}: {str(e)}")
+        return JSONResponse(
+            content={"success": False, "message": "Failed to retrieve release"},
+            status_code=500
+        )
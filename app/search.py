@@ -0,0 +1,311 @@
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from .database import Release, SessionLocal, async_engine, engine
+from .utils import metrics
+from .utils.executors import run_cpu
+
+logger = logging.getLogger(__name__)
+
+# Full-text search settings
+SEARCH_INDEX_MAX_CHARS = int(os.getenv("SEARCH_INDEX_MAX_CHARS", "500000"))  # per text; tsvectors are capped at 1MB
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "160"))
+SNIPPET_MARK = "**"  # matches are wrapped in markdown bold
+
+# PostgreSQL text search configuration per detected language; others use "simple" (no stemming)
+POSTGRES_CONFIGS = {
+    "da": "danish",
+    "de": "german",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "hu": "hungarian",
+    "it": "italian",
+    "nl": "dutch",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ro": "romanian",
+    "ru": "russian",
+    "sv": "swedish",
+    "tr": "turkish"
+}
+DEFAULT_POSTGRES_CONFIG = "simple"
+
+# SQLite's FTS5 only ships an English stemmer, so English gets its own porter-stemmed table
+SQLITE_TABLES = {"en": "release_fts_en"}
+DEFAULT_SQLITE_TABLE = "release_fts"
+SQLITE_TOKENIZERS = {
+    "release_fts_en": "porter unicode61 remove_diacritics 2",
+    "release_fts": "unicode61 remove_diacritics 2"
+}
+
+POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS release_search (
+        release_id INTEGER PRIMARY KEY REFERENCES releases(id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL,
+        config REGCONFIG NOT NULL,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_release_search_document ON release_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_release_search_user ON release_search (user_id)"
+]
+
+POSTGRES_INSERT = text("""
+    INSERT INTO release_search (release_id, user_id, config, document)
+    VALUES (
+        :release_id, :user_id, CAST(:config AS regconfig),
+        setweight(to_tsvector(CAST(:config AS regconfig), :release_notes), 'A') ||
+        setweight(to_tsvector(CAST(:config AS regconfig), :transcripts), 'B')
+    )
+    ON CONFLICT (release_id) DO NOTHING
+""")
+
+
+def sqlite_schema() -> List[str]:
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"release_notes, transcripts, user_id UNINDEXED, tokenize = '{tokenizer}')"
+        for table, tokenizer in SQLITE_TOKENIZERS.items()
+    ]
+
+
+@dataclass
+class SearchHit:
+    release_id: int
+    rank: float
+    snippet: Optional[str] = None  # from the database, when it can build one
+
+
+class SearchBackend:
+    """Dialect-specific statements for indexing and querying release text"""
+
+    def schema(self) -> List[str]:
+        raise NotImplementedError
+
+    def index_statements(self, release_id: int, user_id: int, language: Optional[str], transcripts: str, release_notes: str) -> List[Tuple[Any, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def indexed_ids_query(self) -> str:
+        raise NotImplementedError
+
+    async def search(self, db: AsyncSession, user_id: int, query: str, language: Optional[str], offset: int, limit: int) -> List[SearchHit]:
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector documents in release_search with a GIN index; notes outweigh transcripts"""
+
+    def schema(self) -> List[str]:
+        return POSTGRES_SCHEMA
+
+    def index_statements(self, release_id, user_id, language, transcripts, release_notes):
+        return [(POSTGRES_INSERT, {
+            "release_id": release_id,
+            "user_id": user_id,
+            "config": POSTGRES_CONFIGS.get(language or "", DEFAULT_POSTGRES_CONFIG),
+            "transcripts": transcripts[:SEARCH_INDEX_MAX_CHARS],
+            "release_notes": release_notes[:SEARCH_INDEX_MAX_CHARS]
+        })]
+
+    def indexed_ids_query(self) -> str:
+        return "SELECT release_id FROM release_search"
+
+    async def search(self, db, user_id, query, language, offset, limit):
+        if language:
+            configs = [POSTGRES_CONFIGS.get(language, DEFAULT_POSTGRES_CONFIG)]
+        else:
+            configs = sorted(set(POSTGRES_CONFIGS.values())) + [DEFAULT_POSTGRES_CONFIG]
+        # Each document is matched by the query parsed with its own configuration,
+        # so stemming lines up; the OR of constant tsqueries can still use the GIN index
+        params: Dict[str, Any] = {"user_id": user_id, "query": query, "offset": offset, "limit": limit}
+        matches, ranks = [], []
+        for i, config in enumerate(configs):
+            params[f"config_{i}"] = config
+            tsquery = f"websearch_to_tsquery(CAST(:config_{i} AS regconfig), :query)"
+            matches.append(f"(s.config = CAST(:config_{i} AS regconfig) AND s.document @@ {tsquery})")
+            ranks.append(f"WHEN CAST(:config_{i} AS regconfig) THEN ts_rank_cd(s.document, {tsquery})")
+        statement = text(f"""
+            SELECT s.release_id, CASE s.config {' '.join(ranks)} ELSE 0 END AS rank
+            FROM release_search s
+            WHERE s.user_id = :user_id AND ({' OR '.join(matches)})
+            ORDER BY rank DESC, s.release_id DESC
+            OFFSET :offset LIMIT :limit
+        """)
+        rows = (await db.execute(statement, params)).all()
+        return [SearchHit(release_id=row.release_id, rank=float(row.rank)) for row in rows]
+
+
+def fts5_query(query: str) -> str:
+    """Quote each word so user input can't be parsed as FTS5 syntax; words are ANDed"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 tables for local runs, ranked with bm25 and snippets built by FTS5"""
+
+    def schema(self) -> List[str]:
+        return sqlite_schema()
+
+    def index_statements(self, release_id, user_id, language, transcripts, release_notes):
+        table = SQLITE_TABLES.get(language or "", DEFAULT_SQLITE_TABLE)
+        return [(text(
+            f"INSERT OR REPLACE INTO {table} (rowid, release_notes, transcripts, user_id) "
+            f"VALUES (:release_id, :release_notes, :transcripts, :user_id)"
+        ), {
+            "release_id": release_id,
+            "user_id": user_id,
+            "transcripts": transcripts[:SEARCH_INDEX_MAX_CHARS],
+            "release_notes": release_notes[:SEARCH_INDEX_MAX_CHARS]
+        })]
+
+    def indexed_ids_query(self) -> str:
+        return " UNION ".join(f"SELECT rowid FROM {table}" for table in SQLITE_TOKENIZERS)
+
+    async def search(self, db, user_id, query, language, offset, limit):
+        match = fts5_query(query)
+        if not match:
+            return []
+        tables = [SQLITE_TABLES.get(language, DEFAULT_SQLITE_TABLE)] if language else list(SQLITE_TOKENIZERS)
+        hits = []
+        for table in tables:
+            # Tokens per snippet, roughly SEARCH_SNIPPET_CHARS characters
+            tokens = max(4, min(64, SEARCH_SNIPPET_CHARS // 6))
+            statement = text(f"""
+                SELECT rowid AS release_id,
+                       -bm25({table}, 2.0, 1.0) AS rank,
+                       snippet({table}, 0, '{SNIPPET_MARK}', '{SNIPPET_MARK}', '…', {tokens}) AS notes_snippet,
+                       snippet({table}, 1, '{SNIPPET_MARK}', '{SNIPPET_MARK}', '…', {tokens}) AS transcript_snippet
+                FROM {table}
+                WHERE {table} MATCH :match AND user_id = :user_id
+                ORDER BY rank DESC
+                LIMIT :limit
+            """)
+            # Each table returns enough rows to fill the requested page after merging
+            rows = (await db.execute(statement, {"match": match, "user_id": user_id, "limit": offset + limit})).all()
+            for row in rows:
+                snippet = row.notes_snippet if SNIPPET_MARK in (row.notes_snippet or "") else row.transcript_snippet
+                hits.append(SearchHit(release_id=row.release_id, rank=float(row.rank), snippet=snippet))
+        hits.sort(key=lambda hit: (hit.rank, hit.release_id), reverse=True)
+        return hits[offset:offset + limit]
+
+
+def get_search_backend(dialect: str) -> SearchBackend:
+    return SqliteSearchBackend() if dialect == "sqlite" else PostgresSearchBackend()
+
+
+search_backend = get_search_backend(async_engine.dialect.name)
+
+
+def make_snippet(source: str, query: str, width: int = SEARCH_SNIPPET_CHARS) -> Optional[str]:
+    """
+    Cut a window of source around the first word matching the query.
+
+    Stemmed matches are approximated by word prefixes, so 'deploying' finds
+    'deployment'. Returns None when no query word appears.
+    """
+    words = [word.lower() for word in re.findall(r"\w+", query)]
+    if not words or not source:
+        return None
+    stems = [word[:max(4, len(word) - 3)] if len(word) > 4 else word for word in words]
+    pattern = re.compile(r"\b(" + "|".join(re.escape(stem) for stem in stems) + r")\w*", re.IGNORECASE)
+    found = pattern.search(source)
+    if found is None:
+        return None
+    start = max(0, found.start() - width // 3)
+    end = min(len(source), start + width)
+    window = " ".join(source[start:end].split())
+    window = pattern.sub(lambda m: f"{SNIPPET_MARK}{m.group(0)}{SNIPPET_MARK}", window)
+    return ("…" if start > 0 else "") + window + ("…" if end < len(source) else "")
+
+
+def release_snippet(release: Release, query: str) -> Optional[str]:
+    """Snippet from the notes, or from the transcript when only it matched"""
+    return make_snippet(release.generated_release_notes or "", query) or make_snippet(release.transcripts or "", query)
+
+
+async def index_release(db: AsyncSession, release: Release, transcripts: str, release_notes: str) -> None:
+    """Add a release to the search index in the caller's transaction; the release must be flushed"""
+    for statement, params in search_backend.index_statements(
+        release.id, release.user_id, release.language, transcripts or "", release_notes or ""
+    ):
+        await db.execute(statement, params)
+    metrics.increment("search.indexed")
+
+
+async def search_releases(db: AsyncSession, user_id: int, query: str, language: Optional[str], offset: int, limit: int) -> List[Dict[str, Any]]:
+    """Ranked search over a user's releases, each with a snippet showing the match"""
+    hits = await search_backend.search(db, user_id, query, language, offset, limit)
+    metrics.increment("search.queries")
+    if not hits:
+        return []
+
+    ids = [hit.release_id for hit in hits]
+    statement = select(Release).where(Release.id.in_(ids))
+    if any(hit.snippet is None for hit in hits):
+        # Snippets are cut from the stored text, so load the blobs for this page only
+        statement = statement.options(selectinload(Release.transcripts_blob), selectinload(Release.release_notes_blob))
+    releases = {release.id: release for release in (await db.execute(statement)).scalars()}
+
+    results = []
+    for hit in hits:
+        release = releases.get(hit.release_id)
+        if release is None:
+            continue
+        snippet = hit.snippet if hit.snippet is not None else await run_cpu(release_snippet, release, query)
+        results.append({
+            "id": release.id,
+            "generated_at": release.generated_at,
+            "language": release.language,
+            "preview": release.preview,
+            "snippet": snippet,
+            "rank": round(hit.rank, 6)
+        })
+    return results
+
+
+def ensure_search_index() -> None:
+    """Create the search tables and indexes for the configured database"""
+    backend = get_search_backend(engine.dialect.name)
+    with engine.begin() as connection:
+        for statement in backend.schema():
+            connection.execute(text(statement))
+
+
+def reindex_releases(batch_size: int = 100) -> int:
+    """Index releases stored before search existed; returns how many were added"""
+    backend = get_search_backend(engine.dialect.name)
+    added = 0
+    while True:
+        db = SessionLocal()
+        try:
+            releases = (
+                db.query(Release)
+                .filter(text(f"releases.id NOT IN ({backend.indexed_ids_query()})"))
+                .order_by(Release.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not releases:
+                break
+            for release in releases:
+                for statement, params in backend.index_statements(
+                    release.id, release.user_id, release.language,
+                    release.transcripts or "", release.generated_release_notes or ""
+                ):
+                    db.execute(statement, params)
+            db.commit()
+            added += len(releases)
+            logger.info(f"Indexed {added} releases for search")
+        finally:
+            db.close()
+    return added
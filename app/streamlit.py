@@ -202,7 +202,8 @@ def create_requests_session():
     retry_strategy = Retry(
         total=3,  # number of retries
         status_forcelist=[429, 500, 502, 503, 504],  # HTTP status codes to retry on
-        allowed_methods=["HEAD", "GET", "PUT", "POST", "DELETE", "OPTIONS", "TRACE"],
+        # POST is not idempotent: retrying it re-sends whole uploads and can duplicate jobs
+        allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"],
         backoff_factor=1  # factor to apply between attempts
     )
     adapter = HTTPAdapter(max_retries=retry_strategy)
@@ -223,7 +224,7 @@ def handle_api_request(method, endpoint, **kwargs):
         elif response.status_code in [500, 502, 503, 504]:
             st.error("⚠️ The server is currently experiencing issues. Please try again later.")
             return None
-        elif response.status_code != 200:
+        elif response.status_code not in (200, 202):
             st.error(f"⚠️ Error: {response.status_code} - {response.text}")
             return None
 
@@ -241,7 +242,163 @@ def handle_api_request(method, endpoint, **kwargs):
         st.error(f"⚠️ Unexpected error: {str(e)}")
         return None
 
-from typing import Optional
+def stream_api_request(endpoint, **kwargs):
+    """Call a Server-Sent Events endpoint and yield (event, data) pairs as they arrive"""
+    import json
+
+    try:
+        session = create_requests_session()
+        url = f"{API_URL}{endpoint}"
+        with session.post(url, stream=True, timeout=(10, 300), **kwargs) as response:
+            if response.status_code != 200:
+                try:
+                    detail = response.json().get("detail", response.text)
+                except ValueError:
+                    detail = response.text
+                yield "error", {"detail": f"{response.status_code} - {detail}"}
+                return
+
+            event, data_lines = "message", []
+            for line in response.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+                elif line == "" and data_lines:
+                    yield event, json.loads("\n".join(data_lines))
+                    event, data_lines = "message", []
+    except requests.exceptions.ConnectionError:
+        yield "error", {"detail": "Could not connect to the server. Please check your internet connection or try again later."}
+    except requests.exceptions.Timeout:
+        yield "error", {"detail": "The request timed out. Please try again."}
+    except requests.exceptions.RequestException as e:
+        yield "error", {"detail": f"An error occurred: {str(e)}"}
+
+RESUMABLE_MAX_FAILURES = 5
+
+def upload_resumable(data: bytes, filename: str, kind: str = "video", on_progress=None) -> Optional[str]:
+    """Upload a file in checksummed chunks, resuming from the server's offset after failures
+
+    Returns the upload id, ready to finalize, or None if the upload failed.
+    """
+    import hashlib
+
+    created = handle_api_request(
+        "POST", "/api/uploads",
+        json={"filename": filename, "size": len(data), "kind": kind, "sha256": hashlib.sha256(data).hexdigest()},
+        timeout=(10, 30)
+    )
+    if created is None:
+        return None
+
+    session = create_requests_session()
+    url = f"{API_URL}{created['upload_url']}"
+    chunk_size = created["chunk_size"]
+    offset = created["offset"]
+    # The upload is on one machine's disk; have Fly route every chunk straight to it
+    routing = {"fly-force-instance-id": created["machine_id"]} if created.get("machine_id") else {}
+    failures = 0
+    while offset < len(data):
+        chunk = data[offset:offset + chunk_size]
+        headers = {
+            "Upload-Offset": str(offset),
+            "Upload-Checksum": "sha256 " + base64.b64encode(hashlib.sha256(chunk).digest()).decode(),
+            "Content-Type": "application/offset+octet-stream",
+            **routing
+        }
+        try:
+            response = session.patch(url, data=chunk, headers=headers, timeout=(10, 120))
+            if response.status_code == 200:
+                offset = int(response.headers.get("Upload-Offset", offset + len(chunk)))
+                failures = 0
+                if on_progress is not None:
+                    on_progress(offset / len(data))
+                continue
+            # 409 (offset out of sync) and 460 (checksum mismatch) are resolved by resyncing below
+            if response.status_code not in (409, 460) and response.status_code < 500:
+                st.error(f"⚠️ Upload failed: {response.status_code} - {response.text}")
+                return None
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Chunk upload at offset {offset} failed: {str(e)}")
+
+        failures += 1
+        if failures > RESUMABLE_MAX_FAILURES:
+            st.error("⚠️ The upload keeps failing. Please check your connection and try again.")
+            return None
+        time.sleep(min(2 ** failures, 30))
+        # Ask the server how much it has and resend only the missing part
+        try:
+            status = session.get(url, headers=routing, timeout=(10, 30))
+            if status.status_code == 200:
+                offset = status.json()["offset"]
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Could not query upload offset: {str(e)}")
+
+    return created["upload_id"]
+
+JOB_STAGE_MESSAGES = {
+    "transcribe": "🎙️ Transcribing video...",
+    "extract": "📄 Extracting text...",
+    "generate": "✍️ Generating release notes...",
+    "store": "💾 Saving results...",
+    "cleanup": "🧹 Finishing up...",
+}
+
+def wait_for_job(job_id, on_progress=None, poll_interval=2.0, timeout=3600):
+    """Poll a background job until it finishes; returns its result, or None if it failed"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = handle_api_request("GET", f"/api/jobs/{job_id}", timeout=(10, 30))
+        if status is None:
+            return None
+        if on_progress is not None:
+            on_progress(status)
+        if status["status"] == "succeeded":
+            return handle_api_request("GET", f"/api/jobs/{job_id}/result", timeout=(10, 60))
+        if status["status"] == "failed":
+            st.error(f"⚠️ {status.get('error') or 'Processing failed'}")
+            return None
+        time.sleep(poll_interval)
+
+    st.error("⚠️ Processing is taking longer than expected. Please check back later.")
+    return None
+
+STAGE_MESSAGES = {
+    "extracted": "📄 Text extracted",
+    "uploaded": "📤 Upload received",
+    "transcribing": "🎙️ Transcribing video...",
+    "transcribed": "📝 Transcript ready",
+    "language_detected": "🌐 Language detected: {language}",
+    "chunking": "✂️ Processing {chunks} section(s)",
+    "chunk_done": "✅ Section {chunk}/{total} done",
+    "combining": "🔗 Combining {sections} sections",
+}
+
+def render_release_notes_stream(events):
+    """Render streamed release notes as they arrive; returns the final response or None on error"""
+    status_text = st.empty()
+    text_placeholder = st.empty()
+    generated_text = ""
+
+    for event, data in events:
+        if event == "token":
+            generated_text += data.get("text", "")
+            text_placeholder.markdown(generated_text + "▌")
+        elif event == "done":
+            status_text.empty()
+            text_placeholder.markdown(data.get("content", generated_text))
+            return {"success": True, **data}
+        elif event == "error":
+            status_text.empty()
+            st.error(f"⚠️ {data.get('detail', 'Unknown error')}")
+            return None
+        elif event in STAGE_MESSAGES:
+            status_text.caption(STAGE_MESSAGES[event].format(**data))
+
+    st.error("⚠️ The connection closed before the release notes were complete.")
+    return None
 
 def generate_descriptive_filename(response, input_files: Optional[list] = None) -> str:
     """Generate a descriptive filename for release notes based on content and input files.
@@ -344,25 +501,36 @@ def generate_pdf(generated_text):
     pdf_buffer.seek(0)
     return pdf_buffer
 
-def display_release_notes(response, input_files=None):
-    """Display the generated release notes and download buttons"""
+def display_release_notes(response=None, input_files=None, events=None):
+    """Display the generated release notes and download buttons
+
+    Pass events (from stream_api_request) to render the text as it arrives.
+    Returns the final response, or None if generation failed.
+    """
     import json
     
-    # Handle JSON responses
-    if isinstance(response, dict):
+    if events is not None:
+        st.markdown("### Generated Release Notes:")
+        response = render_release_notes_stream(events)
+        if response is None:
+            return None
         generated_text = response.get('content', '')
-    elif isinstance(response, str):
-        try:
-            response_dict = json.loads(response)
-            generated_text = response_dict.get('content', response)
-        except json.JSONDecodeError:
-            generated_text = response
     else:
-        generated_text = str(response)
-    
-    # Display the generated text
-    st.markdown("### Generated Release Notes:")
-    st.write(generated_text)
+        # Handle JSON responses
+        if isinstance(response, dict):
+            generated_text = response.get('content', '')
+        elif isinstance(response, str):
+            try:
+                response_dict = json.loads(response)
+                generated_text = response_dict.get('content', response)
+            except json.JSONDecodeError:
+                generated_text = response
+        else:
+            generated_text = str(response)
+        
+        # Display the generated text
+        st.markdown("### Generated Release Notes:")
+        st.write(generated_text)
     
     # Generate descriptive filename base
     filename_base = generate_descriptive_filename(response, input_files)
@@ -395,6 +563,8 @@ def display_release_notes(response, input_files=None):
     except Exception as e:
         st.error(f"Error creating TXT download: {str(e)}")
 
+    return response
+
 def check_file_size(file, file_type='document') -> Optional[str]:
     """Check if file size is within limits based on file type"""
     limit = MAX_FILE_SIZE_MB['media'] if file_type == 'media' else MAX_FILE_SIZE_MB['document']
@@ -505,20 +675,10 @@ def main():
                             # Prepare files for backend processing
                             files = [("files", (doc_file.name, doc_file.getvalue(), doc_file.type)) for doc_file in doc_files]
 
-                            with st.spinner("Generating release notes..."):
-                                # Call backend to process files
-                                response = handle_api_request(
-                                    "POST",
-                                    "/api/generate-release-notes",
-                                    files=files
-                                )
-
-                                if response and response.get("success"):
-                                    st.success("✅ Successfully generated release notes")
-                                    display_release_notes(response, doc_files)
-                                else:
-                                    error_msg = response.get("message", "Unknown error") if response else "Failed to get response"
-                                    st.error(f"Failed to process files: {error_msg}")
+                            # Stream the release notes so text appears as soon as it is generated
+                            events = stream_api_request("/api/generate-release-notes/stream", files=files)
+                            if display_release_notes(input_files=doc_files, events=events):
+                                st.success("✅ Successfully generated release notes")
                         except Exception as e:
                             st.error(f"❌ Error processing files: {str(e)}")
                             logger.error(f"Error processing files: {str(e)}")
@@ -568,46 +728,47 @@ def main():
                                     progress_bar, status_text, time_remaining = display_processing_status(len(media_files))
                                     
                                     # Update progress indicators
-                                    progress_bar.progress(0.3)
+                                    progress_bar.progress(0.0)
                                     status_text.text(f"Processing {media_file.name}...")
                                     
-                                    # Process file
-                                    files = {"file": (media_file.name, media_file.getvalue(), media_file.type)}
+                                    # Upload in resumable chunks, then process as a background job and poll it,
+                                    # so flaky connections and long videos don't restart from scratch
+                                    def show_upload(fraction):
+                                        progress_bar.progress(0.1 * fraction)
+                                        status_text.text(f"Uploading {media_file.name}... {int(fraction * 100)}%")
+
+                                    upload_id = upload_resumable(media_file.getvalue(), media_file.name, "video", show_upload)
+                                    submitted = handle_api_request(
+                                        "POST", f"/api/uploads/{upload_id}/finalize", timeout=(10, 120)
+                                    ) if upload_id else None
+
+                                    def show_progress(job):
+                                        progress_bar.progress(min(1.0, 0.1 + 0.9 * job.get("progress", 0)))
+                                        status_text.text(JOB_STAGE_MESSAGES.get(job.get("stage"), f"Processing {media_file.name}..."))
+                                        time_remaining.text(f"⏱️ Elapsed: {int(time.time() - start_time)}s")
+
+                                    result = wait_for_job(submitted["job_id"], show_progress) if submitted else None
+                                    response = display_release_notes(
+                                        response={**result, "content": result["release_notes"]},
+                                        input_files=[media_file]
+                                    ) if result else None
                                     
-                                    with st.spinner(f"Generating release notes for {media_file.name}..."):
-                                        response = handle_api_request(
-                                            "POST",
-                                            "/api/upload-video",
-                                            files=files
-                                        )
+                                    if response:
+                                        progress_bar.progress(1.0)
+                                        status_text.text("Processing complete!")
+                                        time_remaining.text(f"Total time: {int(time.time() - start_time)}s")
+                                        st.success(f"✅ Successfully processed {media_file.name}")
                                         
-                                        if response:
-                                            progress_bar.progress(1.0)
-                                            status_text.text("Processing complete!")
-                                            time_remaining.text(f"Total time: {int(time.time() - start_time)}s")
-                                            st.success(f"✅ Successfully processed {media_file.name}")
-                                            
-                                            # Create a response object that matches our expected format
-                                            notes_response = {
-                                                "success": True,
-                                                "content": response["release_notes"],
-                                                "token_usage": response.get("token_usage", 0)
-                                            }
-                                            
-                                            # Display stats and release notes in a new container
-                                            display_release_notes(notes_response, [media_file])
-                                            
-                                            # Show transcript in expandable section with consistent styling
-                                            with st.expander("📝 View Original Transcript", expanded=False):
-                                                st.markdown("""
-                                                <div class="content-container">
-                                                    <div class="release-notes">
-                                                """, unsafe_allow_html=True)
-                                                st.text_area("Full Transcript", response["transcript"], height=200)
-                                                st.markdown("</div></div>", unsafe_allow_html=True)
-                                        else:
-                                            error_msg = response.get("detail", "Unknown error") if response else "Failed to get response"
-                                            st.error(f"Failed to process {media_file.name}: {error_msg}")
+                                        # Show transcript in expandable section with consistent styling
+                                        with st.expander("📝 View Original Transcript", expanded=False):
+                                            st.markdown("""
+                                            <div class="content-container">
+                                                <div class="release-notes">
+                                            """, unsafe_allow_html=True)
+                                            st.text_area("Full Transcript", response["transcript"], height=200)
+                                            st.markdown("</div></div>", unsafe_allow_html=True)
+                                    else:
+                                        st.error(f"Failed to process {media_file.name}")
                                 except Exception as e:
                                     st.error(f"❌ Error processing {media_file.name}: {str(e)}")
                                     logger.error(f"Error processing {media_file.name}: {str(e)}")
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Audio preprocessing before transcription; Whisper only needs a mono speech track
+AUDIO_EXTRACTION = os.getenv("AUDIO_EXTRACTION", "true").lower() not in ("0", "false", "no")
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "24k")
+AUDIO_EXTRACTION_TIMEOUT = float(os.getenv("AUDIO_EXTRACTION_TIMEOUT", "300"))
+# Assumed upload throughput to the transcription API, used to estimate time saved
+TRANSCRIPTION_UPLOAD_MBPS = float(os.getenv("TRANSCRIPTION_UPLOAD_MBPS", "20"))
+# Long audio is split at silences into segments of about this length
+SEGMENT_TARGET_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "300"))
+SEGMENT_MAX_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_MAX_SECONDS", "420"))
+SILENCE_NOISE = os.getenv("SILENCE_NOISE", "-30dB")
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "0.5"))
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_PROGRESS_TIME_RE = re.compile(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START_RE = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END_RE = re.compile(r"silence_end: (\d+(?:\.\d+)?)")
+
+
+@dataclass
+class AudioExtraction:
+    """Outcome of preparing a media file for transcription"""
+    path: str
+    extracted: bool
+    original_bytes: int
+    audio_bytes: int
+    seconds: float = 0.0
+    reason: str = ""
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.original_bytes - self.audio_bytes)
+
+    @property
+    def upload_seconds_saved(self) -> float:
+        """Estimated upload time saved at TRANSCRIPTION_UPLOAD_MBPS"""
+        if TRANSCRIPTION_UPLOAD_MBPS <= 0:
+            return 0.0
+        return self.bytes_saved * 8 / (TRANSCRIPTION_UPLOAD_MBPS * 1_000_000)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("path")
+        data["seconds"] = round(self.seconds, 3)
+        data["bytes_saved"] = self.bytes_saved
+        data["reduction_ratio"] = round(self.audio_bytes / self.original_bytes, 4) if self.original_bytes else 1.0
+        data["estimated_seconds_saved"] = round(self.upload_seconds_saved - self.seconds, 3)
+        return data
+
+
+@dataclass
+class AudioSegment:
+    """A slice of an audio file, with its offset in the original recording"""
+    index: int
+    path: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_PATH) is not None
+
+
+def audio_output_path(media_path: str) -> str:
+    return str(Path(media_path).with_suffix(".audio.ogg"))
+
+
+async def run_ffmpeg(args: List[str], loglevel: str = "error", timeout: float = AUDIO_EXTRACTION_TIMEOUT) -> str:
+    """Run ffmpeg as a subprocess and return its log output; raises on failure or timeout"""
+    command = [FFMPEG_PATH, "-nostdin", "-hide_banner", "-loglevel", loglevel, "-y", *args]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    output = stderr.decode(errors="replace")
+    if process.returncode != 0:
+        raise RuntimeError(output.strip()[-500:] or f"exit code {process.returncode}")
+    return output
+
+
+def _unchanged(media_path: str, size: int, reason: str) -> AudioExtraction:
+    metrics.increment("audio.extraction_skipped")
+    return AudioExtraction(path=media_path, extracted=False, original_bytes=size, audio_bytes=size, reason=reason)
+
+
+async def extract_audio(media_path: str) -> AudioExtraction:
+    """
+    Demux the first audio track and transcode it to 16kHz mono Opus.
+
+    ffmpeg runs as a subprocess so the event loop stays free. If extraction
+    is disabled, ffmpeg is missing or it fails, the original file is used
+    unchanged. The caller owns the returned path when `extracted` is true.
+    """
+    size = Path(media_path).stat().st_size
+    if not AUDIO_EXTRACTION:
+        return _unchanged(media_path, size, "disabled")
+    if not ffmpeg_available():
+        logger.warning(f"ffmpeg not found at '{FFMPEG_PATH}'; sending the original file for transcription")
+        return _unchanged(media_path, size, "ffmpeg not found")
+
+    output_path = audio_output_path(media_path)
+    start = time.perf_counter()
+    try:
+        await run_ffmpeg([
+            "-i", media_path,
+            "-map", "0:a:0", "-vn",
+            "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+            "-c:a", "libopus", "-b:a", AUDIO_BITRATE, "-application", "voip",
+            output_path
+        ])
+        audio_bytes = Path(output_path).stat().st_size
+        if audio_bytes == 0:
+            raise RuntimeError("ffmpeg produced an empty file")
+    except Exception as e:
+        Path(output_path).unlink(missing_ok=True)
+        reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+        logger.warning(f"Audio extraction failed for {media_path}, using original file: {reason}")
+        metrics.increment("audio.extraction_failed")
+        return _unchanged(media_path, size, reason)
+
+    result = AudioExtraction(
+        path=output_path,
+        extracted=True,
+        original_bytes=size,
+        audio_bytes=audio_bytes,
+        seconds=time.perf_counter() - start
+    )
+    metrics.increment("audio.extracted")
+    metrics.increment("audio.bytes_saved", result.bytes_saved)
+    metrics.increment("audio.extraction_seconds", result.seconds)
+    logger.info(
+        f"Extracted audio from {media_path}: {size} -> {audio_bytes} bytes "
+        f"in {result.seconds:.2f}s (~{result.upload_seconds_saved:.1f}s upload saved)"
+    )
+    return result
+
+
+def parse_duration(output: str) -> float:
+    """Media duration from ffmpeg's log output; 0.0 if it doesn't report one"""
+    # Containers without a duration header still report how far decoding got
+    matches = _DURATION_RE.findall(output) or _PROGRESS_TIME_RE.findall(output)[-1:]
+    if not matches:
+        return 0.0
+    hours, minutes, seconds = matches[0]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _probe_args(media_path: str) -> List[str]:
+    # Stream-copying the first audio track to nowhere reads the file without decoding it
+    return ["-i", media_path, "-map", "0:a:0", "-c", "copy", "-f", "null", "-"]
+
+
+async def probe_duration(media_path: str) -> float:
+    """Duration of a file's audio in seconds; 0.0 if ffmpeg is missing or can't read it"""
+    if not ffmpeg_available():
+        return 0.0
+    try:
+        return parse_duration(await run_ffmpeg(_probe_args(media_path), loglevel="info"))
+    except Exception as e:
+        logger.warning(f"Could not probe the duration of {media_path}: {str(e)}")
+        return 0.0
+
+
+def probe_duration_sync(media_path: str) -> float:
+    """Blocking probe_duration for code already running off the event loop"""
+    if not ffmpeg_available():
+        return 0.0
+    command = [FFMPEG_PATH, "-nostdin", "-hide_banner", "-loglevel", "info", *_probe_args(media_path)]
+    try:
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=AUDIO_EXTRACTION_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not probe the duration of {media_path}: {str(e)}")
+        return 0.0
+    return parse_duration(process.stderr.decode(errors="replace")) if process.returncode == 0 else 0.0
+
+
+async def detect_silences(audio_path: str) -> Tuple[float, List[Tuple[float, float]]]:
+    """Return the audio duration and the (start, end) of each detected silence"""
+    output = await run_ffmpeg(
+        ["-i", audio_path, "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_SECONDS}", "-f", "null", "-"],
+        loglevel="info"
+    )
+    duration = parse_duration(output)
+
+    silences = []
+    silence_start = None
+    for line in output.splitlines():
+        if match := _SILENCE_START_RE.search(line):
+            silence_start = max(0.0, float(match.group(1)))
+        elif (match := _SILENCE_END_RE.search(line)) and silence_start is not None:
+            silences.append((silence_start, float(match.group(1))))
+            silence_start = None
+    if silence_start is not None and duration:
+        silences.append((silence_start, duration))
+    return duration, silences
+
+
+def plan_segments(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    target_seconds: float = SEGMENT_TARGET_SECONDS,
+    max_seconds: float = SEGMENT_MAX_SECONDS
+) -> List[Tuple[float, float]]:
+    """
+    Choose segment boundaries no longer than max_seconds.
+
+    Each cut is placed in the middle of the silence closest to target_seconds
+    after the previous cut; without a usable silence the segment is cut hard
+    at max_seconds.
+    """
+    max_seconds = max(max_seconds, target_seconds)
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    bounds = []
+    start = 0.0
+    while duration - start > max_seconds:
+        candidates = [m for m in midpoints if start + target_seconds / 2 <= m <= start + max_seconds]
+        cut = min(candidates, key=lambda m: abs(m - (start + target_seconds))) if candidates else start + max_seconds
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, duration))
+    return bounds
+
+
+async def split_audio(audio_path: str) -> List[AudioSegment]:
+    """
+    Split audio at silences into bounded segments.
+
+    Audio no longer than SEGMENT_MAX_SECONDS comes back as a single segment
+    pointing at the input file. Otherwise the segments are written next to it
+    with one stream-copy ffmpeg pass, and the caller owns those files.
+    """
+    start = time.perf_counter()
+    duration, silences = await detect_silences(audio_path)
+    bounds = plan_segments(duration, silences)
+    if len(bounds) == 1:
+        return [AudioSegment(index=0, path=audio_path, start=0.0, end=duration)]
+
+    suffix = Path(audio_path).suffix
+    pattern = f"{Path(audio_path).with_suffix('')}.seg%03d{suffix}"
+    segment_times = ",".join(f"{end:.3f}" for _, end in bounds[:-1])
+    await run_ffmpeg([
+        "-i", audio_path,
+        "-f", "segment", "-segment_times", segment_times, "-reset_timestamps", "1",
+        "-c", "copy", pattern
+    ])
+
+    segments = [
+        AudioSegment(index=i, path=pattern % i, start=seg_start, end=seg_end)
+        for i, (seg_start, seg_end) in enumerate(bounds)
+    ]
+    missing = [s.path for s in segments if not Path(s.path).exists()]
+    if missing:
+        for segment in segments:
+            Path(segment.path).unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg did not write {len(missing)} of {len(segments)} segments")
+
+    metrics.increment("audio.segments", len(segments))
+    logger.info(
+        f"Split {duration:.0f}s of audio into {len(segments)} segments at "
+        f"{len(silences)} detected silences in {time.perf_counter() - start:.2f}s"
+    )
+    return segments
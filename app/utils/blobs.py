@@ -0,0 +1,55 @@
+import hashlib
+import logging
+import os
+import zlib
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is used without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Compression settings for stored release text
+BLOB_CODEC = os.getenv("BLOB_CODEC", "auto")  # auto (zstd when installed), zstd or zlib
+BLOB_ZSTD_LEVEL = int(os.getenv("BLOB_ZSTD_LEVEL", "10"))
+BLOB_ZLIB_LEVEL = int(os.getenv("BLOB_ZLIB_LEVEL", "6"))
+
+
+class BlobCodecError(Exception):
+    """Raised when a blob uses a codec this process can't decode"""
+    pass
+
+
+def blob_hash(text: str) -> str:
+    """Content address of a text: the sha256 of its UTF-8 encoding"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def default_codec() -> str:
+    if BLOB_CODEC == "zstd" or (BLOB_CODEC == "auto" and zstandard is not None):
+        if zstandard is None:
+            logger.warning("BLOB_CODEC is zstd but zstandard is not installed; using zlib")
+            return "zlib"
+        return "zstd"
+    return "zlib"
+
+
+def compress_text(text: str) -> Tuple[str, bytes]:
+    """Compress text with the configured codec; returns (codec, data)"""
+    raw = text.encode("utf-8")
+    codec = default_codec()
+    if codec == "zstd":
+        return codec, zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL).compress(raw)
+    return codec, zlib.compress(raw, BLOB_ZLIB_LEVEL)
+
+
+def decompress_text(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise BlobCodecError("This blob is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise BlobCodecError(f"Unknown blob codec: {codec}")
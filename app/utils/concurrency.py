@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Failure policies for bounded task runs
+FAIL_FAST = "fail_fast"
+ALLOW_PARTIAL = "partial"
+FAILURE_POLICIES = (FAIL_FAST, ALLOW_PARTIAL)
+
+
+@dataclass
+class TaskResult:
+    """Outcome of a single task in a bounded run"""
+    index: int
+    success: bool
+    value: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+    exception: Optional[Exception] = field(default=None, repr=False)  # what the worker raised
+
+
+class BoundedTaskError(Exception):
+    """Raised when a task fails under the fail-fast policy"""
+
+    def __init__(self, result: TaskResult):
+        self.result = result
+        super().__init__(f"Task {result.index + 1} failed: {result.error}")
+
+
+async def run_bounded(
+    items: Sequence[Any],
+    worker: Callable[[int, Any], Awaitable[Any]],
+    max_concurrency: int = 4,
+    failure_policy: str = FAIL_FAST,
+    label: str = "task"
+) -> List[TaskResult]:
+    """
+    Run worker(index, item) for every item with at most max_concurrency in flight.
+
+    Results are returned in input order. With the fail-fast policy the first
+    failure cancels all outstanding tasks and raises BoundedTaskError; with the
+    partial policy failures are returned as unsuccessful TaskResults.
+    """
+    if failure_policy not in FAILURE_POLICIES:
+        raise ValueError(f"Unknown failure policy: {failure_policy}")
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    total = len(items)
+
+    async def _run(index: int, item: Any) -> TaskResult:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                value = await worker(index, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = TaskResult(
+                    index=index,
+                    success=False,
+                    error=str(e),
+                    duration=time.perf_counter() - start,
+                    exception=e
+                )
+                logger.error(f"{label} {index + 1}/{total} failed after {result.duration:.2f}s: {str(e)}")
+                if failure_policy == FAIL_FAST:
+                    raise BoundedTaskError(result) from e
+                return result
+
+            result = TaskResult(index=index, success=True, value=value, duration=time.perf_counter() - start)
+            logger.info(f"{label} {index + 1}/{total} completed in {result.duration:.2f}s")
+            return result
+
+    tasks = [asyncio.create_task(_run(i, item)) for i, item in enumerate(items)]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        # Cancel anything still running so a failure or timeout doesn't leak requests
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
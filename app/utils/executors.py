@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Execution model for the async routes:
+# - network calls use async clients directly on the event loop
+# - blocking file and database I/O runs on the bounded I/O pool
+# - CPU-heavy C-extension work (PyMuPDF parsing, etc.) runs on the bounded CPU pool
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(max(2, os.cpu_count() or 1))))
+# Password hashing gets its own small pool so login bursts can't starve other work
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "2"))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "16"))  # running plus waiting; more are refused
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_LAG_WARN_SECONDS = float(os.getenv("LOOP_LAG_WARN_SECONDS", "0.2"))
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised instead of queueing when a pool already has max_pending calls"""
+    pass
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a fixed size that reports pending and active work.
+
+    With max_pending set, calls beyond that many running or waiting are
+    refused with ExecutorSaturatedError rather than queued.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.pending = 0
+        metrics.register_gauge(f"executor.{name}.pending", lambda: self.pending)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result"""
+        with self._lock:
+            if self.max_pending is not None and self.pending >= self.max_pending:
+                metrics.increment(f"executor.{self.name}.rejected")
+                raise ExecutorSaturatedError(f"The {self.name} pool is at capacity")
+            self.pending += 1
+        metrics.increment(f"executor.{self.name}.submitted")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+io_executor = BoundedExecutor("io", IO_POOL_SIZE)
+cpu_executor = BoundedExecutor("cpu", CPU_POOL_SIZE)
+password_executor = BoundedExecutor("password", PASSWORD_POOL_SIZE, max_pending=PASSWORD_MAX_PENDING)
+
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking file or database I/O off the event loop"""
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run CPU-bound or C-extension work off the event loop"""
+    return await cpu_executor.run(fn, *args, **kwargs)
+
+
+async def run_password(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run password hashing or verification; raises ExecutorSaturatedError when the pool is full"""
+    return await password_executor.run(fn, *args, **kwargs)
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a timed sleep.
+
+    Lag above LOOP_LAG_WARN_SECONDS means something blocked the loop and is
+    logged as a warning; the latest and peak values are exported as gauges.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, warn_seconds: float = LOOP_LAG_WARN_SECONDS):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+        metrics.register_gauge("event_loop.lag_seconds", lambda: round(self.last_lag, 4))
+        metrics.register_gauge("event_loop.max_lag_seconds", lambda: round(self.max_lag, 4))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_seconds:
+                metrics.increment("event_loop.lag_warnings")
+                logger.warning(f"Event loop blocked for {lag:.3f}s")
+
+    def stats(self) -> Dict[str, float]:
+        return {"last_lag_seconds": round(self.last_lag, 4), "max_lag_seconds": round(self.max_lag, 4)}
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -1,48 +1,40 @@
-from typing import Dict, List, Tuple
-import io
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import contextlib
 import logging
 from pathlib import Path
-from openai import OpenAI
 import os
-from .openai_agent import OpenAIAgent
+from .openai_agent import get_agent
+from .executors import run_cpu, run_io
+from .usage import UsageLedger
+from .audio import AudioSegment, extract_audio, probe_duration, split_audio
+from .concurrency import run_bounded, BoundedTaskError, FAIL_FAST
+from .generation_context import GenerationContext
+from .transcription import (
+    TranscriptionBackend,
+    cacheable_models,
+    select_backend,
+    transcribe,
+    get_transcript_cache,
+    transcript_cache_key
+)
+from . import metrics
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI()
-
 # Constants for file validation
 MAX_FILE_SIZE_MB = 100  # Increased for video files
-CHUNK_SIZE = 1024 * 1024  # 1MB chunks for reading
+TEMP_VIDEO_DIR = "temp_videos"
 SUPPORTED_VIDEO_FORMATS = ['mp4', 'mpeg', 'm4v', 'mov', 'avi', 'wmv']
+# Segments of one recording transcribed in parallel, and retries per failed segment
+TRANSCRIPTION_MAX_CONCURRENCY = int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "4"))
+TRANSCRIPTION_SEGMENT_RETRIES = int(os.getenv("TRANSCRIPTION_SEGMENT_RETRIES", "2"))
 
 class FileValidationError(Exception):
     """Custom exception for file validation errors"""
     pass
 
-async def validate_file_with_streaming(file_stream: io.BytesIO) -> Tuple[bool, str]:
-    """
-    Validate file size using streaming to handle large files efficiently
-    """
-    try:
-        size = 0
-        while chunk := file_stream.read(CHUNK_SIZE):
-            size += len(chunk)
-            if size > MAX_FILE_SIZE_MB * 1024 * 1024:
-                raise FileValidationError(
-                    f"File size exceeds {MAX_FILE_SIZE_MB}MB limit. Please upload a smaller file."
-                )
-        
-        # Reset stream position
-        file_stream.seek(0)
-        return True, ""
-    except FileValidationError as e:
-        return False, str(e)
-    except Exception as e:
-        logger.error(f"Error validating file: {str(e)}")
-        return False, f"Error validating file: {str(e)}"
-
 def validate_video_format(filename: str) -> Tuple[bool, str]:
     """
     Validate if the file is a supported video format
@@ -62,10 +54,85 @@ def validate_video_format(filename: str) -> Tuple[bool, str]:
         logger.error(f"Error validating video format: {str(e)}")
         return False, f"Error validating video format: {str(e)}"
 
-async def process_video_for_transcript(file_path: str) -> Tuple[bool, str]:
+async def extract_document_text(path: str, filename: str) -> str:
+    """Extract the text of a spooled document; PyMuPDF parsing runs on the CPU pool"""
+    success, content = await run_cpu(get_agent().extract_text_from_file, path)
+    if not success:
+        logger.error(f"Failed to extract content from file: {filename}")
+        raise FileValidationError(f"Failed to extract content from file: {filename}")
+    return content
+
+def _timed(ctx: Optional[GenerationContext], stage: str):
+    return ctx.timed(stage) if ctx is not None else contextlib.nullcontext()
+
+
+async def transcribe_segment(
+    segment: AudioSegment,
+    backend: TranscriptionBackend,
+    ledger: Optional[UsageLedger] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe one audio segment, retrying it on its own if it fails.
+
+    Timestamps in the result are shifted by the segment's offset so they
+    refer to the original recording.
+    """
+    attempts = TRANSCRIPTION_SEGMENT_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            transcript = await transcribe(backend, segment.path)
+            break
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            metrics.increment("transcription.segment_retries")
+            logger.warning(f"Transcription of segment {segment.index + 1} failed (attempt {attempt}/{attempts}): {str(e)}")
+            await asyncio.sleep(2 ** (attempt - 1))
+
+    # The audio duration is what Whisper bills for; local transcription is free
+    if ledger is not None:
+        ledger.record_transcription(backend.model, transcript.duration)
+
+    timed_segments = [
+        {"start": round(segment.start + s["start"], 2), "end": round(segment.start + s["end"], 2), "text": s["text"]}
+        for s in transcript.segments
+    ]
+    if not timed_segments:
+        duration = transcript.duration or segment.duration
+        timed_segments = [{"start": round(segment.start, 2), "end": round(segment.start + duration, 2), "text": transcript.text}]
+    return {"text": transcript.text, "segments": timed_segments}
+
+
+def stitch_transcripts(results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Join per-segment transcripts, in order, into one text and one timestamped segment list"""
+    text = " ".join(r["text"] for r in results if r["text"])
+    segments = [s for r in results for s in r["segments"] if s["text"]]
+    return text, segments
+
+
+async def process_video_for_transcript(
+    file_path: str,
+    ledger: Optional[UsageLedger] = None,
+    ctx: Optional[GenerationContext] = None,
+    backend: Optional[str] = None,
+    media_sha256: Optional[str] = None
+) -> Tuple[bool, str]:
     """
-    Process video file and get transcript using OpenAI
+    Process video file and get transcript
+
+    If media_sha256 is given, a cached transcript of identical media is used
+    instead of transcribing again. Otherwise the audio track is extracted and
+    compressed with ffmpeg when possible, long audio is split at silences and
+    the segments are transcribed in parallel. The transcription backend is
+    `backend` if given, else chosen by TRANSCRIPTION_BACKEND and the duration
+    of the audio. The transcribed audio duration is recorded in the
+    ledger (or ctx.usage); extraction stats, the cache outcome and the
+    timestamped transcript segments are recorded in ctx.media, and on
+    failure ctx.failure_retryable tells whether the cause was transient.
     """
+    if ledger is None and ctx is not None:
+        ledger = ctx.usage
+    temp_paths: List[str] = []
     try:
         logger.info(f"Starting to process video file: {file_path}")
         
@@ -81,67 +148,100 @@ async def process_video_for_transcript(file_path: str) -> Tuple[bool, str]:
         if file_size == 0:
             logger.error("Video file is empty")
             return False, "Video file is empty"
+
+        # Identical media was transcribed before by an acceptable backend: reuse it at no cost
+        cache = get_transcript_cache()
+        cached = None
+        if ctx is not None:
+            ctx.media["transcript_cache_hit"] = False
+        if media_sha256:
+            for model in cacheable_models(backend):
+                if (cached := await run_io(cache.get, transcript_cache_key(media_sha256, model))) is not None:
+                    break
+        if cached is not None:
+            logger.info(f"Transcript cache hit for media {media_sha256[:12]} ({cached.get('model', '')})")
+            if ledger is not None:
+                ledger.record_transcription(cached.get("model", ""), cached.get("duration", 0), cached=True)
+            if ctx is not None:
+                ctx.media["transcript_cache_hit"] = True
+                ctx.media["transcript_segments"] = cached.get("segments", [])
+            return True, cached["text"]
+
+        # Upload only a compact audio track; falls back to the original file
+        extraction = await extract_audio(file_path)
+        segments = [AudioSegment(index=0, path=extraction.path, start=0.0, end=0.0)]
+        if extraction.extracted:
+            temp_paths.append(extraction.path)
+            try:
+                with _timed(ctx, "silence_detection"):
+                    segments = await split_audio(extraction.path)
+                temp_paths.extend(s.path for s in segments if s.path != extraction.path)
+            except Exception as e:
+                logger.warning(f"Could not split audio, transcribing it in one request: {str(e)}")
+        if ctx is not None:
+            ctx.media["audio_extraction"] = extraction.to_dict()
+            ctx.timings["audio_extraction"] = round(extraction.seconds, 3)
             
+        # Splitting already measured the audio; otherwise probe it to route by length
+        duration = segments[-1].end or await probe_duration(extraction.path)
+        transcription_backend = select_backend(duration, backend)
         try:
-            with open(file_path, "rb") as video_file:
-                logger.info("Sending video to OpenAI Whisper API")
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=video_file,
-                    response_format="text"
+            logger.info(f"Transcribing {len(segments)} audio segment(s) with the {transcription_backend.name} backend")
+            with _timed(ctx, "transcription"):
+                results = await run_bounded(
+                    segments,
+                    lambda i, segment: transcribe_segment(segment, transcription_backend, ledger),
+                    max_concurrency=TRANSCRIPTION_MAX_CONCURRENCY,
+                    failure_policy=FAIL_FAST,
+                    label="Transcription segment"
                 )
-                
-                if not transcript:
-                    logger.error("Received empty transcript from Whisper API")
-                    return False, "Failed to generate transcript - empty response"
-                    
-                logger.info(f"Successfully generated transcript of length: {len(transcript)}")
-                return True, transcript
-                
-        except Exception as api_error:
-            logger.error(f"OpenAI API error: {str(api_error)}")
-            return False, f"OpenAI API error: {str(api_error)}"
-            
-    except Exception as e:
-        logger.error(f"Error processing video transcript: {str(e)}")
-        return False, f"Error processing video transcript: {str(e)}"
+        except BoundedTaskError as segment_error:
+            failed = segment_error.result
+            logger.error(f"Transcription error: {failed.error}")
+            if ctx is not None:
+                ctx.record_failure(failed.exception)
+            return False, f"Transcription error on audio segment {failed.index + 1}: {failed.error}"
 
-async def save_temp_video(file_stream: io.BytesIO, filename: str) -> Tuple[bool, str]:
-    """
-    Save uploaded video to temporary location
-    """
-    try:
-        logger.info(f"Saving video file: {filename}")
-        temp_dir = Path("temp_videos")
-        temp_dir.mkdir(exist_ok=True)
-        
-        # Ensure file stream is at the beginning
-        file_stream.seek(0)
-        
-        file_path = temp_dir / filename
-        logger.info(f"Saving to path: {file_path}")
-        
-        content = file_stream.getvalue()
-        logger.info(f"File content size: {len(content)} bytes")
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
+        text, timed_segments = stitch_transcripts([r.value for r in results])
+        if ctx is not None:
+            ctx.media["transcription"] = {
+                "backend": transcription_backend.name,
+                "model": transcription_backend.model,
+                "segments": len(segments),
+                "segment_seconds": [round(r.duration, 3) for r in results]
+            }
+            ctx.media["transcript_segments"] = timed_segments
+
+        if not text:
+            logger.error("Received empty transcript from Whisper API")
+            return False, "Failed to generate transcript - empty response"
             
-        if not file_path.exists():
-            logger.error(f"File was not created at: {file_path}")
-            return False, "Failed to save video file"
+        if media_sha256:
+            await run_io(cache.set, transcript_cache_key(media_sha256, transcription_backend.model), {
+                "text": text,
+                "segments": timed_segments,
+                "duration": timed_segments[-1]["end"] if timed_segments else 0,
+                "backend": transcription_backend.name,
+                "model": transcription_backend.model
+            })
+
+        logger.info(f"Successfully generated transcript of length: {len(text)}")
+        return True, text
             
-        logger.info(f"Successfully saved video to: {file_path}")
-        return True, str(file_path)
     except Exception as e:
-        logger.error(f"Error saving temporary video: {str(e)}")
-        return False, f"Error saving temporary video: {str(e)}"
+        logger.error(f"Error processing video transcript: {str(e)}")
+        if ctx is not None:
+            ctx.record_failure(e)
+        return False, f"Error processing video transcript: {str(e)}"
+    finally:
+        for path in temp_paths:
+            await cleanup_temp_video(path)
 
 async def cleanup_temp_video(file_path: str):
     """
     Clean up temporary video file
     """
     try:
-        Path(file_path).unlink(missing_ok=True)
+        await run_io(Path(file_path).unlink, missing_ok=True)
     except Exception as e:
         logger.error(f"Error cleaning up temporary video: {str(e)}")
\ No newline at end of file
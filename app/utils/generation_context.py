@@ -0,0 +1,77 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import openai
+
+from .usage import UsageLedger
+
+# Failures that may succeed if the work is simply tried again later
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+    httpx.TransportError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+
+def is_transient_error(error: Optional[BaseException]) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+@dataclass
+class GenerationContext:
+    """
+    Per-request state for one release notes generation.
+
+    The shared OpenAIAgent holds only immutable configuration and clients;
+    everything that changes during a request lives here, so one agent can
+    serve concurrent requests without them overwriting each other.
+    """
+    content: str = ""
+    detected_language: Optional[str] = None
+    usage: UsageLedger = field(default_factory=UsageLedger)
+    chunk_timings: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Audio preprocessing stats for media uploads (size reduction, time saved)
+    media: Dict[str, Any] = field(default_factory=dict)
+    # Optional listener for pipeline progress and streamed tokens, e.g. an SSE response
+    on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    # Set when a (False, message) result came from a transient failure worth retrying
+    failure_retryable: bool = False
+
+    @property
+    def token_usage(self) -> int:
+        """Total billed tokens for this request"""
+        return self.usage.total_tokens
+
+    @property
+    def streaming(self) -> bool:
+        return self.on_event is not None
+
+    def emit(self, event: str, **data) -> None:
+        """Notify the listener, if any, of a pipeline event"""
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+    def emit_token(self, text: str) -> None:
+        self.emit("token", text=text)
+
+    def record_failure(self, error: Optional[BaseException]) -> None:
+        """Note whether the error that failed this request is transient"""
+        self.failure_retryable = is_transient_error(error)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Record the wall-clock duration of a pipeline stage in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = round(self.timings.get(stage, 0) + time.perf_counter() - start, 3)
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    from langdetect import DetectorFactory, detect_langs
+    from langdetect.lang_detect_exception import LangDetectException
+    DetectorFactory.seed = 0  # Make detection deterministic
+except ImportError:  # pragma: no cover - langdetect is in requirements.txt
+    detect_langs = None
+    LangDetectException = Exception
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Local detection settings
+LANGUAGE_CONFIDENCE_THRESHOLD = float(os.getenv("LANGUAGE_CONFIDENCE_THRESHOLD", "0.90"))
+LANGUAGE_SAMPLE_CHARS = int(os.getenv("LANGUAGE_SAMPLE_CHARS", "5000"))
+LANGUAGE_MEMO_SIZE = 1024
+
+_memo = OrderedDict()  # content hash -> language code
+_memo_lock = threading.Lock()
+
+
+def language_sample(text: str) -> str:
+    """Return the part of the text used for language detection"""
+    return text[:LANGUAGE_SAMPLE_CHARS]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def get_memoized_language(sample: str) -> Optional[str]:
+    """Return a previously detected language for this sample, if any"""
+    key = content_hash(sample)
+    with _memo_lock:
+        language = _memo.get(key)
+        if language is not None:
+            _memo.move_to_end(key)
+    return language
+
+
+def memoize_language(sample: str, language: str) -> None:
+    key = content_hash(sample)
+    with _memo_lock:
+        _memo[key] = language
+        _memo.move_to_end(key)
+        while len(_memo) > LANGUAGE_MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def normalize_language_code(code: str) -> str:
+    """Reduce a detector or LLM answer such as 'zh-cn' or 'EN.' to a 2-letter code"""
+    code = (code or "").strip().lower()
+    code = code.split("-")[0].split("_")[0]
+    return "".join(c for c in code if c.isalpha())[:2]
+
+
+def detect_local(sample: str) -> Tuple[Optional[str], float]:
+    """
+    Detect the language in-process with langdetect.
+
+    Returns (language_code, probability), or (None, 0.0) when the text is too
+    short or langdetect is unavailable.
+    """
+    if detect_langs is None or not sample.strip():
+        return None, 0.0
+    try:
+        candidates = detect_langs(sample)
+    except LangDetectException as e:
+        logger.warning(f"Local language detection failed: {str(e)}")
+        return None, 0.0
+
+    if not candidates:
+        return None, 0.0
+    best = candidates[0]
+    return normalize_language_code(best.lang), float(best.prob)
+
+
+def is_confident(language: Optional[str], confidence: float) -> bool:
+    if language and confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        metrics.increment("language_detection.local")
+        return True
+    metrics.increment("language_detection.llm_fallback")
+    return False
@@ -0,0 +1,36 @@
+import threading
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters and gauges, exposed through the /metrics endpoint
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add value to a named counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name: str, callback: Callable[[], float]) -> None:
+    """Register a callback that reports the current value of a gauge"""
+    with _lock:
+        _gauges[name] = callback
+
+
+def snapshot() -> Dict[str, float]:
+    """Return the current value of every counter and gauge"""
+    with _lock:
+        values = dict(_counters)
+        gauges = dict(_gauges)
+
+    for name, callback in gauges.items():
+        try:
+            values[name] = callback()
+        except Exception as e:
+            logger.error(f"Error reading gauge {name}: {str(e)}")
+    return values
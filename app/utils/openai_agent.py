@@ -3,13 +3,32 @@ import fitz  # PyMuPDF
 from openai import OpenAI, AsyncOpenAI
 import logging
 from dotenv import load_dotenv
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Callable, AsyncIterator, Dict, Any
 import json
 import io
 import asyncio
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path  # Added Path import
+from .concurrency import run_bounded, BoundedTaskError, FAIL_FAST, FAILURE_POLICIES
+from .llm_cache import get_llm_cache, LLMCache
+from .generation_context import GenerationContext
+from .usage import UsageLedger
+from .openai_clients import get_openai_client, get_async_openai_client
+from .executors import run_io, run_cpu
+from . import metrics
+from .audio import probe_duration_sync
+from .transcription import select_backend
+from .language import (
+    language_sample,
+    get_memoized_language,
+    memoize_language,
+    normalize_language_code,
+    detect_local,
+    is_confident
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +38,186 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "template.pdf")
+
+# Parsed template text, invalidated when the file's mtime changes
+_template_cache = {"path": None, "mtime": None, "content": ""}
+_template_lock = threading.Lock()
+
+def load_template(template_path: str = TEMPLATE_PATH) -> str:
+    """Return the template text, parsing the PDF only when it changed on disk"""
+    try:
+        mtime = os.stat(template_path).st_mtime
+    except FileNotFoundError:
+        logger.error(f"Template file not found at {template_path}")
+        return ""
+
+    with _template_lock:
+        if _template_cache["path"] == template_path and _template_cache["mtime"] == mtime:
+            return _template_cache["content"]
+
+        try:
+            doc = fitz.open(template_path)
+            content = "\n".join([page.get_text() for page in doc])
+            doc.close()
+        except Exception as e:
+            logger.error(f"Error loading template: {str(e)}")
+            return ""
+
+        if not content.strip():
+            logger.error("Failed to load template content")
+            return ""
+
+        _template_cache.update(path=template_path, mtime=mtime, content=content)
+        logger.info("Successfully loaded template content")
+        return content
+
+# Chunk pipeline settings
+MAX_CHUNK_CONCURRENCY = int(os.getenv("CHUNK_MAX_CONCURRENCY", "4"))
+CHUNK_FAILURE_POLICY = os.getenv("CHUNK_FAILURE_POLICY", FAIL_FAST)
+
+def _usage_to_dict(usage) -> dict:
+    """Convert an OpenAI usage object into a plain dict"""
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0
+    }
+
+def cached_chat_completion(
+    client: OpenAI,
+    use_cache: bool = True,
+    ledger: Optional[UsageLedger] = None,
+    stage: str = "completion",
+    **params
+) -> str:
+    """Run a chat completion through the LLM response cache
+
+    Token usage is recorded in the ledger, if given, under the given stage.
+    """
+    cache = get_llm_cache()
+    key = LLMCache.make_key(**params) if use_cache else None
+    if key and (cached := cache.get(key)) is not None:
+        logger.info(f"LLM cache hit for {params.get('model')}")
+        if ledger is not None:
+            ledger.record_completion(stage, params["model"], cached.get("usage"), cached=True)
+        return cached["content"]
+
+    response = client.chat.completions.create(**params)
+    content = response.choices[0].message.content or ""
+    usage = _usage_to_dict(response.usage)
+    if ledger is not None:
+        ledger.record_completion(stage, params["model"], usage)
+    if key and content:
+        cache.set(key, {"content": content, "usage": usage})
+    return content
+
+async def cached_chat_completion_async(
+    client: AsyncOpenAI,
+    use_cache: bool = True,
+    on_token: Optional[Callable[[str], None]] = None,
+    ledger: Optional[UsageLedger] = None,
+    stage: str = "completion",
+    **params
+) -> str:
+    """Async variant of cached_chat_completion; cache I/O runs on the I/O pool
+
+    When on_token is given the completion is streamed and each content delta
+    is passed to it as it arrives. Cache hits are delivered as one delta.
+    """
+    cache = get_llm_cache()
+    key = LLMCache.make_key(**params) if use_cache else None
+    if key and (cached := await run_io(cache.get, key)) is not None:
+        logger.info(f"LLM cache hit for {params.get('model')}")
+        if ledger is not None:
+            ledger.record_completion(stage, params["model"], cached.get("usage"), cached=True)
+        if on_token is not None:
+            on_token(cached["content"])
+        return cached["content"]
+
+    if on_token is None:
+        response = await client.chat.completions.create(**params)
+        content = response.choices[0].message.content or ""
+        usage = response.usage
+    else:
+        parts = []
+        usage = None
+        stream = await client.chat.completions.create(
+            **params,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_token(chunk.choices[0].delta.content)
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+        content = "".join(parts)
+
+    usage = _usage_to_dict(usage)
+    if ledger is not None:
+        ledger.record_completion(stage, params["model"], usage)
+    if key and content:
+        await run_io(cache.set, key, {"content": content, "usage": usage})
+    return content
+
+def _language_detection_params(text: str) -> dict:
+    """Chat completion parameters for the LLM language detection fallback"""
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": "You are a language detection expert. Respond only with the ISO 639-1 language code of the text."},
+            {"role": "user", "content": f"What is the language code of this text (respond with only the 2-letter code):\n\n{text[:2000]}"}
+        ],
+        "temperature": 0,
+        "max_tokens": 2
+    }
+
+def detect_language(client: OpenAI, text: str, ledger: Optional[UsageLedger] = None) -> str:
+    """
+    Detect the language of text, returning an ISO 639-1 code.
+
+    Uses the in-process detector and only asks the LLM when the local
+    result is below the confidence threshold. Results are memoized per
+    content hash.
+    """
+    sample = language_sample(text)
+    if (memoized := get_memoized_language(sample)) is not None:
+        return memoized
+
+    detected_lang, confidence = detect_local(sample)
+    if not is_confident(detected_lang, confidence):
+        logger.info(f"Local language detection ambiguous ({detected_lang}, {confidence:.2f}); asking the LLM")
+        detected_lang = normalize_language_code(
+            cached_chat_completion(client, ledger=ledger, stage="language_detection", **_language_detection_params(text))
+        )
+
+    detected_lang = detected_lang or 'en'
+    memoize_language(sample, detected_lang)
+    return detected_lang
+
+async def detect_language_async(client: AsyncOpenAI, text: str, ledger: Optional[UsageLedger] = None) -> str:
+    """Async variant of detect_language; local detection runs on the CPU pool"""
+    sample = language_sample(text)
+    if (memoized := get_memoized_language(sample)) is not None:
+        return memoized
+
+    detected_lang, confidence = await run_cpu(detect_local, sample)
+    if not is_confident(detected_lang, confidence):
+        logger.info(f"Local language detection ambiguous ({detected_lang}, {confidence:.2f}); asking the LLM")
+        detected_lang = normalize_language_code(
+            await cached_chat_completion_async(
+                client, ledger=ledger, stage="language_detection", **_language_detection_params(text)
+            )
+        )
+
+    detected_lang = detected_lang or 'en'
+    memoize_language(sample, detected_lang)
+    return detected_lang
+
 def count_tokens(text: str) -> int:
     """
     More conservative token count approximation:
@@ -87,48 +286,141 @@ def chunk_text(text: str, max_tokens: int = 4000) -> List[str]:
 
     return chunks
 
-def combine_release_notes(notes_list: List[str]) -> str:
-    """Combine multiple release notes sections intelligently."""
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text from the end until its approximate token count fits max_tokens."""
+    while text and count_tokens(text) > max_tokens:
+        ratio = max_tokens / count_tokens(text)
+        text = text[:max(0, int(len(text) * ratio * 0.95))]
+    return text
+
+def group_for_reduce(notes: List[str], fan_in: int, max_tokens: int) -> List[List[str]]:
+    """
+    Group consecutive notes for one reduce level.
+
+    Each group holds at most fan_in notes and at most max_tokens (approximate)
+    of note text. Notes are capped at half the budget so every group can take
+    at least two of them, which guarantees each level shrinks the list; each
+    note cut short is logged and counted in combine.truncated_notes.
+    """
+    fan_in = max(2, fan_in)
+    per_note_budget = max(1, max_tokens // 2)
+
+    groups = []
+    current_group = []
+    current_tokens = 0
+    for index, note in enumerate(notes):
+        original_tokens = count_tokens(note)
+        if original_tokens > per_note_budget:
+            note = truncate_to_tokens(note, per_note_budget)
+            metrics.increment("combine.truncated_notes")
+            metrics.increment("combine.truncated_tokens", original_tokens - count_tokens(note))
+            logger.warning(
+                f"Truncated section {index + 1}/{len(notes)} from ~{original_tokens} to {per_note_budget} tokens "
+                f"to fit the combine prompt; raise COMBINE_MAX_PROMPT_TOKENS to keep it whole"
+            )
+        note_tokens = count_tokens(note)
+        if current_group and (len(current_group) >= fan_in or current_tokens + note_tokens > max_tokens):
+            groups.append(current_group)
+            current_group = []
+            current_tokens = 0
+        current_group.append(note)
+        current_tokens += note_tokens
+
+    if current_group:
+        groups.append(current_group)
+
+    return groups
+
+# Tree reduce settings for combining chunk notes
+COMBINE_FAN_IN = int(os.getenv("COMBINE_FAN_IN", "4"))
+COMBINE_MAX_PROMPT_TOKENS = int(os.getenv("COMBINE_MAX_PROMPT_TOKENS", "12000"))
+# Least room for note text a combine prompt must leave after its instructions
+COMBINE_MIN_NOTES_TOKENS = 1000
+COMBINE_PROMPT_OVERHEAD_TOKENS = 100  # user instruction and formatting
+
+
+class CombineBudgetError(Exception):
+    """COMBINE_MAX_PROMPT_TOKENS leaves too little room for the notes being combined"""
+    pass
+
+
+def combine_notes_budget(max_prompt_tokens: int, instruction_tokens: int) -> int:
+    """Tokens of note text a combine prompt can hold without exceeding max_prompt_tokens"""
+    budget = max_prompt_tokens - instruction_tokens - COMBINE_PROMPT_OVERHEAD_TOKENS
+    if budget < COMBINE_MIN_NOTES_TOKENS:
+        raise CombineBudgetError(
+            f"COMBINE_MAX_PROMPT_TOKENS={max_prompt_tokens} leaves {budget} tokens for notes after "
+            f"~{instruction_tokens} tokens of instructions; at least {COMBINE_MIN_NOTES_TOKENS} are needed"
+        )
+    return budget
+
+COMBINE_SYSTEM_MESSAGE = "You are a technical writer tasked with combining multiple sections of release notes into a coherent, non-repetitive document. Organize the information logically, remove duplicates, and ensure the final document follows a clear structure."
+
+def combine_release_notes(notes_list: List[str], fan_in: int = COMBINE_FAN_IN, max_prompt_tokens: int = COMBINE_MAX_PROMPT_TOKENS) -> str:
+    """Combine multiple release notes sections intelligently.
+
+    Sections are merged as a tree: each level combines groups of at most fan_in
+    sections in parallel until a single document remains, so no prompt grows
+    beyond max_prompt_tokens regardless of how many sections there are.
+    """
     if not notes_list:
         return ""
-        
-    # Combine all notes
-    combined_text = '\n\n'.join(notes_list)
-    
+    if len(notes_list) == 1:
+        return notes_list[0]
+
     # Use GPT to summarize and combine the release notes
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a technical writer tasked with combining multiple sections of release notes into a coherent, non-repetitive document. Organize the information logically, remove duplicates, and ensure the final document follows a clear structure."},
-                {"role": "user", "content": f"Combine these release notes sections into a single coherent document:\n\n{combined_text}"}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
-        return response.choices[0].message.content or ""
-    except Exception as e:
-        logger.error(f"Error combining release notes: {str(e)}")
-        # Fallback to simple combination if the API call fails
-        return combined_text
+    client = get_openai_client()
+    notes_budget = combine_notes_budget(max_prompt_tokens, count_tokens(COMBINE_SYSTEM_MESSAGE))
+
+    def _combine_group(group: List[str]) -> str:
+        if len(group) == 1:
+            return group[0]
+        combined_text = '\n\n'.join(group)
+        try:
+            return cached_chat_completion(
+                client,
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": COMBINE_SYSTEM_MESSAGE},
+                    {"role": "user", "content": f"Combine these release notes sections into a single coherent document:\n\n{combined_text}"}
+                ],
+                temperature=0.7,
+                max_tokens=2000
+            )
+        except Exception as e:
+            logger.error(f"Error combining release notes: {str(e)}")
+            # Fallback to simple combination if the API call fails
+            return combined_text
+
+    level = 0
+    with ThreadPoolExecutor(max_workers=max(2, fan_in)) as executor:
+        while len(notes_list) > 1:
+            level += 1
+            groups = group_for_reduce(notes_list, fan_in, notes_budget)
+            logger.info(f"Combine level {level}: merging {len(notes_list)} sections in {len(groups)} group(s)")
+            notes_list = list(executor.map(_combine_group, groups))
+
+    return notes_list[0]
 
 # Initialize a global instance of OpenAIAgent
 _agent = None
+_agent_lock = threading.Lock()
 
-def get_agent():
+def get_agent() -> "OpenAIAgent":
+    """Return the shared OpenAIAgent, creating it on first use"""
     global _agent
-    if _agent is None:
-        _agent = OpenAIAgent()
-    return _agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = OpenAIAgent()
+        return _agent
 
 async def process_document_with_openai(content: bytes, filename: str, language: str = 'en') -> str:
     """
     Process document content with OpenAI and generate release notes in the specified language
     """
     try:
-        # Initialize OpenAI client
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Use the shared OpenAI client
+        client = get_openai_client()
         
         # Extract text content based on file type
         text_content = ""
@@ -166,20 +458,8 @@ async def process_document_with_openai(content: bytes, filename: str, language:
             if not text_content:
                 raise ValueError("Could not decode file content with any supported encoding")
 
-        # First, detect the language of the input text using GPT (using just the first chunk)
-        first_chunk = text_content[:2000]  # Use first 2000 characters for language detection
-        detection_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a language detection expert. Respond only with the ISO 639-1 language code of the text."},
-                {"role": "user", "content": f"What is the language code of this text (respond with only the 2-letter code):\n\n{first_chunk}"}
-            ],
-            temperature=0,
-            max_tokens=2
-        )
-        
-        # Get the detected language code
-        detected_lang = detection_response.choices[0].message.content.strip().lower()
+        # First, detect the language of the input text (locally, with LLM fallback)
+        detected_lang = detect_language(client, text_content)
         
         # Use detected language if no specific language was requested
         if language == 'en' and detected_lang != 'en':
@@ -221,7 +501,8 @@ async def process_document_with_openai(content: bytes, filename: str, language:
         for i, chunk in enumerate(text_chunks):
             chunk_instruction = f"{language_instruction}\n\nThis is part {i+1} of {len(text_chunks)}. Generate release notes from the following content:\n\n{chunk}"
             
-            completion = client.chat.completions.create(
+            completion = cached_chat_completion(
+                client,
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": f"{system_message} IMPORTANT: You must write ONLY in {language}. Do not use any other language. If this is not the first chunk, continue from the previous part and maintain consistency."},
@@ -231,7 +512,7 @@ async def process_document_with_openai(content: bytes, filename: str, language:
                 max_tokens=1500
             )
             
-            release_notes_chunks.append(completion.choices[0].message.content)
+            release_notes_chunks.append(completion)
 
         # Combine all chunks into a coherent document
         if len(release_notes_chunks) > 1:
@@ -246,12 +527,23 @@ async def process_document_with_openai(content: bytes, filename: str, language:
         raise ValueError(f"Failed to generate release notes: {str(e)}")
 
 class OpenAIAgent:
-    def __init__(self):
-        self.client = OpenAI(api_key=api_key)
-        self.async_client = AsyncOpenAI(api_key=api_key)
-        self.context = ""  # Store the current content
-        self.template_content = self._load_template()
-        self.last_token_usage = 0  # Track token usage
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CHUNK_CONCURRENCY,
+        failure_policy: str = CHUNK_FAILURE_POLICY,
+        combine_fan_in: int = COMBINE_FAN_IN,
+        combine_max_prompt_tokens: int = COMBINE_MAX_PROMPT_TOKENS
+    ):
+        if failure_policy not in FAILURE_POLICIES:
+            raise ValueError(f"Unknown chunk failure policy: {failure_policy}")
+
+        self.client = get_openai_client()
+        self.async_client = get_async_openai_client()
+        # Per-request state lives in GenerationContext; the agent itself is read-only after init
+        self.max_concurrency = max_concurrency
+        self.failure_policy = failure_policy
+        self.combine_fan_in = max(2, combine_fan_in)
+        self.combine_max_prompt_tokens = combine_max_prompt_tokens
         self.TEMPLATE = """
 
 Your task is to write a release notes based on the transcript with key points and insights into the feature.
@@ -299,25 +591,10 @@ Now analyze this content and generate release notes following the template struc
 """
 
 
-    def _load_template(self) -> str:
-        """Load the template content from the data folder"""
-        try:
-            template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
-                                       "data", "template.pdf")
-            if not os.path.exists(template_path):
-                logger.error(f"Template file not found at {template_path}")
-                return ""
-
-            success, content = self._extract_from_pdf(template_path)
-            if success:
-                logger.info("Successfully loaded template content")
-                return content
-            else:
-                logger.error("Failed to load template content")
-                return ""
-        except Exception as e:
-            logger.error(f"Error loading template: {str(e)}")
-            return ""
+    @property
+    def template_content(self) -> str:
+        """Template text from the process-wide cache"""
+        return load_template()
 
     def extract_text_from_file(self, file_path: str) -> Tuple[bool, str]:
         """Extract text from PDF, TXT, or JSON file"""
@@ -467,14 +744,10 @@ Now analyze this content and generate release notes following the template struc
                 temp_path = temp_file.name
 
             try:
-                # Transcribe using OpenAI Whisper
-                with open(temp_path, 'rb') as media_file:
-                    logger.info("Starting transcription with Whisper")
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=media_file,
-                        response_format="text"
-                    )
+                # Transcribe with the backend chosen for this recording's length
+                backend = select_backend(probe_duration_sync(temp_path))
+                logger.info(f"Starting transcription with the {backend.name} backend")
+                transcript = backend.transcribe_sync(temp_path).text
 
                 # Clean up temporary file
                 os.unlink(temp_path)
@@ -496,8 +769,9 @@ Now analyze this content and generate release notes following the template struc
             logger.error(f"Error extracting transcript from media file: {str(e)}")
             return False, f"Error extracting transcript from media file: {str(e)}"
 
-    def generate_release_notes(self, file_obj: io.BytesIO, filename: str = None) -> Tuple[bool, str]:
+    def generate_release_notes(self, file_obj: io.BytesIO, filename: str = None, ctx: Optional[GenerationContext] = None) -> Tuple[bool, str]:
         """Generate release notes from the file content"""
+        ctx = ctx or GenerationContext()
         try:
             logger.info("Starting release notes generation")
             
@@ -508,25 +782,18 @@ Now analyze this content and generate release notes following the template struc
                 return False, "Failed to process the transcript file"
 
             # Set the content
-            self.context = content
+            ctx.content = content
 
             # Detect language from content
             try:
                 logger.info("Detecting content language")
-                detection_response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a language detection expert. Respond only with the ISO 639-1 language code of the text."},
-                        {"role": "user", "content": f"What is the language code of this text (respond with only the 2-letter code):\n\n{content[:2000]}"}
-                    ],
-                    temperature=0,
-                    max_tokens=2
-                )
-                detected_lang = detection_response.choices[0].message.content.strip().lower()
+                with ctx.timed("language_detection"):
+                    detected_lang = detect_language(self.client, content, ctx.usage)
                 logger.info(f"Detected language: {detected_lang}")
             except Exception as e:
                 logger.error(f"Error detecting language: {str(e)}")
                 detected_lang = 'en'  # Default to English if detection fails
+            ctx.detected_language = detected_lang
 
             # Define system message based on detected language
             system_messages = {
@@ -558,7 +825,7 @@ Now analyze this content and generate release notes following the template struc
 
             system_prompt = self.TEMPLATE.format(
                 template_content=self.template_content,
-                content=self.context,
+                content=ctx.content,
                 date=datetime.now()
             )
 
@@ -567,7 +834,10 @@ Now analyze this content and generate release notes following the template struc
 
             try:
                 logger.info(f"Calling OpenAI API with detected language: {detected_lang}")
-                response = self.client.chat.completions.create(
+                release_notes = cached_chat_completion(
+                    self.client,
+                    ledger=ctx.usage,
+                    stage="generation",
                     model="gpt-4-turbo-preview",
                     messages=[
                         {"role": "system", "content": system_prompt},
@@ -580,7 +850,7 @@ Now analyze this content and generate release notes following the template struc
                 )
                 
                 logger.info("Successfully generated release notes")
-                return True, response.choices[0].message.content
+                return True, release_notes
                 
             except Exception as api_error:
                 logger.error(f"OpenAI API error: {str(api_error)}")
@@ -613,115 +883,273 @@ Now analyze this content and generate release notes following the template struc
             
         return chunks
 
-    async def _process_with_timeout(self, coroutine, timeout_seconds: int = 180) -> Tuple[bool, str]:
+    async def _process_with_timeout(self, coroutine, timeout_seconds: int = 180, ctx: Optional[GenerationContext] = None) -> Tuple[bool, str]:
         """Execute a coroutine with timeout"""
         try:
             return await asyncio.wait_for(coroutine, timeout=timeout_seconds)
-        except asyncio.TimeoutError:
+        except asyncio.TimeoutError as e:
             logger.error(f"Operation timed out after {timeout_seconds} seconds")
+            if ctx is not None:
+                ctx.record_failure(e)
             return False, f"Operation timed out after {timeout_seconds} seconds. Please try with a smaller file or try again later."
             
-    async def generate_release_notes_async(self, files: List[io.BytesIO], filenames: List[str] = None, timeout_seconds: int = 180) -> Tuple[bool, str]:
-        """Generate release notes from multiple files asynchronously with timeout"""
+    async def generate_release_notes_async(
+        self,
+        files: List[io.BytesIO],
+        filenames: List[str] = None,
+        timeout_seconds: int = 180,
+        ctx: Optional[GenerationContext] = None
+    ) -> Tuple[bool, str]:
+        """Generate release notes from multiple files asynchronously with timeout
+
+        Pass a GenerationContext to read back usage and timings for this request.
+        """
+        ctx = ctx or GenerationContext()
         combined_content = ""
 
         for file_obj, filename in zip(files, filenames):
-            success, content = self.extract_text_from_memory(file_obj, filename)
+            success, content = await run_cpu(self.extract_text_from_memory, file_obj, filename)
             if not success:
                 logger.error(f"Failed to process file: {filename}")
                 return False, f"Failed to process file: {filename}"
             combined_content += content + "\n\n"
 
         return await self._process_with_timeout(
-            self._generate_release_notes_internal_combined(combined_content),
-            timeout_seconds
+            self._generate_release_notes_internal_combined(combined_content, ctx),
+            timeout_seconds,
+            ctx
+        )
+
+    async def stream_release_notes_async(
+        self,
+        files: List[io.BytesIO],
+        filenames: List[str] = None,
+        timeout_seconds: int = 180,
+        ctx: Optional[GenerationContext] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Generate release notes and yield (event, data) pairs as the pipeline runs.
+
+        Yields stage events (language_detected, chunking, chunk_done, combining),
+        token events with streamed text, and finally a done or error event.
+        """
+        ctx = ctx or GenerationContext()
+        queue = asyncio.Queue()
+        ctx.on_event = lambda event, data: queue.put_nowait((event, data))
+
+        task = asyncio.create_task(
+            self.generate_release_notes_async(files, filenames, timeout_seconds, ctx)
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+
+            success, result = task.result()
+            if success:
+                yield "done", {
+                    "content": result,
+                    "language": ctx.detected_language,
+                    "token_usage": ctx.token_usage,
+                    "usage": ctx.usage.to_dict(),
+                    "chunk_timings": ctx.chunk_timings,
+                    "timings": ctx.timings
+                }
+            else:
+                yield "error", {"detail": result}
+        finally:
+            # The client went away or the consumer stopped early; don't keep generating
+            if not task.done():
+                task.cancel()
+
+    async def _generate_chunk_notes(
+        self,
+        chunk: str,
+        index: int,
+        total: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        ledger: Optional[UsageLedger] = None
+    ) -> str:
+        """Generate release notes for a single chunk"""
+        # Use OpenAIAgent's template for consistent formatting
+        chunk_prompt = self.TEMPLATE.format(
+            template_content=self.template_content,
+            content=chunk,
+            date=datetime.now()
+        )
+
+        return await cached_chat_completion_async(
+            self.async_client,
+            model="gpt-4-turbo-preview",
+            messages=[
+                {"role": "system", "content": f"{chunk_prompt}\n\nThis is part {index+1} of {total}. Generate release notes following the template format exactly."},
+                {"role": "user", "content": "Generate release notes following the template structure exactly."}
+            ],
+            on_token=on_token,
+            ledger=ledger,
+            stage="chunk",
+            temperature=0.7,
+            presence_penalty=0.1,
+            frequency_penalty=0.1,
+            max_tokens=2000
+        )
+
+    async def _generate_chunk_with_progress(self, chunk: str, index: int, total: int, ctx: GenerationContext) -> str:
+        """Generate one chunk and report its completion to the context listener"""
+        # A single chunk is the final output, so stream its tokens directly
+        on_token = ctx.emit_token if ctx.streaming and total == 1 else None
+        notes = await self._generate_chunk_notes(chunk, index, total, on_token, ctx.usage)
+        ctx.emit("chunk_done", chunk=index + 1, total=total)
+        return notes
+
+    async def _combine_notes_group(
+        self,
+        group: List[str],
+        final: bool,
+        on_token: Optional[Callable[[str], None]] = None,
+        ledger: Optional[UsageLedger] = None
+    ) -> str:
+        """Merge one group of partial release notes; the final merge applies the full template"""
+        if len(group) == 1 and not final:
+            return group[0]
+
+        content = "\n\n---\n\n".join(group)
+        if final:
+            system_prompt = self.TEMPLATE.format(
+                template_content=self.template_content,
+                content=content,
+                date=datetime.now()
+            )
+            instruction = "Combine these sections into a single coherent document while maintaining perfect template adherence, keeping all sections, and eliminating redundancy."
+        else:
+            # Intermediate levels skip the reference template to keep prompts small
+            system_prompt = f"{COMBINE_SYSTEM_MESSAGE}\n\nKeep the existing section structure and headings.\n\n{content}"
+            instruction = "Combine these release notes sections into a single coherent document, keeping all points and eliminating redundancy."
+
+        return await cached_chat_completion_async(
+            self.async_client,
+            model="gpt-4-turbo-preview",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": instruction}
+            ],
+            on_token=on_token,
+            ledger=ledger,
+            stage="combine",
+            temperature=0.7,
+            max_tokens=2000
         )
 
-    async def _generate_release_notes_internal_combined(self, combined_content: str) -> Tuple[bool, str]:
+    def combine_notes_budget(self) -> int:
+        """Room for note text in a combine prompt; raises CombineBudgetError if the template leaves too little"""
+        # The final level's prompt carries the template, so it bounds every level
+        instruction_tokens = count_tokens(self.TEMPLATE) + count_tokens(self.template_content) + count_tokens(COMBINE_SYSTEM_MESSAGE)
+        return combine_notes_budget(self.combine_max_prompt_tokens, instruction_tokens)
+
+    async def _reduce_release_notes(self, notes: List[str], ctx: Optional[GenerationContext] = None) -> str:
+        """
+        Combine partial release notes as a tree.
+
+        Each level merges groups of at most combine_fan_in notes in parallel,
+        with every prompt bounded by combine_max_prompt_tokens.
+        """
+        notes_budget = self.combine_notes_budget()
+
+        level = 0
+        while len(notes) > 1:
+            level += 1
+            groups = group_for_reduce(notes, self.combine_fan_in, notes_budget)
+            final = len(groups) == 1
+            logger.info(f"Combine level {level}: merging {len(notes)} sections in {len(groups)} group(s)")
+            if ctx is not None:
+                ctx.emit("combining", level=level, sections=len(notes), groups=len(groups))
+            # Only the final merge produces user-visible text, so only it is streamed
+            on_token = ctx.emit_token if ctx is not None and ctx.streaming and final else None
+            results = await run_bounded(
+                groups,
+                lambda i, group: self._combine_notes_group(group, final, on_token, ctx.usage if ctx is not None else None),
+                max_concurrency=self.max_concurrency,
+                failure_policy=FAIL_FAST,
+                label=f"Combine level {level} group"
+            )
+            notes = [r.value for r in results]
+
+        return notes[0]
+
+    async def _generate_release_notes_internal_combined(self, combined_content: str, ctx: GenerationContext) -> Tuple[bool, str]:
         """Internal method for generating release notes from combined content"""
         logger.info("Starting async release notes generation for combined content")
-        self.last_token_usage = 0
-        self.context = combined_content
+        ctx.content = combined_content
 
         try:
             # Detect language
             detected_lang = 'en'  # Default to English
             try:
-                detection_response = await self.async_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a language detection expert. Respond only with the ISO 639-1 language code of the text."},
-                        {"role": "user", "content": f"What is the language code of this text (respond with only the 2-letter code):\n\n{combined_content[:2000]}"}
-                    ],
-                    temperature=0,
-                    max_tokens=2
-                )
-                if detection_response.choices and detection_response.choices[0].message.content:
-                    detected_lang = detection_response.choices[0].message.content.strip().lower()
-                    logger.info(f"Detected language: {detected_lang}")
+                logger.info("Detecting content language")
+                with ctx.timed("language_detection"):
+                    detected_lang = await detect_language_async(self.async_client, combined_content, ctx.usage)
+                logger.info(f"Detected language: {detected_lang}")
             except Exception as e:
                 logger.error(f"Error detecting language: {str(e)}")
+            ctx.detected_language = detected_lang
+            ctx.emit("language_detected", language=detected_lang)
 
             # Split content into chunks if too long
             text_chunks = chunk_text(combined_content)
-            release_notes_chunks = []
-            
-            # Use the consistent template to generate each chunk
-            for i, chunk in enumerate(text_chunks):
-                try:
-                    # Use OpenAIAgent's template for consistent formatting
-                    chunk_prompt = self.TEMPLATE.format(
-                        template_content=self.template_content,
-                        content=chunk,
-                        date=datetime.now()
-                    )
+            ctx.emit("chunking", chunks=len(text_chunks))
+            logger.info(
+                f"Generating {len(text_chunks)} chunk(s) with concurrency {self.max_concurrency} "
+                f"and failure policy '{self.failure_policy}'"
+            )
 
-                    completion = await self.async_client.chat.completions.create(
-                        model="gpt-4-turbo-preview",
-                        messages=[
-                            {"role": "system", "content": f"{chunk_prompt}\n\nThis is part {i+1} of {len(text_chunks)}. Generate release notes following the template format exactly."},
-                            {"role": "user", "content": "Generate release notes following the template structure exactly."}
-                        ],
-                        temperature=0.7,
-                        presence_penalty=0.1,
-                        frequency_penalty=0.1,
-                        max_tokens=2000
+            try:
+                with ctx.timed("chunks"):
+                    results = await run_bounded(
+                        text_chunks,
+                        lambda i, chunk: self._generate_chunk_with_progress(chunk, i, len(text_chunks), ctx),
+                        max_concurrency=self.max_concurrency,
+                        failure_policy=self.failure_policy,
+                        label="Chunk"
                     )
-
-                    release_notes_chunks.append(completion.choices[0].message.content or "")
-
-                except Exception as chunk_error:
-                    logger.error(f"Error processing chunk {i+1}: {str(chunk_error)}")
-                    return False, f"Error processing content chunk {i+1}: {str(chunk_error)}"
+            except BoundedTaskError as chunk_error:
+                failed = chunk_error.result
+                ctx.record_failure(failed.exception)
+                ctx.chunk_timings = [{"chunk": failed.index + 1, "success": False, "seconds": round(failed.duration, 3)}]
+                return False, f"Error processing content chunk {failed.index + 1}: {failed.error}"
+
+            ctx.chunk_timings = [
+                {"chunk": r.index + 1, "success": r.success, "seconds": round(r.duration, 3)}
+                for r in results
+            ]
+
+            # Results come back in chunk order; under the partial policy skip failed chunks
+            release_notes_chunks = [r.value for r in results if r.success]
+            if not release_notes_chunks:
+                ctx.record_failure(results[0].exception if results else None)
+                return False, "Error processing content: all chunks failed"
+            if len(release_notes_chunks) < len(results):
+                logger.warning(f"{len(results) - len(release_notes_chunks)} of {len(results)} chunks failed; continuing with partial results")
 
             # Combine chunks if multiple exist
             if len(release_notes_chunks) > 1:
-                final_prompt = self.TEMPLATE.format(
-                    template_content=self.template_content, 
-                    content="\n\n---\n\n".join(release_notes_chunks),
-                    date=datetime.now()
-                )
-                
                 try:
-                    combine_response = await self.async_client.chat.completions.create(
-                        model="gpt-4-turbo-preview",
-                        messages=[
-                            {"role": "system", "content": final_prompt},
-                            {"role": "user", "content": "Combine these sections into a single coherent document while maintaining perfect template adherence, keeping all sections, and eliminating redundancy."}
-                        ],
-                        temperature=0.7,
-                        max_tokens=2000
-                    )
-                    result_content = combine_response.choices[0].message.content or ""
-                except Exception as combine_error:
+                    with ctx.timed("combine"):
+                        result_content = await self._reduce_release_notes(release_notes_chunks, ctx)
+                except BoundedTaskError as combine_error:
                     logger.error(f"Error combining chunks: {str(combine_error)}")
-                    return False, f"Error combining content chunks: {str(combine_error)}"
+                    ctx.record_failure(combine_error.result.exception)
+                    return False, f"Error combining content chunks: {combine_error.result.error}"
             else:
                 result_content = release_notes_chunks[0]
+                if ctx.streaming and len(text_chunks) > 1:
+                    # Only one chunk survived under the partial policy and it was not streamed
+                    ctx.emit_token(result_content)
 
             logger.info("Successfully generated release notes")
             return True, result_content
 
         except Exception as e:
             logger.error(f"Unexpected error in generate_release_notes_async: {str(e)}")
+            ctx.record_failure(e)
             return False, f"Error generating release notes: {str(e)}"
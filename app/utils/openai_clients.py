@@ -0,0 +1,192 @@
+import os
+import logging
+import threading
+import importlib.util
+from typing import Dict
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Connection pool settings shared by all OpenAI traffic in this process
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "120"))
+OPENAI_WRITE_TIMEOUT = float(os.getenv("OPENAI_WRITE_TIMEOUT", "120"))
+OPENAI_POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# HTTP/2 needs the optional h2 package; use it when available unless disabled
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "auto").lower()
+
+
+def _http2_enabled() -> bool:
+    if OPENAI_HTTP2 in ("0", "false", "no"):
+        return False
+    available = importlib.util.find_spec("h2") is not None
+    if OPENAI_HTTP2 in ("1", "true", "yes") and not available:
+        logger.warning("OPENAI_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+    return available
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=OPENAI_CONNECT_TIMEOUT,
+        read=OPENAI_READ_TIMEOUT,
+        write=OPENAI_WRITE_TIMEOUT,
+        pool=OPENAI_POOL_TIMEOUT
+    )
+
+
+class _PoolStats:
+    """
+    Counts requests in flight through one transport.
+
+    A request counts from when it is sent until its response headers arrive
+    (or it fails or is cancelled); a streamed body still being read afterwards
+    is not counted.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        metrics.increment(f"openai.{self.name}.requests")
+
+    def finish(self, failed: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        if failed:
+            metrics.increment(f"openai.{self.name}.errors")
+
+
+def _open_connections(transport) -> int:
+    # httpcore keeps the pool on a private attribute; report 0 if that changes
+    pool = getattr(transport, "_pool", None)
+    return len(getattr(pool, "connections", []) or [])
+
+
+class InstrumentedHTTPTransport(httpx.HTTPTransport):
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.start()
+        failed = False
+        try:
+            return super().handle_request(request)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs on cancellation, which isn't an Exception
+            self.stats.finish(failed=failed)
+
+
+class InstrumentedAsyncHTTPTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.start()
+        failed = False
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs on cancellation, which isn't an Exception
+            self.stats.finish(failed=failed)
+
+
+_client = None
+_async_client = None
+_sync_stats = _PoolStats("sync")
+_async_stats = _PoolStats("async")
+_sync_transport = None
+_async_transport = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client() -> OpenAI:
+    """Return the process-wide synchronous OpenAI client"""
+    global _client, _sync_transport
+    with _client_lock:
+        if _client is None:
+            _sync_transport = InstrumentedHTTPTransport(_sync_stats, limits=_limits(), http2=_http2_enabled())
+            _client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(transport=_sync_transport, timeout=_timeout())
+            )
+            logger.info("Created shared OpenAI client")
+        return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the process-wide async OpenAI client"""
+    global _async_client, _async_transport
+    with _client_lock:
+        if _async_client is None:
+            _async_transport = InstrumentedAsyncHTTPTransport(_async_stats, limits=_limits(), http2=_http2_enabled())
+            _async_client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(transport=_async_transport, timeout=_timeout())
+            )
+            logger.info(f"Created shared async OpenAI client (http2={_http2_enabled()})")
+        return _async_client
+
+
+def pool_stats() -> Dict[str, Dict[str, float]]:
+    """Report in-flight requests and open connections for each shared pool"""
+    stats = {}
+    for name, pool, transport in (("sync", _sync_stats, _sync_transport), ("async", _async_stats, _async_transport)):
+        stats[name] = {
+            "in_flight": pool.in_flight,
+            "peak_in_flight": pool.peak_in_flight,
+            "open_connections": _open_connections(transport) if transport is not None else 0,
+            "max_connections": OPENAI_MAX_CONNECTIONS,
+            "utilization": round(pool.in_flight / OPENAI_MAX_CONNECTIONS, 3) if OPENAI_MAX_CONNECTIONS else 0
+        }
+    return stats
+
+
+async def close_openai_clients() -> None:
+    """Close the shared clients and their connection pools"""
+    global _client, _async_client, _sync_transport, _async_transport
+    with _client_lock:
+        client, async_client = _client, _async_client
+        _client = _async_client = _sync_transport = _async_transport = None
+    if async_client is not None:
+        await async_client.close()
+    if client is not None:
+        client.close()
+
+
+metrics.register_gauge("openai.async.in_flight", lambda: _async_stats.in_flight)
+metrics.register_gauge("openai.sync.in_flight", lambda: _sync_stats.in_flight)
@@ -0,0 +1,320 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    aioredis = None
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rate limit settings. Budgets are "amount/period" in each group's cost units:
+# generate is thousands of expected tokens, media is minutes, the rest are requests.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")  # redis, or memory / none for development
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_GENERATE = os.getenv("RATE_LIMIT_GENERATE", "500/hour")
+RATE_LIMIT_MEDIA = os.getenv("RATE_LIMIT_MEDIA", "120/hour")
+RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "10/minute")
+RATE_LIMIT_HISTORY = os.getenv("RATE_LIMIT_HISTORY", "120/minute")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "10/minute")
+# Cost estimates made from the request size before any work is done
+RATE_LIMIT_BYTES_PER_TOKEN = int(os.getenv("RATE_LIMIT_BYTES_PER_TOKEN", "4"))
+RATE_LIMIT_MEDIA_BYTES_PER_MINUTE = int(os.getenv("RATE_LIMIT_MEDIA_BYTES_PER_MINUTE", str(5 * 1024 * 1024)))
+MEMORY_RATE_LIMIT_MAX_KEYS = 100000
+
+PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass
+class Rate:
+    """A budget of `amount` cost units that refills evenly over `seconds`"""
+    amount: float
+    seconds: float
+
+    @property
+    def per_second(self) -> float:
+        return self.amount / self.seconds
+
+
+def parse_rate(value: str) -> Rate:
+    """Parse '500/hour' or '10/minute'"""
+    amount, _, period = value.strip().partition("/")
+    period = period.strip().lower().rstrip("s")
+    if period not in PERIOD_SECONDS:
+        raise ValueError(f"Invalid rate limit '{value}': period must be one of {', '.join(PERIOD_SECONDS)}")
+    return Rate(amount=float(amount), seconds=PERIOD_SECONDS[period])
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: float
+    remaining: float
+    retry_after: float = 0.0
+
+
+# Cost estimates
+
+def request_cost(size: Optional[int]) -> float:
+    return 1.0
+
+
+def token_cost(size: Optional[int]) -> float:
+    """Thousands of tokens expected from a document upload of `size` bytes"""
+    return max(1.0, (size or 0) / RATE_LIMIT_BYTES_PER_TOKEN / 1000)
+
+
+def media_cost(size: Optional[int]) -> float:
+    """Minutes of media expected in an upload of `size` bytes"""
+    return max(1.0, (size or 0) / RATE_LIMIT_MEDIA_BYTES_PER_MINUTE)
+
+
+# Backends: token buckets keyed by group and subject
+
+class RateLimitBackend:
+    async def acquire(self, key: str, rate: Rate, cost: float) -> Tuple[bool, float, float]:
+        """Take cost from the bucket if it holds enough; returns (allowed, remaining, retry_after)"""
+        raise NotImplementedError
+
+    async def ping(self) -> None:
+        """Raise if the backend can't be reached"""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """In-process buckets; each process has its own budget, so use it for tests and single workers"""
+
+    def __init__(self, max_keys: int = MEMORY_RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    async def acquire(self, key, rate, cost):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (rate.amount, now))
+            tokens = min(rate.amount, tokens + (now - updated_at) * rate.per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / rate.per_second
+        return allowed, tokens, retry_after
+
+
+# Refill and take in one atomic step, timed by the Redis server's clock so all instances agree
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * per_second)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / per_second
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / per_second) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets in a Redis-protocol server, shared by every worker and machine"""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key, rate, cost):
+        allowed, remaining, retry_after = await self._script(
+            keys=[self.prefix + key], args=[rate.amount, rate.per_second, cost]
+        )
+        return bool(int(allowed)), float(remaining), float(retry_after)
+
+    async def ping(self) -> None:
+        await self._client.ping()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_rate_limit_backend(kind: str = RATE_LIMIT_BACKEND) -> Optional[RateLimitBackend]:
+    if kind == "redis":
+        if aioredis is None:
+            raise ValueError("RATE_LIMIT_BACKEND is redis but the redis package is not installed")
+        return RedisRateLimitBackend()
+    elif kind == "none":
+        logger.warning("RATE_LIMIT_BACKEND is none; requests are not rate limited")
+        return None
+    else:
+        # Each worker and machine then grants the full budget on its own
+        logger.warning(f"RATE_LIMIT_BACKEND is {kind}; limits are per process, set it to redis to share them")
+    return MemoryRateLimitBackend()
+
+
+class RateLimiter:
+    """
+    Cost-weighted rate limits per group and subject (a user or client IP).
+
+    Each group has a token bucket per subject holding its budget; a request
+    takes its estimated cost from the bucket or is refused until enough has
+    refilled. If the backend fails, requests are allowed rather than blocked.
+    """
+
+    def __init__(self, backend: Optional[RateLimitBackend], rates: Dict[str, Rate]):
+        self.backend = backend
+        self.rates = rates
+
+    async def acquire(self, subject: str, group: str, cost: float) -> RateLimitResult:
+        rate = self.rates[group]
+        if self.backend is None:
+            return RateLimitResult(allowed=True, limit=rate.amount, remaining=rate.amount)
+        # A request bigger than the whole budget waits for a full bucket instead of never passing
+        cost = min(cost, rate.amount)
+        try:
+            allowed, remaining, retry_after = await self.backend.acquire(f"{group}:{subject}", rate, cost)
+        except Exception as e:
+            metrics.increment("rate_limit.backend_errors")
+            logger.error(f"Rate limit backend failed, allowing request: {str(e)}")
+            return RateLimitResult(allowed=True, limit=rate.amount, remaining=rate.amount)
+        metrics.increment(f"rate_limit.{group}.{'allowed' if allowed else 'rejected'}")
+        metrics.increment(f"rate_limit.{group}.cost", cost if allowed else 0)
+        return RateLimitResult(allowed=allowed, limit=rate.amount, remaining=remaining, retry_after=retry_after)
+
+    async def check_backend(self) -> bool:
+        """Ping the backend, logging an error if requests would go unlimited"""
+        if self.backend is None:
+            return True
+        try:
+            await self.backend.ping()
+        except Exception as e:
+            metrics.increment("rate_limit.backend_errors")
+            logger.error(f"Rate limit backend unreachable; requests are not rate limited until it recovers: {str(e)}")
+            return False
+        return True
+
+    async def check(self, subject: str, group: str, cost: float) -> None:
+        """acquire() for route handlers: raises a 429 HTTPException when over the limit"""
+        result = await self.acquire(subject, group, cost)
+        if not result.allowed:
+            raise HTTPException(status_code=429, detail=limit_detail(group), headers=rate_limit_headers(result))
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def limit_detail(group: str) -> str:
+    return f"Rate limit exceeded for {group} requests. Please try again later."
+
+
+def rate_limit_headers(result: RateLimitResult) -> Dict[str, str]:
+    headers = {
+        "X-RateLimit-Limit": str(int(result.limit)),
+        "X-RateLimit-Remaining": str(max(0, int(result.remaining)))
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+    return headers
+
+
+@dataclass
+class RateLimitRule:
+    """
+    Charge requests under a path prefix to a group, with a cost estimated from Content-Length.
+
+    A request without Content-Length (a chunked body) is charged as if it
+    were max_body bytes, the most the route accepts, when that is set.
+    """
+    prefix: str
+    group: str
+    cost: Callable[[Optional[int]], float]
+    methods: Sequence[str] = ("POST",)
+    exact: bool = False
+    max_body: Optional[int] = None
+
+
+class RateLimitMiddleware:
+    """
+    Applies RateLimitRules before the request body is read.
+
+    The most specific matching rule wins; requests matching no rule pass
+    through. `subject` maps the ASGI scope to the key limits apply to.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, rules: List[RateLimitRule], subject: Callable[[dict], str]):
+        self.app = app
+        self.limiter = limiter
+        self.rules = sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+        self.subject = subject
+
+    def _rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            matches = path == rule.prefix if rule.exact else path.startswith(rule.prefix)
+            if matches and method in rule.methods:
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self._rule_for(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        size = int(content_length) if content_length is not None and content_length.isdigit() else rule.max_body
+        result = await self.limiter.acquire(self.subject(scope), rule.group, rule.cost(size))
+        headers = rate_limit_headers(result)
+        if not result.allowed:
+            response = JSONResponse(status_code=429, content={"detail": limit_detail(rule.group)}, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+rate_limiter = RateLimiter(
+    create_rate_limit_backend(),
+    {
+        "generate": parse_rate(RATE_LIMIT_GENERATE),
+        "media": parse_rate(RATE_LIMIT_MEDIA),
+        "auth": parse_rate(RATE_LIMIT_AUTH),
+        "history": parse_rate(RATE_LIMIT_HISTORY),
+        "default": parse_rate(RATE_LIMIT_DEFAULT)
+    }
+)
@@ -0,0 +1,304 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from . import metrics
+from .executors import run_io
+
+logger = logging.getLogger(__name__)
+
+# Resumable upload settings
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", "resumable_uploads")
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", str(5 * 1024 * 1024)))  # suggested to clients
+RESUMABLE_MAX_CHUNK_BYTES = int(os.getenv("RESUMABLE_MAX_CHUNK_BYTES", str(16 * 1024 * 1024)))
+RESUMABLE_UPLOAD_EXPIRY_SECONDS = int(os.getenv("RESUMABLE_UPLOAD_EXPIRY_SECONDS", str(24 * 3600)))
+HASH_READ_SIZE = 1024 * 1024
+# Uploads live on the local disk of the machine that created them. On Fly, upload ids
+# start with that machine's id so requests reaching another machine can be sent back.
+FLY_MACHINE_ID = "".join(c for c in os.getenv("FLY_MACHINE_ID", "") if c.isalnum())
+UPLOAD_TOKEN_LENGTH = 32  # the uuid4 hex after the machine id
+
+
+class UploadError(Exception):
+    """A rejected upload operation; status_code is the HTTP status to answer with"""
+
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(detail)
+
+
+class UploadElsewhereError(UploadError):
+    """The upload is stored on another machine, which the request should be replayed to"""
+
+    def __init__(self, machine_id: str):
+        self.machine_id = machine_id
+        super().__init__(421, "Upload is stored on another machine")
+
+
+@dataclass
+class UploadInfo:
+    """Metadata for one resumable upload; the received bytes live in a .part file"""
+    upload_id: str
+    filename: str
+    kind: str
+    size: int
+    sha256: Optional[str] = None  # optional whole-file checksum declared by the client
+    created_at: float = 0.0
+    user_id: Optional[int] = None  # set when created while signed in; only that user may use it
+
+
+def parse_checksum_header(value: Optional[str]) -> Optional[bytes]:
+    """Parse an 'Upload-Checksum: sha256 <base64 digest>' header"""
+    if not value:
+        return None
+    algorithm, _, encoded = value.strip().partition(" ")
+    if algorithm.lower() != "sha256" or not encoded:
+        raise UploadError(400, "Upload-Checksum must be 'sha256 <base64 digest>'")
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except ValueError:
+        raise UploadError(400, "Upload-Checksum digest is not valid base64")
+
+
+def upload_machine_id(upload_id: str) -> str:
+    """The Fly machine an upload was created on, or '' off Fly"""
+    return upload_id[:-UPLOAD_TOKEN_LENGTH]
+
+
+class ResumableUploadStore:
+    """
+    Disk-backed store for resumable uploads.
+
+    Each upload is a metadata file plus a .part file that chunks are written
+    into directly at their offset. The .part file's length is the committed
+    offset, so uploads survive restarts and clients only resend what is missing.
+    A chunk whose checksum doesn't match is rolled back before answering.
+
+    An upload's lock lives until the upload is finalized, deleted or expired,
+    so a chunk, a finalize and a delete for it never run at the same time.
+    The locks are per process, so all requests for an upload must reach the
+    process that created it (one per machine; see upload_machine_id).
+    """
+
+    def __init__(self, directory: str = RESUMABLE_UPLOAD_DIR):
+        self.directory = Path(directory)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        metrics.register_gauge(
+            "uploads.resumable.active_writes",
+            lambda: sum(lock.locked() for lock in list(self._locks.values()))
+        )
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.json"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.part"
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    # Blocking helpers, run on the I/O pool
+
+    def _write_meta(self, info: UploadInfo) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self._meta_path(info.upload_id).with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(asdict(info)))
+        os.replace(tmp, self._meta_path(info.upload_id))
+        self.part_path(info.upload_id).touch()
+
+    def _read_meta(self, upload_id: str) -> Optional[UploadInfo]:
+        # Ids are generated by us; anything else can't name a file in the directory
+        if not upload_id.isalnum():
+            return None
+        try:
+            return UploadInfo(**json.loads(self._meta_path(upload_id).read_text()))
+        except FileNotFoundError:
+            return None
+
+    def _offset(self, upload_id: str) -> int:
+        try:
+            return self.part_path(upload_id).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _remove(self, upload_id: str) -> None:
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self.part_path(upload_id).unlink(missing_ok=True)
+
+    def _expire(self) -> List[str]:
+        if not self.directory.exists():
+            return []
+        cutoff = time.time() - RESUMABLE_UPLOAD_EXPIRY_SECONDS
+        removed = []
+        for meta in self.directory.glob("*.json"):
+            try:
+                if meta.stat().st_mtime < cutoff and self.part_path(meta.stem).stat().st_mtime < cutoff:
+                    self._remove(meta.stem)
+                    removed.append(meta.stem)
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _file_sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_READ_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # Public API
+
+    async def create(
+        self,
+        filename: str,
+        kind: str,
+        size: int,
+        sha256: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> UploadInfo:
+        if (expired := await run_io(self._expire)):
+            for upload_id in expired:
+                self._locks.pop(upload_id, None)
+            logger.info(f"Removed {len(expired)} expired resumable uploads")
+        info = UploadInfo(
+            upload_id=FLY_MACHINE_ID + uuid.uuid4().hex,
+            filename=filename,
+            kind=kind,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+            created_at=time.time(),
+            user_id=user_id
+        )
+        await run_io(self._write_meta, info)
+        metrics.increment("uploads.resumable.created")
+        logger.info(f"Created resumable upload {info.upload_id} for {filename} ({size} bytes)")
+        return info
+
+    async def get(self, upload_id: str) -> UploadInfo:
+        info = await run_io(self._read_meta, upload_id)
+        if info is None:
+            machine_id = upload_machine_id(upload_id)
+            if machine_id and machine_id != FLY_MACHINE_ID and upload_id.isalnum():
+                raise UploadElsewhereError(machine_id)
+            raise UploadError(404, "Upload not found")
+        return info
+
+    async def offset(self, upload_id: str) -> int:
+        return await run_io(self._offset, upload_id)
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        body: AsyncIterator[bytes],
+        checksum: Optional[bytes] = None
+    ) -> int:
+        """
+        Append a chunk that starts at `offset`, streaming it to disk as it arrives.
+
+        Returns the new offset. The offset must equal the bytes already
+        received; a chunk that would overrun the declared size, or whose
+        sha256 doesn't match `checksum`, is discarded.
+        """
+        info = await self.get(upload_id)
+        lock = self._lock(upload_id)
+        if lock.locked():
+            raise UploadError(409, "Another chunk for this upload is still being written")
+
+        async with lock:
+            current = await self.offset(upload_id)
+            if offset != current:
+                raise UploadError(409, f"Upload-Offset {offset} does not match the current offset {current}")
+
+            digest = hashlib.sha256()
+            written = 0
+            f = await run_io(open, self.part_path(upload_id), "r+b")
+            try:
+                await run_io(f.seek, offset)
+                async for data in body:
+                    if not data:
+                        continue
+                    written += len(data)
+                    if written > RESUMABLE_MAX_CHUNK_BYTES:
+                        raise UploadError(413, f"Chunks are limited to {RESUMABLE_MAX_CHUNK_BYTES} bytes")
+                    if offset + written > info.size:
+                        raise UploadError(413, "Chunk extends past the declared upload size")
+                    digest.update(data)
+                    await run_io(f.write, data)
+                if checksum is not None and digest.digest() != checksum:
+                    metrics.increment("uploads.resumable.checksum_mismatches")
+                    raise UploadError(460, "Chunk checksum mismatch")
+                await run_io(f.flush)
+            except BaseException as e:
+                if checksum is None and not isinstance(e, UploadError):
+                    # Unverified chunk cut off mid-transfer: keep what arrived so only the rest is resent
+                    await run_io(f.flush)
+                else:
+                    # Roll back to the last verified offset so the client can resend the chunk
+                    await run_io(f.truncate, offset)
+                raise
+            finally:
+                await run_io(f.close)
+
+        metrics.increment("uploads.resumable.chunks")
+        metrics.increment("uploads.resumable.bytes", written)
+        return offset + written
+
+    async def finalize(self, upload_id: str, destination: Path) -> str:
+        """
+        Verify a complete upload and move it to destination; returns its sha256.
+
+        The upload's metadata is removed, so it can't be finalized twice.
+        """
+        info = await self.get(upload_id)
+        async with self._lock(upload_id):
+            # Another finalize or a delete may have finished while this one waited
+            await self.get(upload_id)
+            received = await self.offset(upload_id)
+            if received != info.size:
+                raise UploadError(409, f"Upload incomplete: {received} of {info.size} bytes received")
+            sha256 = await run_io(self._file_sha256, self.part_path(upload_id))
+            if info.sha256 and info.sha256 != sha256:
+                metrics.increment("uploads.resumable.checksum_mismatches")
+                raise UploadError(460, "Upload checksum mismatch")
+            await run_io(destination.parent.mkdir, parents=True, exist_ok=True)
+            await run_io(shutil.move, str(self.part_path(upload_id)), str(destination))
+            await run_io(self._remove, upload_id)
+        self._locks.pop(upload_id, None)
+        metrics.increment("uploads.resumable.completed")
+        return sha256
+
+    async def restore(self, info: UploadInfo, source: Path) -> None:
+        """
+        Undo finalize(): move a finalized file back into the store as a complete upload.
+
+        Used when the job it was finalized for couldn't be queued, so the
+        client can finalize again instead of uploading the whole file again.
+        """
+        async with self._lock(info.upload_id):
+            await run_io(self.directory.mkdir, parents=True, exist_ok=True)
+            await run_io(shutil.move, str(source), str(self.part_path(info.upload_id)))
+            await run_io(self._write_meta, info)
+        logger.info(f"Restored resumable upload {info.upload_id} after a failed finalize")
+
+    async def delete(self, upload_id: str) -> None:
+        await self.get(upload_id)
+        lock = self._lock(upload_id)
+        if lock.locked():
+            raise UploadError(409, "The upload is being written or finalized")
+        async with lock:
+            await run_io(self._remove, upload_id)
+        self._locks.pop(upload_id, None)
+
+
+resumable_uploads = ResumableUploadStore()
@@ -0,0 +1,289 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .llm_cache import LLMCache, LLM_CACHE_BACKEND, LLM_CACHE_PATH, create_cache_backend
+from .openai_clients import get_openai_client, get_async_openai_client
+
+logger = logging.getLogger(__name__)
+
+# Backend selection: openai, local, or auto (local for short audio when installed)
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "auto").lower()
+LOCAL_TRANSCRIPTION_MAX_SECONDS = float(os.getenv("LOCAL_TRANSCRIPTION_MAX_SECONDS", "300"))
+# Local engine settings; the local backend needs the optional faster-whisper package
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_TRANSCRIPTION_WORKERS = int(os.getenv("LOCAL_TRANSCRIPTION_WORKERS", "1"))
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", str(max(1, (os.cpu_count() or 1) // LOCAL_TRANSCRIPTION_WORKERS))))
+
+# Transcripts keyed by backend model and media SHA-256; shares the LLM cache database in its own table
+TRANSCRIPT_CACHE_BACKEND = os.getenv("TRANSCRIPT_CACHE_BACKEND", LLM_CACHE_BACKEND)
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", LLM_CACHE_PATH)
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "2000"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+TRANSCRIPT_CACHE_TTL_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+BACKEND_NAMES = ("openai", "local")
+
+
+@dataclass
+class Transcript:
+    """Backend-neutral transcription result; segment times are in seconds"""
+    text: str
+    duration: float = 0.0
+    segments: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _field(item: Any, name: str, default: Any = None) -> Any:
+    """Read a field from an SDK object or a plain dict"""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+
+class TranscriptionBackend:
+    """Turns an audio or video file into a Transcript"""
+    name = "base"
+    model = ""
+
+    def available(self) -> bool:
+        return True
+
+    async def transcribe(self, path: str) -> Transcript:
+        raise NotImplementedError
+
+    def transcribe_sync(self, path: str) -> Transcript:
+        """Blocking variant for code already running off the event loop"""
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """Whisper via the OpenAI API, using the shared clients"""
+    name = "openai"
+    model = "whisper-1"
+
+    @staticmethod
+    def _to_transcript(response: Any) -> Transcript:
+        segments = [
+            {
+                "start": float(_field(s, "start", 0) or 0),
+                "end": float(_field(s, "end", 0) or 0),
+                "text": (_field(s, "text", "") or "").strip()
+            }
+            for s in (_field(response, "segments") or [])
+        ]
+        return Transcript(
+            text=(_field(response, "text", "") or "").strip(),
+            duration=float(_field(response, "duration", 0) or 0),
+            segments=segments
+        )
+
+    async def transcribe(self, path: str) -> Transcript:
+        # The async client reads a Path off the event loop when building the upload
+        response = await get_async_openai_client().audio.transcriptions.create(
+            model=self.model,
+            file=Path(path),
+            response_format="verbose_json"
+        )
+        return self._to_transcript(response)
+
+    def transcribe_sync(self, path: str) -> Transcript:
+        response = get_openai_client().audio.transcriptions.create(
+            model=self.model,
+            file=Path(path),
+            response_format="verbose_json"
+        )
+        return self._to_transcript(response)
+
+
+# Loaded once per worker process; model loading takes seconds
+_local_model = None
+
+
+def _local_transcribe(path: str, model_name: str, compute_type: str, cpu_threads: int) -> Dict[str, Any]:
+    """Process pool entry point; returns plain data so it pickles cheaply"""
+    global _local_model
+    if _local_model is None:
+        from faster_whisper import WhisperModel
+        _local_model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+    segments, info = _local_model.transcribe(path, beam_size=1, vad_filter=True)
+    segments = [{"start": s.start, "end": s.end, "text": s.text.strip()} for s in segments]
+    return {
+        "text": " ".join(s["text"] for s in segments if s["text"]),
+        "duration": float(getattr(info, "duration", 0) or 0),
+        "segments": segments
+    }
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Quantized Whisper (faster-whisper) on the CPU in a separate process pool.
+
+    No upload and no API cost, so it suits short clips and offline use; the
+    model is loaded lazily in each worker process on first use.
+    """
+    name = "local"
+
+    def __init__(self, model_name: str = LOCAL_WHISPER_MODEL, compute_type: str = LOCAL_WHISPER_COMPUTE_TYPE,
+                 workers: int = LOCAL_TRANSCRIPTION_WORKERS, cpu_threads: int = LOCAL_WHISPER_THREADS):
+        self.model_name = model_name
+        self.model = f"local:{model_name}"
+        self.compute_type = compute_type
+        self.workers = max(1, workers)
+        self.cpu_threads = cpu_threads
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _drop_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Discard a pool broken by a crashed worker; the next call starts a new one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        metrics.increment("transcription.local.pool_restarts")
+        logger.warning("Local transcription worker died; restarting the process pool")
+
+    def _submit(self, pool: ProcessPoolExecutor, path: str):
+        return pool.submit(_local_transcribe, path, self.model_name, self.compute_type, self.cpu_threads)
+
+    async def transcribe(self, path: str) -> Transcript:
+        # A worker that crashed (e.g. out of memory) breaks the whole pool; retry once on a new one
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return Transcript(**await asyncio.wrap_future(self._submit(pool, path)))
+            except BrokenProcessPool:
+                self._drop_pool(pool)
+                if attempt:
+                    raise
+
+    def transcribe_sync(self, path: str) -> Transcript:
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return Transcript(**self._submit(pool, path).result())
+            except BrokenProcessPool:
+                self._drop_pool(pool)
+                if attempt:
+                    raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_backends: Dict[str, TranscriptionBackend] = {
+    "openai": OpenAITranscriptionBackend(),
+    "local": LocalWhisperBackend(),
+}
+
+
+def get_transcription_backend(name: str) -> TranscriptionBackend:
+    if name not in _backends:
+        raise ValueError(f"Unknown transcription backend: {name}. Choose from: {', '.join(BACKEND_NAMES)}")
+    return _backends[name]
+
+
+def select_backend(duration_seconds: Optional[float], preference: Optional[str] = None) -> TranscriptionBackend:
+    """
+    Pick a backend for audio lasting duration_seconds.
+
+    An explicit preference (per request, else TRANSCRIPTION_BACKEND) wins;
+    "auto" sends audio up to LOCAL_TRANSCRIPTION_MAX_SECONDS to the local
+    engine when it is installed and everything else, including audio whose
+    duration couldn't be probed, to OpenAI.
+    """
+    choice = (preference or TRANSCRIPTION_BACKEND).lower()
+    local = _backends["local"]
+    if choice == "auto":
+        short = bool(duration_seconds) and duration_seconds <= LOCAL_TRANSCRIPTION_MAX_SECONDS
+        choice = "local" if short and local.available() else "openai"
+    backend = get_transcription_backend(choice)
+    if not backend.available():
+        logger.warning(f"Transcription backend '{choice}' is not installed; using OpenAI")
+        backend = _backends["openai"]
+    return backend
+
+
+async def transcribe(backend: TranscriptionBackend, path: str) -> Transcript:
+    """Transcribe with the given backend, recording per-backend metrics"""
+    start = time.perf_counter()
+    metrics.increment(f"transcription.{backend.name}.requests")
+    try:
+        return await backend.transcribe(path)
+    except Exception:
+        metrics.increment(f"transcription.{backend.name}.errors")
+        raise
+    finally:
+        metrics.increment(f"transcription.{backend.name}.seconds", time.perf_counter() - start)
+
+
+def shutdown_transcription_backends() -> None:
+    for backend in _backends.values():
+        backend.shutdown()
+
+
+_transcript_cache = None
+_transcript_cache_lock = threading.Lock()
+
+
+def transcript_cache_key(media_sha256: str, model: str) -> str:
+    """Cache key of a transcript of the media made by the given backend model"""
+    return f"transcript:{model}:{media_sha256}"
+
+
+def cacheable_models(preference: Optional[str] = None) -> List[str]:
+    """
+    Backend models whose cached transcripts can serve a request, best first.
+
+    An explicit backend only accepts its own transcripts; "auto" accepts any.
+    """
+    choice = (preference or TRANSCRIPTION_BACKEND).lower()
+    if choice == "auto":
+        return [_backends[name].model for name in BACKEND_NAMES]
+    return [get_transcription_backend(choice).model]
+
+
+def get_transcript_cache() -> LLMCache:
+    """Return the process-wide transcript cache"""
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            try:
+                backend = create_cache_backend(
+                    TRANSCRIPT_CACHE_BACKEND,
+                    TRANSCRIPT_CACHE_PATH,
+                    table="transcript_cache",
+                    max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES,
+                    max_bytes=TRANSCRIPT_CACHE_MAX_BYTES,
+                    ttl_seconds=TRANSCRIPT_CACHE_TTL_SECONDS
+                )
+            except Exception as e:
+                logger.error(f"Error creating transcript cache backend, caching disabled: {str(e)}")
+                backend = None
+            _transcript_cache = LLMCache(backend, name="transcript_cache")
+            logger.info(f"Transcript cache initialised with backend: {TRANSCRIPT_CACHE_BACKEND}")
+        return _transcript_cache
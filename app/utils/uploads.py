@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from . import metrics
+from .executors import run_io
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Room for multipart boundaries and headers on top of the file size limits
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload grows past its size limit while being received"""
+
+    def __init__(self, message: str, filename: str = ""):
+        self.filename = filename
+        super().__init__(message)
+
+
+class UploadFormError(Exception):
+    """Raised when a request is not a multipart form carrying the expected files"""
+    pass
+
+
+@dataclass
+class SpooledUpload:
+    """An upload written to disk, with its size and content hash"""
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def multipart_body(field: str, multiple: bool = False) -> Dict[str, Any]:
+    """OpenAPI request body for routes that read their files with spool_multipart"""
+    schema = {"type": "string", "format": "binary"}
+    if multiple:
+        schema = {"type": "array", "items": schema}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "required": [field], "properties": {field: schema}}
+                }
+            }
+        }
+    }
+
+
+class _PartEvents:
+    """Parser callbacks that queue each file part's start, data and end for the async reader"""
+
+    def __init__(self):
+        self.events: List[tuple] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self.events.append(("begin", name, filename.decode("utf-8", "replace") if filename is not None else None))
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self.events.append(("data", data[start:end]))
+
+    def on_part_end(self) -> None:
+        self.events.append(("end",))
+
+
+async def spool_multipart(
+    request: Request,
+    field: str,
+    max_bytes: int,
+    directory: str,
+    check_filename: Optional[Callable[[str], None]] = None
+) -> List[SpooledUpload]:
+    """
+    Stream the files sent in a multipart form's `field` straight to temp files.
+
+    The body is read once: each file's size limit is checked and its sha256
+    updated as its bytes arrive, so oversized uploads are abandoned early and
+    nothing is copied through an intermediate spool file. check_filename runs
+    before any of a file's content is written and may raise to reject it.
+    Other form parts are skipped. The caller owns the returned files.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadFormError("Expected a multipart/form-data request")
+
+    temp_dir = Path(directory)
+    await run_io(temp_dir.mkdir, parents=True, exist_ok=True)
+    parts = _PartEvents()
+    parser = MultipartParser(boundary, parts.callbacks())
+    spooled: List[SpooledUpload] = []
+    out = None  # the file currently being received, if the part is one of ours
+    digest = None
+    buffer = bytearray()  # received bytes are written out UPLOAD_CHUNK_SIZE at a time
+    filename = ""
+    path = ""
+    size = 0
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            events, parts.events = parts.events, []
+            for event in events:
+                if event[0] == "begin":
+                    _, name, part_filename = event
+                    if name != field or part_filename is None:
+                        continue
+                    filename = part_filename
+                    if check_filename is not None:
+                        check_filename(filename)
+                    # Unique names keep concurrent uploads of the same filename apart
+                    fd, path = await run_io(tempfile.mkstemp, dir=temp_dir, suffix=Path(filename).suffix.lower())
+                    out = os.fdopen(fd, "wb")
+                    digest = hashlib.sha256()
+                    size = 0
+                elif out is None:
+                    continue
+                elif event[0] == "data":
+                    size += len(event[1])
+                    if size > max_bytes:
+                        metrics.increment("uploads.rejected_too_large")
+                        raise UploadTooLargeError(
+                            f"File size exceeds {max_bytes // (1024 * 1024)}MB limit. Please upload a smaller file.",
+                            filename
+                        )
+                    digest.update(event[1])
+                    buffer += event[1]
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        await run_io(out.write, bytes(buffer))
+                        buffer.clear()
+                else:
+                    await run_io(out.write, bytes(buffer))
+                    buffer.clear()
+                    await run_io(out.close)
+                    out = None
+                    spooled.append(SpooledUpload(path=path, filename=filename, size=size, sha256=digest.hexdigest()))
+                    metrics.increment("uploads.spooled")
+                    metrics.increment("uploads.bytes", size)
+                    logger.info(f"Spooled upload {filename} to {path} ({size} bytes)")
+        parser.finalize()
+        if out is not None:
+            raise UploadFormError(f"Upload of {filename} ended before the file was complete")
+        if not spooled:
+            raise UploadFormError(f"No files were sent in the '{field}' form field")
+    except BaseException:
+        if out is not None:
+            await run_io(out.close)
+            await remove_spooled(path)
+        for upload in spooled:
+            await remove_spooled(upload.path)
+        raise
+
+    return spooled
+
+
+async def remove_spooled(path: Optional[str]) -> None:
+    """Remove a spooled upload, ignoring files that are already gone"""
+    if not path:
+        return
+    try:
+        await run_io(Path(path).unlink, missing_ok=True)
+    except Exception as e:
+        logger.error(f"Error removing spooled upload {path}: {str(e)}")
+
+
+class MaxBodySizeMiddleware:
+    """
+    Rejects request bodies over a per-path limit with 413.
+
+    Requests that declare a Content-Length over the limit are refused before
+    any of the body is read; chunked bodies are counted as they are received
+    and cut off as soon as they cross the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # Longest prefix first so specific routes win over general ones
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self._limit_for(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds {limit // (1024 * 1024)}MB limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            metrics.increment("uploads.rejected_too_large")
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    metrics.increment("uploads.rejected_too_large")
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,103 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+
+# USD prices per 1K tokens (prompt, completion); keep in line with OpenAI's price list
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+# USD per minute of audio
+TRANSCRIPTION_PRICES = {
+    "whisper-1": 0.006,
+}
+
+
+def completion_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def transcription_cost(model: str, audio_seconds: float) -> float:
+    return TRANSCRIPTION_PRICES.get(model, 0.0) * audio_seconds / 60
+
+
+class UsageLedger:
+    """
+    Per-request record of every billable OpenAI call.
+
+    Each entry notes the pipeline stage (language_detection, chunk, combine,
+    transcription), the model, tokens or audio seconds, and the estimated cost.
+    Cache hits are recorded with zero cost so they still show up per stage.
+    """
+
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_completion(self, stage: str, model: str, usage: Optional[Dict[str, int]], cached: bool = False) -> None:
+        usage = usage or {}
+        prompt_tokens = 0 if cached else usage.get("prompt_tokens", 0)
+        completion_tokens = 0 if cached else usage.get("completion_tokens", 0)
+        cost = completion_cost(model, prompt_tokens, completion_tokens)
+        self._add({
+            "stage": stage,
+            "model": model,
+            "cached": cached,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost_usd": round(cost, 6)
+        })
+        if cached:
+            metrics.increment("usage.cached_calls")
+            metrics.increment("usage.tokens_saved", usage.get("total_tokens", 0))
+        else:
+            metrics.increment("usage.prompt_tokens", prompt_tokens)
+            metrics.increment("usage.completion_tokens", completion_tokens)
+            metrics.increment(f"usage.{stage}.tokens", prompt_tokens + completion_tokens)
+            metrics.increment("usage.cost_usd", cost)
+
+    def record_transcription(self, model: str, audio_seconds: float, stage: str = "transcription", cached: bool = False) -> None:
+        cost = 0.0 if cached else transcription_cost(model, audio_seconds)
+        self._add({
+            "stage": stage,
+            "model": model,
+            "cached": cached,
+            "audio_seconds": round(audio_seconds, 2),
+            "cost_usd": round(cost, 6)
+        })
+        if not cached:
+            metrics.increment("usage.audio_seconds", audio_seconds)
+            metrics.increment("usage.cost_usd", cost)
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries.append(entry)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(e.get("total_tokens", 0) for e in self.entries)
+
+    def totals(self) -> Dict[str, Any]:
+        """Aggregate the ledger overall and per stage"""
+        by_stage: Dict[str, Dict[str, float]] = {}
+        for entry in self.entries:
+            stage = by_stage.setdefault(entry["stage"], {"calls": 0, "total_tokens": 0, "cost_usd": 0.0})
+            stage["calls"] += 1
+            stage["total_tokens"] += entry.get("total_tokens", 0)
+            stage["cost_usd"] = round(stage["cost_usd"] + entry["cost_usd"], 6)
+
+        return {
+            "prompt_tokens": sum(e.get("prompt_tokens", 0) for e in self.entries),
+            "completion_tokens": sum(e.get("completion_tokens", 0) for e in self.entries),
+            "total_tokens": self.total_tokens,
+            "audio_seconds": round(sum(e.get("audio_seconds", 0) for e in self.entries), 2),
+            "cost_usd": round(sum(e["cost_usd"] for e in self.entries), 6),
+            "by_stage": by_stage
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.totals(), "entries": list(self.entries)}
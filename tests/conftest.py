@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Settings are read when app modules are imported, so they are set before any test imports them
+_tmp = tempfile.mkdtemp(prefix="release-notes-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("RESUMABLE_UPLOAD_DIR", os.path.join(_tmp, "resumable_uploads"))
+os.environ.setdefault("RELEASE_SPOOL_DIR", os.path.join(_tmp, "release_spool"))
+os.environ.setdefault("JOB_FILES_DIR", os.path.join(_tmp, "job_files"))
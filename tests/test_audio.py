@@ -0,0 +1,51 @@
+import pytest
+
+from app.utils.audio import parse_duration, plan_segments
+
+
+def silence_at(midpoint: float):
+    return (midpoint - 1, midpoint + 1)
+
+
+def test_short_audio_is_one_segment():
+    assert plan_segments(300, [], target_seconds=300, max_seconds=420) == [(0.0, 300)]
+
+
+def test_cuts_in_the_middle_of_silences_near_the_target():
+    silences = [(290, 300), (610, 620)]
+    assert plan_segments(900, silences, target_seconds=300, max_seconds=420) == [
+        (0.0, 295), (295, 615), (615, 900)
+    ]
+
+
+def test_prefers_the_silence_closest_to_the_target():
+    silences = [silence_at(200), silence_at(310), silence_at(400)]
+    assert plan_segments(600, silences, target_seconds=300, max_seconds=420) == [(0.0, 310), (310, 600)]
+
+
+@pytest.mark.parametrize("silences", [[], [silence_at(55)], [silence_at(500)]])
+def test_cuts_hard_at_the_maximum_without_a_usable_silence(silences):
+    assert plan_segments(1000, silences, target_seconds=300, max_seconds=420) == [
+        (0.0, 420), (420, 840), (840, 1000)
+    ]
+
+
+def test_maximum_is_never_below_the_target():
+    assert plan_segments(700, [], target_seconds=300, max_seconds=100) == [(0.0, 300), (300, 600), (600, 700)]
+
+
+def test_segments_cover_the_audio_without_gaps():
+    silences = [silence_at(m) for m in (130, 280, 333, 650, 990, 1200, 1500)]
+    bounds = plan_segments(1800, silences, target_seconds=300, max_seconds=420)
+    assert bounds[0][0] == 0.0 and bounds[-1][1] == 1800
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(bounds, bounds[1:]))
+    assert all(end - start <= 420 for start, end in bounds)
+
+
+@pytest.mark.parametrize("output, duration", [
+    ("  Duration: 01:02:03.50, start: 0.000000, bitrate: 128 kb/s", 3723.5),
+    ("size=N/A time=00:00:10.00 bitrate=N/A\nsize=N/A time=00:01:00.25 bitrate=N/A", 60.25),
+    ("Output file is empty, nothing was encoded", 0.0),
+])
+def test_parse_duration(output, duration):
+    assert parse_duration(output) == duration
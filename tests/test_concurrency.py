@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.utils.concurrency import ALLOW_PARTIAL, FAIL_FAST, BoundedTaskError, run_bounded
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_results_come_back_in_input_order():
+    async def worker(index, item):
+        # Later items finish first
+        await asyncio.sleep(0.01 * (3 - index))
+        return item * 2
+
+    results = run(run_bounded([1, 2, 3], worker, max_concurrency=3))
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.value for r in results] == [2, 4, 6]
+    assert all(r.success for r in results)
+
+
+def test_concurrency_is_bounded():
+    running = 0
+    peak = 0
+
+    async def worker(index, item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    run(run_bounded(range(10), worker, max_concurrency=3))
+    assert peak == 3
+
+
+def test_fail_fast_cancels_outstanding_tasks():
+    cancelled = []
+
+    async def worker(index, item):
+        if index == 1:
+            raise ValueError("bad chunk")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+
+    async def main():
+        with pytest.raises(BoundedTaskError) as raised:
+            await asyncio.wait_for(run_bounded(range(4), worker, max_concurrency=4, failure_policy=FAIL_FAST), 5)
+        return raised.value
+
+    error = run(main())
+    assert error.result.index == 1
+    assert isinstance(error.result.exception, ValueError)
+    assert sorted(cancelled) == [0, 2, 3]
+
+
+def test_partial_policy_returns_failures_alongside_successes():
+    async def worker(index, item):
+        if item == "bad":
+            raise ConnectionResetError("upstream reset")
+        return item.upper()
+
+    results = run(run_bounded(["a", "bad", "c"], worker, failure_policy=ALLOW_PARTIAL))
+    assert [r.success for r in results] == [True, False, True]
+    assert [r.value for r in results] == ["A", None, "C"]
+    assert results[1].error == "upstream reset"
+    assert isinstance(results[1].exception, ConnectionResetError)
+
+
+def test_unknown_policy_is_rejected():
+    async def worker(index, item):
+        return item
+
+    with pytest.raises(ValueError):
+        run(run_bounded([1], worker, failure_policy="retry"))
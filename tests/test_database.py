@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import inspect, text
+
+from app.database import Base, Release, SchemaMismatchError, ensure_schema, engine
+
+
+@pytest.fixture
+def empty_database():
+    Base.metadata.drop_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def index_names(table: str):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_startup_creates_release_history_index(empty_database):
+    pytest.importorskip("fastapi")
+    from app import main
+
+    # An existing database from before the index was added
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_releases_user_generated_id"))
+    assert "ix_releases_user_generated_id" not in index_names(Release.__tablename__)
+
+    asyncio.run(main.ensure_database_schema())
+
+    assert "ix_releases_user_generated_id" in index_names(Release.__tablename__)
+
+
+def test_ensure_schema_upgrades_an_existing_database(empty_database):
+    # releases as it was before usage accounting, blobs, search and write-behind
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, hashed_password VARCHAR)"))
+        connection.execute(text(
+            "CREATE TABLE releases (id INTEGER PRIMARY KEY, user_id INTEGER, "
+            "transcripts TEXT, generated_release_notes TEXT, generated_at DATETIME)"
+        ))
+
+    ensure_schema()
+
+    inspector = inspect(engine)
+    assert "blobs" in inspector.get_table_names()
+    columns = {column["name"] for column in inspector.get_columns("releases")}
+    assert {"prompt_tokens", "cost_usd", "usage", "language", "preview", "transcripts_hash", "spool_id"} <= columns
+    assert "ix_releases_spool_id" in index_names("releases")
+    # Running it again changes nothing
+    ensure_schema()
+
+
+def test_ensure_schema_refuses_columns_it_cannot_add(empty_database):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE blobs (hash VARCHAR(64) PRIMARY KEY, data BLOB)"))
+
+    with pytest.raises(SchemaMismatchError, match="blobs.codec"):
+        ensure_schema()
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+for module in ("sqlalchemy", "aiosqlite", "fastapi", "httpx", "openai", "fitz"):
+    pytest.importorskip(module)
+
+import httpx
+import openai
+
+from app.jobs import JOB_MAX_ATTEMPTS, JobStageError, should_retry
+from app.utils.generation_context import GenerationContext
+
+
+def api_error(cls, status: int):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return cls("upstream failure", response=httpx.Response(status, request=request), body=None)
+
+
+def test_stage_errors_are_final_by_default():
+    assert not should_retry(JobStageError("Unsupported file type: exe"), attempts=1)
+
+
+def test_transient_stage_errors_are_retried_until_attempts_run_out():
+    error = JobStageError("Error processing content chunk 1: 502", retryable=True)
+    assert should_retry(error, attempts=JOB_MAX_ATTEMPTS - 1)
+    assert not should_retry(error, attempts=JOB_MAX_ATTEMPTS)
+
+
+def test_unexpected_exceptions_are_retried():
+    assert should_retry(RuntimeError("worker bug"), attempts=1)
+    assert not should_retry(RuntimeError("worker bug"), attempts=JOB_MAX_ATTEMPTS)
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (httpx.ReadTimeout("timed out"), True),
+    (api_error(openai.InternalServerError, 502), True),
+    (api_error(openai.RateLimitError, 429), True),
+    (api_error(openai.BadRequestError, 400), False),
+    (ValueError("unreadable input"), False),
+    (None, False),
+])
+def test_generation_failures_are_classified(error, retryable):
+    ctx = GenerationContext()
+    ctx.record_failure(error)
+    assert ctx.failure_retryable is retryable
+
+
+@pytest.mark.parametrize("owner, caller, status", [
+    (None, None, None),
+    (7, 7, None),
+    (7, None, 401),
+    (7, 8, 403),
+])
+def test_job_routes_check_the_caller_against_the_owner(monkeypatch, owner, caller, status):
+    from fastapi import HTTPException
+
+    from app.auth import TokenUser
+    from app.jobs import Job
+    from app.routes import jobs as job_routes
+
+    job = Job(id="job-1", kind="video", status="queued", user_id=owner)
+    monkeypatch.setattr(job_routes, "get_job", lambda job_id: job)
+    current_user = TokenUser(id=caller, username="someone") if caller is not None else None
+
+    if status is None:
+        assert asyncio.run(job_routes.get_owned_job("job-1", current_user)) is job
+    else:
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(job_routes.get_owned_job("job-1", current_user))
+        assert raised.value.status_code == status
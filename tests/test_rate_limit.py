@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app.utils import rate_limit
+from app.utils.rate_limit import MemoryRateLimitBackend, Rate, RateLimiter, parse_rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.parametrize("value, amount, seconds", [
+    ("500/hour", 500, 3600),
+    ("10/minute", 10, 60),
+    (" 2 / Seconds ", 2, 1),
+    ("1.5/day", 1.5, 86400),
+])
+def test_parse_rate(value, amount, seconds):
+    assert parse_rate(value) == Rate(amount=amount, seconds=seconds)
+
+
+@pytest.mark.parametrize("value", ["10/fortnight", "10"])
+def test_parse_rate_rejects_unknown_periods(value):
+    with pytest.raises(ValueError):
+        parse_rate(value)
+
+
+def test_memory_backend_rejects_once_the_budget_is_spent(clock):
+    backend = MemoryRateLimitBackend()
+    rate = Rate(amount=10, seconds=10)
+
+    assert asyncio.run(backend.acquire("k", rate, 6)) == (True, 4, 0.0)
+    allowed, remaining, retry_after = asyncio.run(backend.acquire("k", rate, 6))
+    assert not allowed
+    assert remaining == 4
+    assert retry_after == pytest.approx(2)
+
+
+def test_memory_backend_refills_over_time(clock):
+    backend = MemoryRateLimitBackend()
+    rate = Rate(amount=10, seconds=10)
+    asyncio.run(backend.acquire("k", rate, 10))
+
+    clock.now += 3
+    assert asyncio.run(backend.acquire("k", rate, 3))[0]
+    assert not asyncio.run(backend.acquire("k", rate, 1))[0]
+
+    clock.now += 60
+    assert asyncio.run(backend.acquire("k", rate, 1)) == (True, 9, 0.0)
+
+
+def test_memory_backend_keeps_buckets_per_key_and_evicts_the_oldest(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    rate = Rate(amount=1, seconds=60)
+    for key in ("a", "b", "c"):
+        assert asyncio.run(backend.acquire(key, rate, 1))[0]
+
+    # "a" was evicted, so it starts again with a full bucket
+    assert asyncio.run(backend.acquire("a", rate, 1))[0]
+    assert not asyncio.run(backend.acquire("c", rate, 1))[0]
+
+
+def test_limiter_caps_cost_at_the_budget(clock):
+    limiter = RateLimiter(MemoryRateLimitBackend(), {"media": Rate(amount=5, seconds=60)})
+    assert asyncio.run(limiter.acquire("user:1", "media", 50)).allowed
+
+
+def test_limiter_fails_open_when_the_backend_errors():
+    class BrokenBackend(MemoryRateLimitBackend):
+        async def acquire(self, key, rate, cost):
+            raise ConnectionError("redis is down")
+
+        async def ping(self):
+            raise ConnectionError("redis is down")
+
+    limiter = RateLimiter(BrokenBackend(), {"default": Rate(amount=1, seconds=60)})
+    assert asyncio.run(limiter.acquire("ip:1.2.3.4", "default", 1)).allowed
+    assert not asyncio.run(limiter.check_backend())
+
+
+@pytest.mark.parametrize("trusted, client_ip", [(True, "203.0.113.9"), (False, "10.0.0.1")])
+def test_subject_trusts_fly_client_ip_only_behind_the_proxy(monkeypatch, trusted, client_ip):
+    pytest.importorskip("jose")
+    pytest.importorskip("passlib")
+    pytest.importorskip("sqlalchemy")
+    from app import auth
+
+    monkeypatch.setattr(auth, "TRUST_PROXY_HEADERS", trusted)
+    scope = {"headers": [(b"fly-client-ip", b"203.0.113.9")], "client": ("10.0.0.1", 5000)}
+    assert auth.rate_limit_subject(scope) == f"ip:{client_ip}"
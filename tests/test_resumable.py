@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from app.utils import resumable
+from app.utils.resumable import (
+    ResumableUploadStore,
+    UploadElsewhereError,
+    UploadError,
+    parse_checksum_header
+)
+
+DATA = b"0123456789" * 10
+
+
+async def body(*parts):
+    for part in parts:
+        yield part
+
+
+def sha256(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResumableUploadStore(str(tmp_path / "uploads"))
+
+
+def create(store, data=DATA, declared_sha256=None):
+    return asyncio.run(store.create("talk.mp4", "video", len(data), declared_sha256))
+
+
+def write(store, upload_id, offset, *parts, checksum=None):
+    return asyncio.run(store.write_chunk(upload_id, offset, body(*parts), checksum))
+
+
+def error_status(call) -> int:
+    with pytest.raises(UploadError) as raised:
+        asyncio.run(call)
+    return raised.value.status_code
+
+
+def test_chunks_append_at_the_current_offset(store):
+    info = create(store)
+    assert write(store, info.upload_id, 0, DATA[:30], DATA[30:40]) == 40
+    assert write(store, info.upload_id, 40, DATA[40:]) == len(DATA)
+    assert asyncio.run(store.offset(info.upload_id)) == len(DATA)
+
+
+def test_a_chunk_at_the_wrong_offset_is_refused(store):
+    info = create(store)
+    write(store, info.upload_id, 0, DATA[:40])
+    assert error_status(store.write_chunk(info.upload_id, 20, body(DATA[20:60]))) == 409
+    assert error_status(store.write_chunk(info.upload_id, 50, body(DATA[50:60]))) == 409
+    assert asyncio.run(store.offset(info.upload_id)) == 40
+
+
+def test_a_chunk_with_a_bad_checksum_is_rolled_back(store):
+    info = create(store)
+    write(store, info.upload_id, 0, DATA[:40])
+    bad = store.write_chunk(info.upload_id, 40, body(DATA[40:80]), sha256(b"something else"))
+    assert error_status(bad) == 460
+    assert asyncio.run(store.offset(info.upload_id)) == 40
+    assert write(store, info.upload_id, 40, DATA[40:80], checksum=sha256(DATA[40:80])) == 80
+
+
+def test_a_chunk_past_the_declared_size_is_rolled_back(store):
+    info = create(store)
+    assert error_status(store.write_chunk(info.upload_id, 0, body(DATA, b"extra"))) == 413
+    assert asyncio.run(store.offset(info.upload_id)) == 0
+
+
+def test_an_interrupted_unverified_chunk_keeps_what_arrived(store):
+    info = create(store)
+
+    async def cut_off():
+        yield DATA[:25]
+        raise ConnectionResetError("client went away")
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(store.write_chunk(info.upload_id, 0, cut_off()))
+    assert asyncio.run(store.offset(info.upload_id)) == 25
+
+
+def test_finalize_verifies_the_whole_file(store, tmp_path):
+    info = create(store, declared_sha256=hashlib.sha256(DATA).hexdigest())
+    destination = tmp_path / "job" / "talk.mp4"
+    write(store, info.upload_id, 0, DATA[:50])
+    assert error_status(store.finalize(info.upload_id, destination)) == 409
+
+    write(store, info.upload_id, 50, DATA[50:])
+    assert asyncio.run(store.finalize(info.upload_id, destination)) == hashlib.sha256(DATA).hexdigest()
+    assert destination.read_bytes() == DATA
+    assert error_status(store.get(info.upload_id)) == 404
+    assert not store._locks
+
+
+def test_finalize_refuses_a_file_that_does_not_match_the_declared_checksum(store, tmp_path):
+    info = create(store, declared_sha256=hashlib.sha256(b"another file").hexdigest())
+    write(store, info.upload_id, 0, DATA)
+    assert error_status(store.finalize(info.upload_id, tmp_path / "talk.mp4")) == 460
+
+
+def test_restore_puts_a_finalized_upload_back(store, tmp_path):
+    info = create(store)
+    write(store, info.upload_id, 0, DATA)
+    destination = tmp_path / "job" / "talk.mp4"
+    asyncio.run(store.finalize(info.upload_id, destination))
+
+    asyncio.run(store.restore(info, destination))
+    assert not destination.exists()
+    assert asyncio.run(store.offset(info.upload_id)) == len(DATA)
+    asyncio.run(store.finalize(info.upload_id, destination))
+    assert destination.read_bytes() == DATA
+
+
+def test_delete_removes_the_upload_and_its_lock(store):
+    info = create(store)
+    write(store, info.upload_id, 0, DATA[:10])
+    asyncio.run(store.delete(info.upload_id))
+    assert error_status(store.get(info.upload_id)) == 404
+    assert not store._locks
+
+
+def test_an_upload_from_another_machine_is_sent_back_there(store, monkeypatch):
+    monkeypatch.setattr(resumable, "FLY_MACHINE_ID", "abc123")
+    with pytest.raises(UploadElsewhereError) as raised:
+        asyncio.run(store.get("def456" + "0" * 32))
+    assert raised.value.machine_id == "def456"
+    assert error_status(store.get("abc123" + "0" * 32)) == 404
+
+
+def test_parse_checksum_header():
+    digest = sha256(b"chunk")
+    assert parse_checksum_header(f"sha256 {base64.b64encode(digest).decode()}") == digest
+    assert parse_checksum_header(None) is None
+    for value in ("md5 abc", "sha256", "sha256 not-base64!"):
+        with pytest.raises(UploadError):
+            parse_checksum_header(value)
@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("python_multipart")
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.utils.uploads import UploadFormError, UploadTooLargeError, spool_multipart
+
+
+@pytest.fixture
+def spool(tmp_path):
+    """A client for an app that spools the 'files' field and reports what it got"""
+    directory = tmp_path / "spool"
+    app = FastAPI()
+
+    def check_filename(filename: str) -> None:
+        if filename.endswith(".exe"):
+            raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        try:
+            spooled = await spool_multipart(request, "files", 50000, str(directory), check_filename=check_filename)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=e.filename)
+        except UploadFormError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return [
+            {"filename": s.filename, "size": s.size, "sha256": s.sha256, "content": open(s.path, "rb").read().hex()}
+            for s in spooled
+        ]
+
+    client = TestClient(app)
+    client.directory = directory
+    return client
+
+
+def test_files_are_written_and_hashed_in_one_pass(spool):
+    first, second = os.urandom(30000), os.urandom(12345)
+    response = spool.post("/upload", files=[
+        ("files", ("notes.txt", first)),
+        ("other", ("ignored.txt", b"not ours")),
+        ("files", ("spec.pdf", second))
+    ], data={"comment": "also ignored"})
+
+    assert response.status_code == 200
+    assert [(f["filename"], f["size"]) for f in response.json()] == [("notes.txt", 30000), ("spec.pdf", 12345)]
+    for sent, received in zip((first, second), response.json()):
+        assert received["sha256"] == hashlib.sha256(sent).hexdigest()
+        assert bytes.fromhex(received["content"]) == sent
+
+
+@pytest.mark.parametrize("files, status", [
+    ([("files", ("notes.txt", b"a" * 100)), ("files", ("huge.txt", b"b" * 60000))], 413),
+    ([("files", ("notes.txt", b"a" * 100)), ("files", ("tool.exe", b"MZ"))], 400),
+])
+def test_rejected_uploads_leave_no_files_behind(spool, files, status):
+    response = spool.post("/upload", files=files)
+    assert response.status_code == status
+    assert not list(spool.directory.iterdir())
+
+
+def test_requests_without_files_are_refused(spool):
+    assert spool.post("/upload", data={"comment": "no files"}).status_code == 422
+    assert spool.post("/upload", files=[("other", ("notes.txt", b"a"))]).status_code == 422
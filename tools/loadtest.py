@@ -0,0 +1,184 @@
+"""
+Open-loop load generator for the release notes API.
+
+Sends requests to /api/generate-release-notes and/or /api/upload-video at a
+target rate and reports latency percentiles, throughput and error rates.
+Latency is measured from each request's scheduled send time, so time spent
+waiting for a --max-in-flight slot counts too (it is also reported on its own
+as queue wait) instead of being hidden by coordinated omission.
+Pair it with tools/mock_openai.py to benchmark without touching OpenAI:
+
+    python tools/loadtest.py --base-url http://localhost:8000 --endpoint both --rps 2 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ENDPOINTS = {
+    "generate": "/api/generate-release-notes",
+    "video": "/api/upload-video",
+}
+
+SAMPLE_DOCUMENT = """Release 2.4 adds automatic synchronisation between the CRM and the helpdesk.
+
+Tickets created in the helpdesk are now linked to CRM accounts within a minute.
+Scheduled reports replace the manual weekly export and are emailed to team leads.
+"""
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def build_request(endpoint: str, args) -> Tuple[str, Dict]:
+    """Return the path and httpx request kwargs for one request"""
+    # A nonce keeps the app's LLM and transcript caches from serving repeat inputs
+    nonce = uuid.uuid4().hex if args.unique else ""
+    if endpoint == "generate":
+        if args.doc_file:
+            with open(args.doc_file, "rb") as f:
+                content = f.read()
+            name = os.path.basename(args.doc_file)
+        else:
+            content = (SAMPLE_DOCUMENT * args.doc_repeat + f"\n\nRun {nonce}\n").encode("utf-8")
+            name = "loadtest.txt"
+        return ENDPOINTS["generate"], {"files": [("files", (name, content, "text/plain"))]}
+
+    if args.video_file:
+        with open(args.video_file, "rb") as f:
+            content = f.read()
+        name = os.path.basename(args.video_file)
+    else:
+        content = os.urandom(args.video_kb * 1024)
+        name = "loadtest.mp4"
+    return ENDPOINTS["video"], {"files": {"file": (name, content + nonce.encode(), "video/mp4")}}
+
+
+async def send_one(client: httpx.AsyncClient, endpoint: str, args, results: Dict[str, list], scheduled: float) -> None:
+    """Send one request and record (latency, status, queue wait), timed from its scheduled send time"""
+    queue_wait = time.perf_counter() - scheduled
+    path, kwargs = build_request(endpoint, args)
+    status: Optional[int] = None
+    try:
+        response = await client.post(path, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results[endpoint].append((time.perf_counter() - scheduled, status, queue_wait))
+
+
+async def run(args) -> Dict[str, list]:
+    endpoints = ["generate", "video"] if args.endpoint == "both" else [args.endpoint]
+    results: Dict[str, list] = defaultdict(list)
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    semaphore = asyncio.Semaphore(args.max_in_flight)
+
+    async def guarded(endpoint: str, scheduled: float):
+        async with semaphore:
+            await send_one(client, endpoint, args, results, scheduled)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        tasks = []
+        interval = 1 / args.rps
+        start = time.perf_counter()
+        sent = 0
+        # Open loop: schedule by wall clock so slow responses don't lower the offered rate
+        while time.perf_counter() - start < args.duration:
+            endpoint = endpoints[sent % len(endpoints)] if not args.random_mix else random.choice(endpoints)
+            scheduled = start + sent * interval
+            tasks.append(asyncio.create_task(guarded(endpoint, scheduled)))
+            sent += 1
+            next_send = start + sent * interval
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    results["_elapsed"] = [elapsed]
+    return results
+
+
+def summarise(results: Dict[str, list]) -> Dict[str, Dict]:
+    elapsed = results.pop("_elapsed")[0]
+    summary = {}
+    for endpoint, samples in results.items():
+        latencies = [latency for latency, status, _ in samples if status == 200]
+        waits = [wait for _, _, wait in samples]
+        errors = defaultdict(int)
+        for _, status, _ in samples:
+            if status != 200:
+                errors[str(status)] += 1
+        summary[endpoint] = {
+            "requests": len(samples),
+            "succeeded": len(latencies),
+            "error_rate": round(1 - len(latencies) / len(samples), 4) if samples else 0,
+            "errors": dict(errors),
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0,
+            "p50_s": round(percentile(latencies, 50), 3),
+            "p95_s": round(percentile(latencies, 95), 3),
+            "p99_s": round(percentile(latencies, 99), 3),
+            "mean_s": round(statistics.mean(latencies), 3) if latencies else 0,
+            "max_s": round(max(latencies), 3) if latencies else 0,
+            # Time requests waited for a --max-in-flight slot; included in the latencies above
+            "queue_wait_p50_s": round(percentile(waits, 50), 3),
+            "queue_wait_p95_s": round(percentile(waits, 95), 3),
+            "queue_wait_max_s": round(max(waits), 3) if waits else 0,
+        }
+    summary["_run"] = {"elapsed_s": round(elapsed, 2)}
+    return summary
+
+
+def print_table(summary: Dict[str, Dict]) -> None:
+    print(f"{'endpoint':<10} {'reqs':>6} {'ok':>6} {'err%':>7} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'wait p95':>9}")
+    for endpoint, s in summary.items():
+        if endpoint.startswith("_"):
+            continue
+        print(
+            f"{endpoint:<10} {s['requests']:>6} {s['succeeded']:>6} {s['error_rate'] * 100:>6.1f}% "
+            f"{s['throughput_rps']:>7.2f} {s['p50_s']:>7.2f}s {s['p95_s']:>7.2f}s {s['p99_s']:>7.2f}s "
+            f"{s['queue_wait_p95_s']:>8.2f}s"
+        )
+        if s["errors"]:
+            print(f"{'':<10} errors: {s['errors']}")
+    print(f"elapsed: {summary['_run']['elapsed_s']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the release notes API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["generate", "video", "both"], default="generate")
+    parser.add_argument("--rps", type=float, default=1.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="Cap on concurrent requests")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--doc-file", help="Document to upload (default: generated text)")
+    parser.add_argument("--doc-repeat", type=int, default=20, help="Repeats of the sample text in the generated document")
+    parser.add_argument("--video-file", help="Video to upload (default: random bytes)")
+    parser.add_argument("--video-kb", type=int, default=512, help="Size of the generated video payload")
+    parser.add_argument("--no-unique", dest="unique", action="store_false", help="Send identical payloads (exercises caches)")
+    parser.add_argument("--random-mix", action="store_true", help="Pick endpoints at random instead of alternating")
+    parser.add_argument("--json", dest="json_output", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    summary = summarise(asyncio.run(run(args)))
+    print_table(summary)
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
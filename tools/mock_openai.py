@@ -0,0 +1,241 @@
+"""
+Offline stand-in for the OpenAI API used for benchmarking.
+
+Serves /v1/chat/completions (including streaming) and /v1/audio/transcriptions
+with configurable latency and injected 429/5xx errors, so the app can be load
+tested without network calls or API spend.
+
+Run it and point the app at it:
+
+    python tools/mock_openai.py --port 8100 --latency-mean 2.0 --error-rate-429 0.02
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+# Mock behaviour, overridden from the command line
+settings = {
+    "latency_dist": "lognormal",
+    "latency_mean": 1.5,
+    "latency_stddev": 0.5,
+    "tokens_per_second": 60.0,
+    "transcription_seconds_per_mb": 0.5,
+    "error_rate_429": 0.0,
+    "error_rate_5xx": 0.0,
+    "seed": None,
+}
+
+app = FastAPI(title="Mock OpenAI API")
+rng = random.Random()
+
+SAMPLE_NOTES = """**Note on New Functionality:**
+The release introduces automatic synchronisation between systems.
+
+**Point 1: Integration Enhancement**
+- Previous State: None
+- New State: Records are synchronised automatically every hour.
+- Customer Benefits: Less manual work and fewer data mismatches.
+
+**Point 2: Process Automation**
+- Previous State: Reports were exported by hand.
+- New State: Reports are generated on a schedule.
+- Customer Benefits: Faster access to up-to-date figures.
+"""
+
+SAMPLE_TRANSCRIPT = (
+    "In this demo we walk through the new integration. Data now syncs automatically "
+    "and reports are generated on a schedule, which saves the team time every week. "
+)
+
+
+def sample_latency() -> float:
+    """Draw a response latency in seconds from the configured distribution"""
+    mean = settings["latency_mean"]
+    stddev = settings["latency_stddev"]
+    dist = settings["latency_dist"]
+    if dist == "fixed" or mean <= 0:
+        return max(0.0, mean)
+    if dist == "uniform":
+        return rng.uniform(max(0.0, mean - stddev), mean + stddev)
+    if dist == "exponential":
+        return rng.expovariate(1 / mean)
+    # lognormal with the requested mean and standard deviation
+    variance = stddev ** 2
+    sigma2 = math.log(1 + variance / mean ** 2)
+    mu = math.log(mean) - sigma2 / 2
+    return rng.lognormvariate(mu, sigma2 ** 0.5)
+
+
+def injected_error():
+    """Return an error response if one should be injected for this request"""
+    roll = rng.random()
+    if roll < settings["error_rate_429"]:
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "1"},
+            content={"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}
+        )
+    if roll < settings["error_rate_429"] + settings["error_rate_5xx"]:
+        status = rng.choice([500, 502, 503])
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": f"Mock server error {status}", "type": "server_error"}}
+        )
+    return None
+
+
+def count_tokens(text: str) -> int:
+    return max(1, int(len(text.split()) * 1.3))
+
+
+def completion_text(body: dict) -> str:
+    # Language detection asks for a 2-letter code with max_tokens=2
+    if body.get("max_tokens") == 2:
+        return "en"
+    return SAMPLE_NOTES
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if (error := injected_error()) is not None:
+        await asyncio.sleep(sample_latency() / 10)
+        return error
+
+    text = completion_text(body)
+    prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+    completion_tokens = count_tokens(text)
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    model = body.get("model", "mock")
+
+    if not body.get("stream"):
+        await asyncio.sleep(sample_latency())
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    async def event_stream():
+        # Time to first token, then tokens at the configured rate
+        await asyncio.sleep(sample_latency() * 0.3)
+        words = text.split(" ")
+        delay = 1 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(delay)
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        if include_usage:
+            usage_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/audio/transcriptions")
+async def audio_transcriptions(
+    file: UploadFile = File(...),
+    model: str = Form("whisper-1"),
+    response_format: str = Form("json")
+):
+    content = await file.read()
+    if (error := injected_error()) is not None:
+        return error
+
+    size_mb = len(content) / (1024 * 1024)
+    await asyncio.sleep(sample_latency() + size_mb * settings["transcription_seconds_per_mb"])
+
+    # Assume roughly 128 kbit/s of audio to derive a plausible duration
+    duration = max(1.0, len(content) / 16000)
+    repeats = max(1, int(duration // 10))
+    text = (SAMPLE_TRANSCRIPT * repeats).strip()
+
+    if response_format == "text":
+        return PlainTextResponse(text)
+    if response_format == "verbose_json":
+        segment_length = duration / repeats
+        segments = [
+            {"id": i, "start": round(i * segment_length, 2), "end": round((i + 1) * segment_length, 2), "text": SAMPLE_TRANSCRIPT.strip()}
+            for i in range(repeats)
+        ]
+        return {"task": "transcribe", "language": "english", "duration": round(duration, 2), "text": text, "segments": segments}
+    return {"text": text}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "settings": settings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default=settings["latency_dist"])
+    parser.add_argument("--latency-mean", type=float, default=settings["latency_mean"], help="Mean response latency in seconds")
+    parser.add_argument("--latency-stddev", type=float, default=settings["latency_stddev"])
+    parser.add_argument("--tokens-per-second", type=float, default=settings["tokens_per_second"], help="Streaming token rate")
+    parser.add_argument("--transcription-seconds-per-mb", type=float, default=settings["transcription_seconds_per_mb"])
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="Fraction of requests answered with 500/502/503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings.update(
+        latency_dist=args.latency_dist,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        tokens_per_second=args.tokens_per_second,
+        transcription_seconds_per_mb=args.transcription_seconds_per_mb,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        seed=args.seed,
+    )
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()